@@ -0,0 +1,163 @@
+"""
+发送节奏模拟基准 - 对比旧的逐条线性延迟和全局时间线调度
+
+在模拟时钟上回放随机到达的查询，统计每分钟送达的回复数、回复完成延迟以及超出
+security 配置限制的次数。时间线调度与机器人一样通过 SecurityManager 的预留/提交准入。
+
+用法：python benchmarks/bench_pacing.py [--minutes 60] [--rate 6] [--groups 40]
+"""
+import argparse
+import bisect
+import heapq
+import itertools
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.pacing import PacingScheduler
+from utils.security_manager import SecurityManager, MINUTE, HOUR
+
+
+def generate_requests(minutes: int, rate: float, groups: int, seed: int):
+    """生成 (到达时刻, 群ID, 用户ID, 消息条数) 列表"""
+    rng = random.Random(seed)
+    requests = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate / MINUTE)
+        if t >= minutes * MINUTE:
+            break
+        group_id = f"@@group_{rng.randrange(groups)}"
+        user_id = f"@user_{rng.randrange(groups * 20)}"
+        requests.append((t, group_id, user_id, rng.choice([1, 1, 2, 2, 3])))
+    return requests
+
+
+def count_in_window(times, t, window):
+    """有序列表中 (t-window, t] 内的数量"""
+    return bisect.bisect_right(times, t) - bisect.bisect_right(times, t - window)
+
+
+def count_violations(sends, limits):
+    """统计违反限制的发送次数，sends 为 (时刻, 群ID) 列表"""
+    sends = sorted(sends)
+    all_times = [t for t, _ in sends]
+    group_times = {}
+    for t, group_id in sends:
+        group_times.setdefault(group_id, []).append(t)
+
+    violations = 0
+    for t, group_id in sends:
+        if (count_in_window(all_times, t, MINUTE) > limits['per_minute'] or
+                count_in_window(all_times, t, HOUR) > limits['per_hour'] or
+                count_in_window(group_times[group_id], t, MINUTE) > limits['per_group']):
+            violations += 1
+    return violations
+
+
+def simulate_linear(manager, requests, limits):
+    """旧策略：按当时已发送的数量准入，每条回复独立计算线性延迟"""
+    sends, latencies = [], []
+    for arrival, group_id, user_id, message_count in requests:
+        sent_times = sorted(t for t, _ in sends if t <= arrival)
+        group_sent = sorted(t for t, g in sends if g == group_id and t <= arrival)
+        if (count_in_window(sent_times, arrival, MINUTE) >= limits['per_minute'] or
+                count_in_window(sent_times, arrival, HOUR) >= limits['per_hour'] or
+                count_in_window(group_sent, arrival, MINUTE) >= limits['per_group']):
+            continue
+
+        t = arrival
+        for i in range(message_count):
+            if i > 0:
+                t += manager.calculate_send_delay(group_id, i + 1)
+            sends.append((t, group_id))
+        latencies.append(t - arrival)
+    return sends, latencies
+
+
+def simulate_paced(manager, requests):
+    """新策略，与机器人相同：准入时预留额度，按实际条数调整预留，在全局时间线上分配时刻，到点发送时提交"""
+    pacer = PacingScheduler(manager)
+    reserve_per_reply = manager.config_service.snapshot.reserve_per_reply
+    sends, latencies = [], []
+    pending = []  # 尚未到点的发送：(时刻, 序号, 预留, 群ID, 用户ID)
+    sequence = itertools.count()
+
+    def commit_due(until: float):
+        while pending and pending[0][0] <= until:
+            t, _, reservation, group_id, user_id = heapq.heappop(pending)
+            manager.commit(reservation, group_id, user_id, now=t)
+
+    for arrival, group_id, user_id, message_count in requests:
+        commit_due(arrival)
+        reservation, _ = manager.reserve(group_id, user_id, reserve_per_reply, now=arrival)
+        if not reservation:
+            continue
+
+        granted = manager.resize_reservation(reservation, message_count, now=arrival)
+        if granted <= 0:
+            continue
+        slots = pacer.assign(group_id, granted, now=arrival)
+        for t in slots:
+            heapq.heappush(pending, (t, next(sequence), reservation, group_id, user_id))
+        sends.extend((t, group_id) for t in slots)
+        latencies.append(slots[-1] - arrival)
+
+    commit_due(float('inf'))
+    return sends, latencies
+
+
+def build_manager(groups: int, seed: int) -> SecurityManager:
+    """创建安全管理器并设置各群人数（每种策略使用独立的频率状态）"""
+    manager = SecurityManager()
+    rng = random.Random(seed)
+    for i in range(groups):
+        manager.update_group_member_count(f"@@group_{i}", rng.choice([8, 15, 40, 120, 300]))
+    return manager
+
+
+def percentile(values, p):
+    """百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    """运行模拟并打印对比结果"""
+    parser = argparse.ArgumentParser(description="发送节奏模拟基准")
+    parser.add_argument('--minutes', type=int, default=60, help="模拟时长(分钟)")
+    parser.add_argument('--rate', type=float, default=6, help="每分钟到达的查询数")
+    parser.add_argument('--groups', type=int, default=40, help="群数量")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    manager = build_manager(args.groups, args.seed)
+
+    rate_limit_config = manager.config.get('security', {}).get('rate_limit', {})
+    limits = {
+        'per_minute': rate_limit_config.get('max_per_minute', 10),
+        'per_hour': rate_limit_config.get('max_per_hour', 50),
+        'per_group': rate_limit_config.get('per_group_per_minute', 5),
+    }
+
+    requests = generate_requests(args.minutes, args.rate, args.groups, args.seed)
+    print(f"模拟 {args.minutes} 分钟，{len(requests)} 个查询，限制: {limits}")
+    print(f"{'策略':<12} {'回复数':>6} {'回复/分钟':>9} {'p50延迟':>8} {'p95延迟':>8} {'超限发送':>8}")
+
+    for name, (sends, latencies) in (
+        ("逐条线性延迟", simulate_linear(manager, requests, limits)),
+        ("全局时间线", simulate_paced(build_manager(args.groups, args.seed), requests)),
+    ):
+        replies = len(latencies)
+        print(f"{name:<12} {replies:>6} {replies / args.minutes:>9.2f} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+              f"{count_violations(sends, limits):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+频率限制准入微基准 - 验证准入耗时不随历史记录增长
+
+用法：python benchmarks/bench_rate_limiter.py
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+import yaml
+
+from utils.security_manager import SecurityManager
+
+HISTORY_SIZES = [100, 1000, 10000, 100000]
+ITERATIONS = 2000
+
+
+def legacy_check(history: deque, now: datetime) -> bool:
+    """旧实现：每次准入都遍历一小时内的记录"""
+    minute_ago = now - timedelta(minutes=1)
+    hour_ago = now - timedelta(hours=1)
+    while history and history[0] < hour_ago:
+        history.popleft()
+    recent_messages = [t for t in history if t > minute_ago]
+    return len(recent_messages) < 10 ** 9
+
+
+def bench_legacy(history_size: int) -> float:
+    """旧实现的单次准入耗时(微秒)"""
+    now = datetime.now()
+    step = timedelta(seconds=3600 / history_size)
+    history = deque(now - timedelta(hours=1) + step * (i + 1) for i in range(history_size))
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        legacy_check(history, now)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def write_config(work_dir: str) -> str:
+    """基于项目配置生成基准用的配置文件，频率限制放宽到不会拒绝（配置快照只读，不能在运行时修改）"""
+    with open(os.path.join(ROOT_DIR, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    config.setdefault('security', {}).setdefault('rate_limit', {}).update({
+        'enabled': True,
+        'max_per_minute': 10 ** 9,
+        'max_per_hour': 10 ** 9,
+        'per_user_per_minute': 10 ** 9,
+        'per_group_per_minute': 10 ** 9,
+    })
+
+    path = os.path.join(work_dir, 'config_rate_limiter.yaml')
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def bench_counters(history_size: int, config_path: str) -> float:
+    """滑动窗口计数器的单次准入耗时(微秒)"""
+    manager = SecurityManager(config_path)
+
+    # 预先填充一小时的历史
+    now = time.monotonic()
+    for i in range(history_size):
+        timestamp = now - 3600 + 3600 * (i + 1) / history_size
+        manager.global_minute_counter.add(now=timestamp)
+        manager.global_hour_counter.add(now=timestamp)
+
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        manager.should_respond(f"group_{i % 50}", f"user_{i % 500}", "测试")
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main():
+    """运行基准并打印结果"""
+    work_dir = os.path.join(tempfile.gettempdir(), 'wechat_bot_bench')
+    os.makedirs(work_dir, exist_ok=True)
+    config_path = write_config(work_dir)
+
+    print(f"{'历史记录数':>10} {'旧实现(us)':>12} {'计数器(us)':>12}")
+    for history_size in HISTORY_SIZES:
+        legacy = bench_legacy(history_size)
+        counters = bench_counters(history_size, config_path)
+        print(f"{history_size:>10} {legacy:>12.2f} {counters:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
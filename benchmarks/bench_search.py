@@ -0,0 +1,248 @@
+"""
+搜索基准 - 在合成数据上测量加载、建索引、内存和 intelligent_search 的延迟
+
+生成（或复用缓存的）合成表格，按真实路径加载，再回放固定的查询集：
+查询第一次出现时的耗时计为未缓存延迟，重复出现和第二遍回放的耗时计为带缓存延迟；
+表格和索引的内存分别由 pandas 和 tracemalloc 统计。结果写成JSON，
+可与保存的基线对比，任一指标变慢超过容差时以状态码1退出。
+
+用法：
+  python benchmarks/bench_search.py --rows 10000 --queries 200 --output bench_search.json
+  python benchmarks/bench_search.py --rows 10000 --baseline benchmarks/baseline_10k.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(BENCH_DIR)
+
+import jieba
+import yaml
+
+from synthetic_catalog import generate_catalog, generate_queries, load_queries, save_queries
+
+# 与基线对比的指标（越小越好）
+COMPARED_METRICS = [
+    ('load_s', "加载总耗时(s)"),
+    ('index_build_s', "建索引耗时(s)"),
+    ('catalog_mb', "表格内存(MB)"),
+    ('index_mb', "索引内存(MB)"),
+    ('cold.p50_ms', "未缓存 p50(ms)"),
+    ('cold.p99_ms', "未缓存 p99(ms)"),
+    ('warm.p99_ms', "带缓存 p99(ms)"),
+]
+
+
+def rss_mb() -> float:
+    """当前常驻内存(MB)，不支持 /proc 时返回峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: List[float], p: float) -> float:
+    """百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """延迟摘要（毫秒）"""
+    latencies = [latency * 1000 for latency in latencies]
+    return {
+        'count': len(latencies),
+        'avg_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies) if latencies else 0.0,
+    }
+
+
+def prepare_catalog(rows: int, seed: int, work_dir: str) -> str:
+    """生成合成表格，相同行数和seed的文件会被复用"""
+    path = os.path.join(work_dir, f"catalog_{rows}_{seed}.xlsx")
+    if not os.path.exists(path):
+        print(f"生成 {rows} 行合成数据: {path}")
+        generate_catalog(rows, seed).to_excel(path, index=False, engine='openpyxl')
+    return path
+
+
+def write_config(excel_file: str, work_dir: str) -> str:
+    """基于项目配置生成基准用的配置文件，只替换数据文件"""
+    with open(os.path.join(ROOT_DIR, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    config.setdefault('data_source', {})['excel_file'] = excel_file
+
+    path = os.path.join(work_dir, f"config_{os.path.basename(excel_file)}.yaml")
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+def run(args) -> Dict:
+    """执行一次基准，返回结果"""
+    from utils.data_manager import DataManager
+    from utils.search_engine import SearchEngine
+
+    work_dir = args.work_dir or os.path.join(tempfile.gettempdir(), 'wechat_bot_bench')
+    os.makedirs(work_dir, exist_ok=True)
+    excel_file = prepare_catalog(args.rows, args.seed, work_dir)
+    config_path = write_config(excel_file, work_dir)
+
+    # 分词词典在首次分词时加载，提前初始化以免计入加载耗时和内存
+    jieba.initialize()
+
+    data_manager = DataManager(config_path)
+    build_indexes = data_manager._build_indexes
+    timings = {}
+
+    def timed_build_indexes():
+        start = time.perf_counter()
+        build_indexes()
+        timings['index_build_s'] = time.perf_counter() - start
+
+    data_manager._build_indexes = timed_build_indexes
+    start = time.perf_counter()
+    if not data_manager.load_excel_data():
+        raise SystemExit(f"加载失败: {excel_file}")
+    load_s = time.perf_counter() - start
+    data_manager._build_indexes = build_indexes
+
+    # 在 tracemalloc 下重建一次索引，得到索引本身占用的内存
+    catalog_mb = data_manager.data.memory_usage(deep=True).sum() / 2 ** 20
+    tracemalloc.start()
+    build_indexes()
+    index_mb, index_peak_mb = (size / 2 ** 20 for size in tracemalloc.get_traced_memory())
+    tracemalloc.stop()
+
+    if args.queries_file and os.path.exists(args.queries_file):
+        queries = load_queries(args.queries_file)
+    else:
+        queries = generate_queries(data_manager.data, args.queries, args.seed)
+        if args.queries_file:
+            save_queries(queries, args.queries_file)
+
+    search_engine = SearchEngine(data_manager)
+
+    # 第一遍：每个查询第一次出现时未命中缓存，重复出现的计入带缓存延迟
+    cold, warm, by_kind, seen = [], [], {}, set()
+    for item in queries:
+        key = search_engine.get_cache_key(item['query'])
+        start = time.perf_counter()
+        search_engine.intelligent_search(item['query'])
+        elapsed = time.perf_counter() - start
+        if key in seen:
+            warm.append(elapsed)
+            continue
+        seen.add(key)
+        cold.append(elapsed)
+        by_kind.setdefault(item['kind'], []).append(elapsed)
+
+    # 第二遍：全部命中缓存
+    for item in queries:
+        start = time.perf_counter()
+        search_engine.intelligent_search(item['query'])
+        warm.append(time.perf_counter() - start)
+
+    return {
+        'rows': args.rows,
+        'seed': args.seed,
+        'queries': len(queries),
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'load_s': load_s,
+        'index_build_s': timings.get('index_build_s', 0.0),
+        'catalog_mb': catalog_mb,
+        'index_mb': index_mb,
+        'index_peak_mb': index_peak_mb,
+        'rss_mb': rss_mb(),
+        'index_keys': len(data_manager.drama_index) + len(data_manager.actor_index),
+        'cold': summarize(cold),
+        'warm': summarize(warm),
+        'by_kind': {kind: summarize(values) for kind, values in sorted(by_kind.items())},
+    }
+
+
+def lookup(result: Dict, key: str) -> float:
+    """按 'a.b' 形式取嵌套指标"""
+    value = result
+    for part in key.split('.'):
+        value = value[part]
+    return value
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """打印与基线的对比，返回变慢超过容差的指标"""
+    if (result['rows'], result['seed']) != (baseline.get('rows'), baseline.get('seed')):
+        print(f"注意：基线为 {baseline.get('rows')} 行 seed={baseline.get('seed')}，与本次不同")
+
+    regressions = []
+    print(f"{'指标':<18} {'基线':>10} {'本次':>10} {'变化':>8}")
+    for key, label in COMPARED_METRICS:
+        try:
+            old, new = lookup(baseline, key), lookup(result, key)
+        except (KeyError, TypeError):
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > tolerance:
+            regressions.append(key)
+            flag = '  变慢'
+        print(f"{label:<18} {old:>10.2f} {new:>10.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    """运行基准并输出结果"""
+    parser = argparse.ArgumentParser(description="搜索基准")
+    parser.add_argument('--rows', type=int, default=10000, help="合成数据行数（建议 10000~500000）")
+    parser.add_argument('--queries', type=int, default=200, help="查询条数")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--queries-file', help="查询集文件：存在时回放，不存在时生成并保存")
+    parser.add_argument('--work-dir', help="合成数据缓存目录，默认在系统临时目录下")
+    parser.add_argument('--output', help="结果JSON文件")
+    parser.add_argument('--baseline', help="基线结果JSON文件")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的变慢比例")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    print(f"{result['rows']} 行，{result['queries']} 条查询")
+    print(f"加载 {result['load_s']:.2f}s（建索引 {result['index_build_s']:.2f}s），"
+          f"表格 {result['catalog_mb']:.0f}MB，索引 {result['index_mb']:.0f}MB，索引键 {result['index_keys']}")
+    print(f"{'':<12} {'p50(ms)':>9} {'p90(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9}")
+    for name, summary in [('未缓存', result['cold']), ('带缓存', result['warm'])] + list(result['by_kind'].items()):
+        print(f"{name:<12} {summary['p50_ms']:>9.2f} {summary['p90_ms']:>9.2f} "
+              f"{summary['p99_ms']:>9.2f} {summary['max_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print(f"超过容差 {args.tolerance:.0%} 的指标: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
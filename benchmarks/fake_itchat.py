@@ -0,0 +1,124 @@
+"""
+模拟 itchat - 离线压测用的替身模块
+
+实现机器人用到的 itchat 接口：msg_register 记录消息处理器，inject() 像 itchat 的接收线程一样
+调用它们；send() 只记录 (时刻, 接收方, 内容)；auto_login 直接成功，run() 阻塞到 logout()。
+get_chatrooms/update_chatroom 返回预先登记的群及成员数。
+
+必须在导入 wechat_bot 之前调用 install()，用本模块替换 sys.modules['itchat']。
+"""
+import sys
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, List, Tuple
+
+content = types.SimpleNamespace(TEXT='Text')
+
+_handlers: Dict[Tuple[str, bool], Callable] = {}
+_chatrooms: Dict[str, int] = {}
+_sent: List[Tuple[float, str, str]] = []
+_sent_lock = threading.Lock()
+_logged_out = threading.Event()
+_running = threading.Event()
+
+
+def install():
+    """替换 itchat 模块"""
+    sys.modules['itchat'] = sys.modules[__name__]
+    sys.modules['itchat.content'] = content
+
+
+def reset():
+    """清空处理器、群和发送记录"""
+    _handlers.clear()
+    _chatrooms.clear()
+    with _sent_lock:
+        _sent.clear()
+    _logged_out.clear()
+    _running.clear()
+
+
+def add_chatroom(user_name: str, member_count: int):
+    """登记一个群及其成员数"""
+    _chatrooms[user_name] = member_count
+
+
+def msg_register(msg_type, isGroupChat: bool = False, **kwargs):
+    """登记消息处理器"""
+    types_ = msg_type if isinstance(msg_type, (list, tuple)) else [msg_type]
+
+    def decorator(func):
+        for item in types_:
+            _handlers[(item, isGroupChat)] = func
+        return func
+    return decorator
+
+
+def inject(msg: Dict[str, Any], is_group: bool) -> bool:
+    """在调用线程中把一条消息交给已登记的处理器，没有处理器时返回False"""
+    handler = _handlers.get((msg.get('Type', content.TEXT), is_group))
+    if handler is None:
+        return False
+    handler(msg)
+    return True
+
+
+def send(msg: str, toUserName: str = None, **kwargs):
+    """记录一次发送"""
+    with _sent_lock:
+        _sent.append((time.monotonic(), toUserName, msg))
+    return {'BaseResponse': {'Ret': 0}}
+
+
+def sent_messages() -> List[Tuple[float, str, str]]:
+    """已发送消息的副本"""
+    with _sent_lock:
+        return list(_sent)
+
+
+def auto_login(loginCallback: Callable = None, **kwargs) -> bool:
+    """直接登录成功"""
+    _logged_out.clear()
+    if loginCallback:
+        loginCallback()
+    return True
+
+
+def run(debug: bool = False, blockThread: bool = True):
+    """阻塞到 logout()，模拟 itchat 的消息循环"""
+    _running.set()
+    if blockThread:
+        _logged_out.wait()
+
+
+def wait_running(timeout: float = None) -> bool:
+    """等待机器人进入消息循环"""
+    return _running.wait(timeout)
+
+
+def logout():
+    """结束 run()"""
+    _running.clear()
+    _logged_out.set()
+
+
+def _chatroom(user_name: str) -> Dict[str, Any]:
+    return {'UserName': user_name, 'MemberCount': _chatrooms.get(user_name, 0)}
+
+
+def get_chatrooms(update: bool = False, **kwargs) -> List[Dict[str, Any]]:
+    """全部群"""
+    return [_chatroom(user_name) for user_name in _chatrooms]
+
+
+def update_chatroom(user_names, detailedMember: bool = False, **kwargs):
+    """刷新指定的群"""
+    if isinstance(user_names, str):
+        return _chatroom(user_names)
+    return [_chatroom(user_name) for user_name in user_names]
+
+
+def search_friends(*args, **kwargs):
+    """当前登录用户"""
+    return {'UserName': '@self', 'NickName': 'simulated-bot'}
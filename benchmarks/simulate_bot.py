@@ -0,0 +1,321 @@
+"""
+离线消息流模拟 - 用模拟 itchat 对完整的机器人做端到端压测
+
+按配置的速率从多个模拟群和用户注入群聊/私聊文本消息，消息经 itchat 处理器进入
+WeChatBot（过滤、安全检查、流水线、发送调度与生产环境完全相同），发送的消息连同时刻被记录下来。
+结束后统计回复延迟、吞吐、频率限制拒绝、丢弃与合并次数以及线程数。
+
+回复按会话先进先出对应到请求：被频率限制拒绝的请求（通过 SecurityManager.reserve 的返回值识别）
+和预计被合并的重复查询不参与对应；「第N批结果」（N>1）是同一回复的后续消息。
+
+模拟默认关闭静默时段、管理接口、状态持久化和指标文件，日志写到临时目录；
+其他配置可用 --set 覆盖，例如 --set security.rate_limit.max_per_minute=600。
+
+用法：python benchmarks/simulate_bot.py --duration 60 --group-rate 2 --private-rate 0.5 --groups 50
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(ROOT_DIR)
+sys.path.append(BENCH_DIR)
+
+import fake_itchat
+
+fake_itchat.install()
+
+import yaml
+
+from bench_search import percentile, prepare_catalog
+from synthetic_catalog import generate_queries
+
+# 同一回复的后续消息
+CONTINUATION_PATTERN = re.compile(r'^📺 第(\d+)批结果')
+
+
+def parse_override(text: str):
+    """解析 --set a.b.c=value，value 按 YAML 解析"""
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"格式应为 key=value: {text}")
+    return key.split('.'), yaml.safe_load(value)
+
+
+def write_config(args, work_dir: str) -> str:
+    """基于项目配置生成模拟用的配置文件"""
+    with open(os.path.join(ROOT_DIR, 'config.yaml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+
+    overrides = [
+        (['security', 'quiet_hours', 'enabled'], False),
+        (['security', 'quiet_hours', 'queue_file'], os.path.join(work_dir, 'quiet_queue.json')),
+        (['admin_server', 'enabled'], False),
+        (['state', 'enabled'], False),
+        (['metrics', 'enabled'], False),
+        (['config_watch_interval'], 0),
+        (['logging', 'level'], 'WARNING'),
+        (['logging', 'file'], os.path.join(work_dir, 'simulate_bot.log')),
+        (['tracing', 'file'], os.path.join(work_dir, 'traces.jsonl')),
+        (['query_log', 'file'], os.path.join(work_dir, 'queries.tsv')),
+        (['query_log', 'hot_set_file'], os.path.join(work_dir, 'hot_queries.json')),
+    ]
+    if args.rows:
+        overrides.append((['data_source', 'excel_file'], prepare_catalog(args.rows, args.seed, work_dir)))
+    overrides += args.set or []
+
+    for path, value in overrides:
+        section = config
+        for key in path[:-1]:
+            section = section.setdefault(key, {})
+        section[path[-1]] = value
+
+    path = os.path.join(work_dir, 'simulate_config.yaml')
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+class Tracker:
+    """记录注入的请求和被拒绝的请求，把发送的消息对应到请求"""
+
+    def __init__(self, coalesce_window: float):
+        self.coalesce_window = coalesce_window
+        self.lock = threading.Lock()
+        self.pending = {}  # 会话 -> deque[(注入时刻, 用户, 查询)]
+        self.recent_queries = {}  # (会话, 查询) -> 最近一次注入时刻
+        self.injected = 0
+        self.expected_coalesced = 0
+        self.rejected = 0
+
+    def on_inject(self, conversation: str, user: str, query: str, now: float):
+        """登记一条注入的请求"""
+        with self.lock:
+            self.injected += 1
+            last = self.recent_queries.get((conversation, query))
+            self.recent_queries[(conversation, query)] = now
+            if last is not None and now - last < self.coalesce_window:
+                self.expected_coalesced += 1
+                return
+            self.pending.setdefault(conversation, deque()).append((now, user, query))
+
+    def on_reject(self, conversation: str, user: str):
+        """频率限制拒绝：去掉该会话中该用户最早的待回复请求"""
+        with self.lock:
+            self.rejected += 1
+            queue = self.pending.get(conversation)
+            if not queue:
+                return
+            for index, (_, pending_user, _) in enumerate(queue):
+                if pending_user == user:
+                    del queue[index]
+                    return
+
+    def match_replies(self, sent) -> Dict[str, Any]:
+        """按会话先进先出对应回复，返回首条消息延迟和未回复数"""
+        latencies = []
+        replies = 0
+        with self.lock:
+            pending = {conversation: deque(queue) for conversation, queue in self.pending.items()}
+
+        for sent_at, conversation, message in sent:
+            match = CONTINUATION_PATTERN.match(message)
+            if match and int(match.group(1)) > 1:
+                continue
+            queue = pending.get(conversation)
+            if not queue:
+                continue
+            injected_at = queue.popleft()[0]
+            latencies.append(sent_at - injected_at)
+            replies += 1
+
+        return {
+            'replies': replies,
+            'unanswered': sum(len(queue) for queue in pending.values()),
+            'latencies': latencies
+        }
+
+
+def sample_threads(stop: threading.Event, samples: List[Dict[str, int]], interval: float = 0.5):
+    """定期按名称前缀统计线程数"""
+    while not stop.wait(interval):
+        counts = Counter(re.sub(r'[-_]\d+$', '', thread.name) for thread in threading.enumerate())
+        counts['total'] = sum(counts.values())
+        samples.append(dict(counts))
+
+
+def inject_messages(args, queries: List[Dict[str, str]], tracker: Tracker):
+    """按泊松过程注入消息，在单个线程中调用处理器（与 itchat 的接收线程相同）"""
+    rng = random.Random(args.seed)
+    total_rate = args.group_rate + args.private_rate
+    if total_rate <= 0:
+        return
+
+    deadline = time.monotonic() + args.duration
+    next_at = time.monotonic()
+    while True:
+        next_at += rng.expovariate(total_rate)
+        if next_at >= deadline:
+            break
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        query = rng.choice(queries)['query']
+        is_group = rng.random() < args.group_rate / total_rate
+        if is_group:
+            group = f"@@sim_group_{rng.randrange(args.groups)}"
+            user = f"@sim_user_{rng.randrange(args.users)}"
+            msg = {'Type': 'Text', 'Content': query, 'FromUserName': group, 'ActualUserName': user}
+            conversation = group
+        else:
+            user = f"@sim_user_{rng.randrange(args.users)}"
+            msg = {'Type': 'Text', 'Content': query, 'FromUserName': user}
+            conversation = user
+
+        tracker.on_inject(conversation, user, query, time.monotonic())
+        fake_itchat.inject(msg, is_group)
+
+
+def run(args) -> Dict[str, Any]:
+    """启动机器人、注入消息、等待发送完毕并汇总结果"""
+    work_dir = args.work_dir or os.path.join(tempfile.gettempdir(), 'wechat_bot_bench')
+    os.makedirs(work_dir, exist_ok=True)
+    config_path = write_config(args, work_dir)
+
+    from wechat_bot import WeChatBot
+
+    fake_itchat.reset()
+    rng = random.Random(args.seed)
+    for i in range(args.groups):
+        fake_itchat.add_chatroom(f"@@sim_group_{i}", rng.choice([8, 15, 40, 120, 300, 500]))
+
+    bot = WeChatBot(config_path)
+    coalesce_window = bot.config.get('pipeline', {}).get('coalesce_window', 10)
+    tracker = Tracker(coalesce_window if bot.pipeline else 0)
+
+    # 记录被频率限制拒绝的请求，用于对应回复
+    reserve = bot.security_manager.reserve
+
+    def tracked_reserve(group_id, user_id, amount=1):
+        reservation, reason = reserve(group_id, user_id, amount)
+        if reservation is None:
+            tracker.on_reject(group_id, user_id)
+        return reservation, reason
+
+    bot.security_manager.reserve = tracked_reserve
+
+    bot_thread = threading.Thread(target=bot.start, name="bot-main", daemon=True)
+    bot_thread.start()
+    if not fake_itchat.wait_running(args.startup_timeout):
+        raise SystemExit("机器人未能启动，请查看日志")
+
+    queries = generate_queries(bot.data_manager.data, args.queries, args.seed)
+    thread_samples = []
+    stop_sampling = threading.Event()
+    sampler = threading.Thread(target=sample_threads, args=(stop_sampling, thread_samples),
+                               name="thread-sampler", daemon=True)
+    sampler.start()
+
+    started = time.monotonic()
+    inject_messages(args, queries, tracker)
+    injected_at = time.monotonic()
+
+    # 等待所有已准入的回复发送完毕
+    drain_deadline = injected_at + args.drain
+    while time.monotonic() < drain_deadline:
+        stats = bot.get_runtime_stats()
+        busy = stats.get('pending_messages', 0) + stats.get('queued_messages', 0)
+        busy += sum(value for key, value in stats.items() if key.endswith('_queue'))
+        if not busy and not bot.security_manager.get_security_status()['pending_reservations']:
+            break
+        time.sleep(0.2)
+    finished = time.monotonic()
+
+    runtime_stats = bot.get_runtime_stats()
+    security_status = bot.security_manager.get_security_status()
+    stop_sampling.set()
+    sampler.join()
+    bot.stop()
+    bot_thread.join(10)
+
+    sent = fake_itchat.sent_messages()
+    matched = tracker.match_replies(sent)
+    latencies = matched['latencies']
+    elapsed = finished - started
+    peak_threads = {}
+    for sample in thread_samples:
+        for name, count in sample.items():
+            peak_threads[name] = max(peak_threads.get(name, 0), count)
+
+    return {
+        'duration_s': args.duration,
+        'elapsed_s': elapsed,
+        'injected': tracker.injected,
+        'messages_sent': len(sent),
+        'replies': matched['replies'],
+        'unanswered': matched['unanswered'],
+        'throughput_msgs_per_min': len(sent) / elapsed * 60 if elapsed else 0.0,
+        'throughput_replies_per_min': matched['replies'] / elapsed * 60 if elapsed else 0.0,
+        'reply_latency_s': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else 0.0,
+        },
+        'rejected': security_status.get('rejected_counts', {}),
+        'shed_requests': runtime_stats.get('shed_requests', 0),
+        'coalesced_requests': runtime_stats.get('coalesced_requests', 0),
+        'dropped_messages': runtime_stats.get('dropped_messages', 0),
+        'threads_peak': peak_threads,
+    }
+
+
+def main():
+    """运行模拟并打印结果"""
+    parser = argparse.ArgumentParser(description="离线消息流模拟")
+    parser.add_argument('--duration', type=float, default=60, help="注入消息的时长(秒)")
+    parser.add_argument('--group-rate', type=float, default=1.0, help="每秒群消息数")
+    parser.add_argument('--private-rate', type=float, default=0.2, help="每秒私聊消息数")
+    parser.add_argument('--groups', type=int, default=50, help="模拟群数量")
+    parser.add_argument('--users', type=int, default=500, help="模拟用户数量")
+    parser.add_argument('--queries', type=int, default=300, help="查询集大小")
+    parser.add_argument('--rows', type=int, default=0, help="使用合成数据的行数，0 表示使用配置中的数据文件")
+    parser.add_argument('--drain', type=float, default=120, help="注入结束后等待发送完毕的最长时间(秒)")
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--set', type=parse_override, action='append', metavar='KEY=VALUE', help="覆盖配置项")
+    parser.add_argument('--work-dir', help="临时文件目录，默认在系统临时目录下")
+    parser.add_argument('--output', help="结果JSON文件")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    latency = result['reply_latency_s']
+    print(f"注入 {result['injected']} 条消息，用时 {result['elapsed_s']:.1f}s（含等待发送）")
+    print(f"发送 {result['messages_sent']} 条消息，回复 {result['replies']} 次，未回复 {result['unanswered']} 次")
+    print(f"吞吐: {result['throughput_msgs_per_min']:.1f} 条/分钟，{result['throughput_replies_per_min']:.1f} 次回复/分钟")
+    print(f"回复延迟(s): p50 {latency['p50']:.2f}  p95 {latency['p95']:.2f}  "
+          f"p99 {latency['p99']:.2f}  max {latency['max']:.2f}")
+    print(f"频率限制拒绝: {result['rejected']}")
+    print(f"丢弃请求 {result['shed_requests']}，合并请求 {result['coalesced_requests']}，"
+          f"发送队列丢弃 {result['dropped_messages']}")
+    print(f"线程峰值: {result['threads_peak']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
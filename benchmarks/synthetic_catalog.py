@@ -0,0 +1,179 @@
+"""
+合成数据生成 - 生成接近真实规模和分布的剧集表格与可回放的查询集
+
+剧名由常见短剧/电视剧用词组合而成，演员从有限的艺名池中按长尾分布抽取（少数演员出演大量剧集），
+一部分行复用其他行的网盘链接。同一个 seed 总是生成相同的数据和查询。
+
+用法：python benchmarks/synthetic_catalog.py --rows 100000 --output data/synthetic_100k.xlsx
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from utils.t2s_table import TRADITIONAL, SIMPLIFIED
+
+COLUMNS = ["媒体类型", "剧名", "集数", "演员名称", "夸克网盘链接", "百度网盘链接"]
+
+MEDIA_TYPES = [("短剧", 70), ("电视剧", 20), ("电影", 8), ("动漫", 2)]
+
+# 剧名组成部分：前缀 + 主体 + 后缀，随机省略部分成分
+TITLE_PREFIXES = [
+    "重生", "穿越", "闪婚", "八零", "九零", "七零", "回到", "离婚后", "退婚后", "开局", "我在", "大唐",
+    "末世", "逆天", "隐世", "绝世", "都市", "乡村", "豪门", "千金", "神医", "战神", "王者", "天降",
+]
+TITLE_SUBJECTS = [
+    "悍妻", "萌宝", "总裁", "夫人", "小娇妻", "女帝", "神豪", "赘婿", "龙王", "医妃", "将军", "皇后",
+    "富婆", "首富", "军嫂", "保姆", "村花", "狂婿", "仙尊", "剑神", "丹帝", "小师妹", "老公", "前夫",
+]
+TITLE_SUFFIXES = [
+    "一路狂飙", "虐渣记", "逆袭", "归来", "宠上天", "杀疯了", "不好惹", "驾到", "传奇", "风云", "之恋",
+    "征服军区老公", "掀翻全场", "追妻火葬场", "闪耀人生", "十里桃花", "长安", "江湖", "风华", "无双",
+]
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+GIVEN_CHARS = "子雨欣怡佳梦雪晨一诗思婷嘉琪宇浩轩博文杰俊凯明涛鹏飞磊强伟芳娜静敏燕丽霞秀兰玲洁琳颖倩瑶萱涵若曦景天泽楠乐安然星辰墨言"
+
+_S2T_TABLE = str.maketrans(SIMPLIFIED, TRADITIONAL)
+
+
+def _random_id(rng: random.Random, length: int) -> str:
+    """网盘分享码"""
+    return ''.join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(length))
+
+
+def _make_actor_pool(rng: random.Random, size: int) -> List[str]:
+    """生成不重复的演员名"""
+    names = set()
+    while len(names) < size:
+        given = ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice([1, 2, 2])))
+        names.add(rng.choice(SURNAMES) + given)
+    return sorted(names)
+
+
+def _make_title(rng: random.Random) -> str:
+    """组合一个剧名"""
+    parts = []
+    if rng.random() < 0.7:
+        parts.append(rng.choice(TITLE_PREFIXES))
+    parts.append(rng.choice(TITLE_SUBJECTS))
+    if rng.random() < 0.6:
+        parts.append(rng.choice(TITLE_SUFFIXES))
+    title = ''.join(parts)
+    # 同名剧较多时加上续集编号
+    if rng.random() < 0.15:
+        title += rng.choice(["第二季", "2", "（上）", "（下）", "续集"])
+    return title
+
+
+def generate_catalog(rows: int, seed: int = 1, duplicate_link_ratio: float = 0.05) -> pd.DataFrame:
+    """生成 rows 行的剧集表格，列与 data/media_database.xlsx 一致"""
+    rng = random.Random(seed)
+    actor_pool = _make_actor_pool(rng, max(50, min(20000, rows // 5)))
+    # Zipf 式权重：排名越靠前的演员出演越多
+    actor_weights = [1 / (rank + 1) for rank in range(len(actor_pool))]
+    media_types, media_weights = zip(*MEDIA_TYPES)
+
+    data = []
+    links = []
+    for _ in range(rows):
+        media_type = rng.choices(media_types, media_weights)[0]
+        if media_type == "电影":
+            episodes = 1
+        elif media_type == "短剧":
+            episodes = rng.randint(20, 100)
+        else:
+            episodes = rng.randint(12, 80)
+
+        actors = rng.choices(actor_pool, actor_weights, k=rng.randint(1, 3))
+        actor_text = "、".join(dict.fromkeys(actors))
+
+        if links and rng.random() < duplicate_link_ratio:
+            quark_link, baidu_link = rng.choice(links)
+        else:
+            quark_link = f"https://pan.quark.cn/s/{_random_id(rng, 12)}"
+            baidu_link = f"https://pan.baidu.com/s/1{_random_id(rng, 22)}?pwd={rng.randint(0, 9999):04d}"
+            links.append((quark_link, baidu_link))
+
+        data.append([media_type, _make_title(rng), episodes, actor_text, quark_link, baidu_link])
+
+    return pd.DataFrame(data, columns=COLUMNS)
+
+
+def generate_queries(catalog: pd.DataFrame, count: int, seed: int = 1) -> List[Dict[str, str]]:
+    """生成可回放的查询集，每条为 {'kind': 类型, 'query': 查询}
+
+    类型：完整剧名、剧名片段、演员名、繁体剧名、错别字剧名、无结果查询。
+    """
+    rng = random.Random(seed)
+    titles = [title for title in catalog['剧名'].astype(str) if title and title != 'nan']
+    actors = sorted({actor.strip() for text in catalog['演员名称'].dropna().astype(str)
+                     for actor in text.split('、') if actor.strip() and text != 'nan'})
+    kinds = [('title', 30), ('fragment', 25), ('actor', 20), ('traditional', 10), ('typo', 10), ('miss', 5)]
+    names, weights = zip(*kinds)
+
+    queries = []
+    for _ in range(count):
+        kind = rng.choices(names, weights)[0]
+        title = rng.choice(titles)
+        if kind == 'title':
+            query = title
+        elif kind == 'fragment':
+            length = min(len(title), rng.randint(2, 4))
+            start = rng.randint(0, len(title) - length)
+            query = title[start:start + length]
+        elif kind == 'actor':
+            query = rng.choice(actors)
+        elif kind == 'traditional':
+            query = title.translate(_S2T_TABLE)
+        elif kind == 'typo':
+            position = rng.randrange(len(title))
+            query = title[:position] + rng.choice(GIVEN_CHARS) + title[position + 1:]
+        else:
+            query = ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.randint(3, 6)))
+        queries.append({'kind': kind, 'query': query})
+    return queries
+
+
+def save_queries(queries: List[Dict[str, str]], path: str):
+    """保存查询集（JSON）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(queries, f, ensure_ascii=False, indent=1)
+
+
+def load_queries(path: str) -> List[Dict[str, str]]:
+    """读取查询集"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    """生成表格文件和查询集"""
+    parser = argparse.ArgumentParser(description="生成合成剧集表格")
+    parser.add_argument('--rows', type=int, default=10000, help="行数")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='data/synthetic_catalog.xlsx', help="输出的Excel文件")
+    parser.add_argument('--queries', type=int, default=0, help="同时生成的查询条数")
+    parser.add_argument('--queries-output', default='data/synthetic_queries.json')
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.rows, args.seed)
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    catalog.to_excel(args.output, index=False, engine='openpyxl')
+    print(f"已生成 {len(catalog)} 行: {args.output}")
+
+    if args.queries:
+        save_queries(generate_queries(catalog, args.queries, args.seed), args.queries_output)
+        print(f"已生成 {args.queries} 条查询: {args.queries_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+内存报告 - 按数据结构列出内存占用：数据表、剧名/演员索引、模糊候选表、缓存、频率限制记录、发送队列
+
+用法：
+  python memory_report.py                                  # 离线：加载数据并恢复运行状态后统计
+  python memory_report.py --replay logs/queries.tsv --queries 500   # 先用查询日志中最常见的查询填充缓存
+  python memory_report.py --trace                          # 同时用 tracemalloc 列出分配最多的代码行
+  python memory_report.py --url http://127.0.0.1:8080 --token xxx  # 查看运行中的机器人（管理接口 /memory）
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+import urllib.request
+from typing import Any, Dict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.memory_accounting import COMPONENTS, format_bytes
+from utils.query_log import aggregate, load_query_log
+
+
+def fetch_report(url: str, token: str) -> Dict[str, Any]:
+    """从运行中的机器人的管理接口获取内存统计"""
+    request = urllib.request.Request(url.rstrip('/') + '/memory')
+    if token:
+        request.add_header('Authorization', f"Bearer {token}")
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.load(response)
+
+
+def build_report(args) -> Dict[str, Any]:
+    """离线加载数据、恢复运行状态并按需回放查询后统计"""
+    if args.trace:
+        tracemalloc.start(args.trace_frames)
+
+    from wechat_bot import WeChatBot
+    bot = WeChatBot(args.config)
+    if not bot.data_manager.load_excel_data():
+        raise SystemExit("❌ 数据加载失败")
+    bot._restore_state()
+
+    if args.replay:
+        records = load_query_log(args.replay)
+        queries = aggregate(records, hot_size=args.queries, min_count=1)['hot_set']
+        print(f"回放 {len(queries)} 个查询以填充缓存...")
+        bot._warm_caches(queries, float('inf'))
+
+    return bot.get_memory_report()
+
+
+def print_report(report: Dict[str, Any]):
+    """输出报告"""
+    labels = dict(COMPONENTS)
+    rss = report['rss_bytes']
+    print(f"🧠 常驻内存 {format_bytes(rss)}（统计用时 {report['elapsed_ms']:.0f} ms）\n")
+    for component in report['components']:
+        print(f"  {labels.get(component['name'], component['name']):<10} {format_bytes(component['bytes']):>10}  "
+              f"{component['bytes'] / rss:6.1%}")
+    print(f"  {'其他':<10} {format_bytes(report['unaccounted_bytes']):>10}  {report['unaccounted_bytes'] / rss:6.1%}"
+          "  （解释器、依赖库、未统计的对象）")
+
+    allocations = report.get('tracemalloc')
+    if not allocations:
+        return
+    print(f"\n📍 tracemalloc：当前 {format_bytes(allocations['current_bytes'])}，"
+          f"峰值 {format_bytes(allocations['peak_bytes'])}")
+    for site in allocations['top_sites']:
+        print(f"  {format_bytes(site['bytes']):>10}  {site['count']:9d} 个  {site['site']}")
+    if allocations['growth']:
+        print("\n📈 距上次报告增长最多：")
+        for site in allocations['growth']:
+            print(f"  +{format_bytes(site['bytes_diff']):>10}  {site['count_diff']:+9d} 个  {site['site']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按数据结构列出内存占用")
+    parser.add_argument('--config', default='config.yaml', help="配置文件")
+    parser.add_argument('--url', help="运行中的机器人的管理接口地址，如 http://127.0.0.1:8080")
+    parser.add_argument('--token', default='', help="管理接口访问令牌")
+    parser.add_argument('--replay', nargs='*', help="回放查询日志以填充缓存")
+    parser.add_argument('--queries', type=int, default=1000, help="回放的查询数（按出现次数取前N个）")
+    parser.add_argument('--trace', action='store_true', help="用 tracemalloc 跟踪分配位置（离线模式）")
+    parser.add_argument('--trace-frames', type=int, default=1, help="tracemalloc 记录的调用栈深度")
+    parser.add_argument('--json', action='store_true', help="输出JSON")
+    args = parser.parse_args()
+
+    report = fetch_report(args.url, args.token) if args.url else build_report(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
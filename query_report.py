@@ -0,0 +1,65 @@
+"""
+查询报告 - 汇总查询日志，输出热门查询、无结果查询，并生成启动预热用的热门查询集
+
+用法：
+  python query_report.py                              # 汇总 logs/queries.tsv(.1)，写入 data/hot_queries.json
+  python query_report.py --top 50 --since 7           # 只看最近7天
+  python query_report.py --hot-size 500 --min-count 3
+  python query_report.py --dry-run                    # 只输出报告，不写热门查询集
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.query_log import aggregate, load_query_log, save_hot_set
+
+
+def print_table(title: str, rows):
+    """输出查询列表"""
+    print(f"\n{title}")
+    if not rows:
+        print("  （无）")
+        return
+    for rank, row in enumerate(rows, 1):
+        print(f"  {rank:3d}. {row['count']:6d} 次  {row['results']:4d} 个结果  "
+              f"{row['avg_latency_ms']:8.1f} ms  {row['query']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇总查询日志并生成热门查询集")
+    parser.add_argument('files', nargs='*', default=['logs/queries.tsv.1', 'logs/queries.tsv'], help="查询日志文件")
+    parser.add_argument('--top', type=int, default=20, help="热门查询和无结果查询各显示多少个")
+    parser.add_argument('--since', type=float, help="只统计最近N天")
+    parser.add_argument('--hot-size', type=int, default=200, help="热门查询集大小")
+    parser.add_argument('--min-count', type=int, default=2, help="进入热门查询集的最少出现次数")
+    parser.add_argument('--hot-file', default='data/hot_queries.json', help="热门查询集文件（config.yaml 中的 query_log.hot_set_file）")
+    parser.add_argument('--dry-run', action='store_true', help="不写热门查询集文件")
+    args = parser.parse_args()
+
+    records = load_query_log(args.files)
+    if args.since:
+        cutoff = time.time() - args.since * 86400
+        records = [record for record in records if record['ts'] >= cutoff]
+    if not records:
+        print("没有查询记录")
+        return
+
+    report = aggregate(records, top=args.top, hot_size=args.hot_size, min_count=args.min_count)
+    by_type = report['by_type']
+    print(f"📊 共 {report['total']} 次查询（群聊 {by_type.get('g', 0)}，私聊 {by_type.get('p', 0)}），"
+          f"{report['distinct']} 个不同查询，无结果 {report['zero_result_total']} 次"
+          f"（{report['zero_result_total'] / report['total']:.0%}）")
+    print_table(f"🔥 热门查询 Top {args.top}：", report['top'])
+    print_table(f"🈳 无结果查询 Top {args.top}（可考虑补充资源或同义词）：", report['zero_results'])
+
+    print(f"\n♨️ 热门查询集：{len(report['hot_set'])} 个查询")
+    if not args.dry_run:
+        save_hot_set(args.hot_file, report['hot_set'])
+        print(f"   已写入 {args.hot_file}，下次启动时用于预热缓存")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,13 @@ from utils.data_manager import DataManager
 from utils.search_engine import SearchEngine
 from utils.message_formatter import MessageFormatter
 from utils.security_manager import SecurityManager
+from utils.text_normalizer import normalize_text
+from utils.rate_limiter import SlidingWindowCounter
+from utils.quiet_queue import QuietHoursQueue
+from utils.send_scheduler import SendScheduler
+from utils.message_pipeline import MessagePipeline
+from utils.admin_server import AdminServer
+from utils.query_log import QueryLog, aggregate, load_hot_set, load_query_log, save_hot_set
 
 def test_data_loading():
     """测试数据加载"""
@@ -61,6 +68,34 @@ def test_search_functionality():
     
     return True
 
+def test_text_normalization():
+    """测试繁简、全半角归一化"""
+    print("\n🔍 测试文本归一化...")
+    
+    test_cases = [
+        ("瑯琊榜", "琅琊榜"),
+        ("長安十二時辰", "长安十二时辰"),
+        ("ＡＢＣ１２３", "abc123"),
+        ("《庆余年》 第二季！", "庆余年第二季"),
+    ]
+    
+    for text, expected in test_cases:
+        normalized = normalize_text(text)
+        print(f"   '{text}' -> '{normalized}'")
+        assert normalized == expected, f"归一化结果错误: {normalized}"
+    
+    data_manager = DataManager()
+    if not data_manager.load_excel_data():
+        print("❌ 数据加载失败，无法测试索引")
+        return False
+    
+    # 繁体剧名应命中精确索引
+    drama_name = str(data_manager.data.iloc[0]['剧名'])
+    traditional_name = drama_name.translate(str.maketrans("么个们儿书样爱养东乐", "麼個們兒書樣愛養東樂"))
+    assert data_manager._exact_search(traditional_name), "繁体剧名未命中精确索引"
+    
+    return True
+
 def test_message_formatting():
     """测试消息格式化"""
     print("\n🔍 测试消息格式化...")
@@ -94,6 +129,58 @@ def test_message_formatting():
     
     return True
 
+def test_message_packing():
+    """测试按字符预算打包消息和卡片缓存上限"""
+    print("\n🔍 测试消息打包...")
+    
+    import tempfile
+    import yaml
+    with open("config.yaml", encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['message_format']['max_message_chars'] = 200
+    config['message_format']['card_cache_size'] = 2
+    config_path = os.path.join(tempfile.mkdtemp(), "config.yaml")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    
+    formatter = MessageFormatter(config_path)
+    budget = formatter.config_service.snapshot.message_budget
+    assert budget == 200
+    
+    # 单张卡片超出预算时截断，仍装入一条消息
+    messages = formatter._split_into_messages(["长" * 500], 0, 1)
+    print(f"   超长卡片: {len(messages[0])} 字符")
+    assert len(messages) == 1 and len(messages[0]) <= budget and messages[0].endswith("…")
+    
+    # 多批时每条消息都为批次标题留出长度，结果过多的提示只占用第一条消息的预算
+    items = [f"{i}" + "卡" * 60 for i in range(8)]
+    messages = formatter._split_into_messages(items, 0, 20)
+    print(f"   8张卡片（共20个结果）: {[len(message) for message in messages]}")
+    assert len(messages) > 1
+    assert all(len(message) <= budget for message in messages)
+    assert messages[0].startswith("找到 20 个相关结果") and "第1批" in messages[0]
+    assert all(item in ''.join(messages) for item in items), "打包后丢失了卡片"
+    
+    # 单条消息卡片数上限与字符预算同时生效
+    short_items = [f"短{i}" for i in range(5)]
+    assert len(formatter._split_into_messages(short_items, 2, 5)) == 3, "卡片数上限未生效"
+    card_counts = lambda messages: [message.count("卡" * 60) for message in messages]
+    assert card_counts(formatter._split_into_messages(items[:4], 5, 4)) == [3, 1], "字符预算未生效"
+    assert card_counts(formatter._split_into_messages(items[:4], 2, 4)) == [2, 2]
+    
+    # 卡片缓存超过上限时淘汰最久未用的卡片
+    rows = [{'row_id': i, 'generation': 1, 'drama_name': f"剧{i}", 'actors': "演员", 'episodes': '10',
+             'quark_link': '', 'baidu_link': ''} for i in range(3)]
+    for row in rows:
+        formatter._get_card(row)
+    assert formatter.get_cache_stats()['card_cache_entries'] == 2
+    formatter._get_card(rows[2])
+    assert formatter.card_hits == 1
+    formatter._get_card(rows[0])
+    assert formatter.card_misses == 4, "被淘汰的卡片应重新格式化"
+    
+    return True
+
 def test_security_manager():
     """测试安全管理器"""
     print("\n🔍 测试安全管理器...")
@@ -122,6 +209,471 @@ def test_security_manager():
     
     return True
 
+def test_reservations():
+    """测试发送额度的预留、提交、释放和超时回收（跨分片）"""
+    print("\n🔍 测试发送额度预留...")
+    
+    import tempfile
+    import yaml
+    with open("config.yaml", encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    rate_limit = config['security']['rate_limit']
+    rate_limit.update({'enabled': True, 'max_per_minute': 6, 'max_per_hour': 100, 'per_user_per_minute': 3,
+                       'per_group_per_minute': 100, 'lock_shards': 16, 'reservation_ttl': 600})
+    config_path = os.path.join(tempfile.mkdtemp(), "config.yaml")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    
+    security_manager = SecurityManager(config_path)
+    status = security_manager.get_security_status
+    
+    # 预留计入用户额度，超时未提交的预留在下一次准入时回收
+    reservation, _ = security_manager.reserve("group_a", "user_a", 3)
+    assert reservation and not security_manager.reserve("group_a", "user_a", 1)[0]
+    reservation.created_at -= 601
+    retry, _ = security_manager.reserve("group_a", "user_a", 1)
+    assert retry, "超时的预留未被回收"
+    assert status()['reserved_messages'] == 1 and status()['pending_reservations'] == 1
+    
+    # 回复为空时释放全部预留，用户额度恢复
+    security_manager.release(retry)
+    assert status()['reserved_messages'] == 0 and status()['pending_reservations'] == 0
+    
+    # 提交一条、释放一条（被拒发），剩余额度随回复结束释放，只有已发送的计入频率
+    reservation, _ = security_manager.reserve("group_a", "user_a", 3)
+    security_manager.commit(reservation, "group_a", "user_a")
+    security_manager.release(reservation, 1)
+    assert reservation.remaining == 1 and status()['reserved_messages'] == 1
+    security_manager.release(reservation)
+    assert status()['recent_messages_per_minute'] == 1 and status()['reserved_messages'] == 0
+    assert security_manager.reserve("group_a", "user_a", 2)[0] and not security_manager.reserve("group_a", "user_a", 1)[0]
+    security_manager.reset_rate_limits()
+    
+    # 全局限制对落在不同分片的用户同样生效
+    users, shards = [], set()
+    for i in range(1000):
+        shard = id(security_manager._shard(f"user_{i}"))
+        if shard not in shards:
+            shards.add(shard)
+            users.append(f"user_{i}")
+        if len(users) == 4:
+            break
+    reservations = [security_manager.reserve(f"group_{i}", user, 2)[0] for i, user in enumerate(users[:3])]
+    assert all(reservations)
+    reservation, reason = security_manager.reserve("group_x", users[3], 1)
+    print(f"   第4个分片的用户: {reason}")
+    assert reservation is None and security_manager.rejected_counts['global'] >= 1
+    
+    # 增加预留时同样受限，只能得到剩余的额度
+    security_manager.release(reservations[0])
+    assert security_manager.resize_reservation(reservations[1], 5) == 3, "扩大预留应受用户和全局额度限制"
+    assert status()['reserved_messages'] == 5
+    
+    return True
+
+def test_rate_limiter():
+    """测试滑动窗口计数器"""
+    print("\n🔍 测试滑动窗口计数器...")
+    
+    counter = SlidingWindowCounter(60)
+    for i in range(5):
+        counter.add(now=100.0 + i)
+    
+    print(f"   窗口内计数: {counter.count(now=104.0)}")
+    assert counter.count(now=104.0) == 5
+    assert counter.allows(6, now=104.0)
+    assert not counter.allows(5, now=104.0)
+    
+    # 窗口滑过后计数归零
+    assert counter.count(now=170.0) == 0, "过期事件未被清理"
+    
+    return True
+
+def test_config_reload():
+    """测试配置热重载：成功时版本加一，配置文件有错误时保留原快照"""
+    print("\n🔍 测试配置重新加载...")
+    
+    import tempfile
+    from utils.config_service import ConfigService
+    
+    config_path = os.path.join(tempfile.mkdtemp(), "config.yaml")
+    with open("config.yaml", encoding='utf-8') as f:
+        original = f.read()
+    with open(config_path, 'w', encoding='utf-8') as f:
+        f.write(original)
+    
+    service = ConfigService(config_path)
+    snapshot = service.snapshot
+    
+    # 修改后重新加载，整体替换快照，版本加一
+    with open(config_path, 'w', encoding='utf-8') as f:
+        f.write(original.replace("max_per_minute: 10", "max_per_minute: 7"))
+    assert service.reload()
+    assert service.snapshot.version == snapshot.version + 1 and service.snapshot.max_per_minute == 7
+    assert snapshot.max_per_minute == 10, "旧快照不应被修改"
+    
+    # YAML 语法错误或顶层不是映射时保留上一份快照
+    reloaded = service.snapshot
+    for broken in ("security: [unclosed\n  rate_limit: {", "- just\n- a list\n"):
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write(broken)
+        assert not service.reload()
+        assert service.snapshot is reloaded
+    print(f"   版本 {snapshot.version} -> {service.snapshot.version}，错误配置未生效")
+    
+    return True
+
+def test_state_round_trip():
+    """测试运行状态快照与恢复：频率记录按停机时长平移，数据文件变化后不恢复结果缓存"""
+    print("\n🔍 测试运行状态恢复...")
+    
+    import sqlite3
+    import tempfile
+    import time
+    import yaml
+    from wechat_bot import WeChatBot
+    
+    work_dir = tempfile.mkdtemp()
+    with open("config.yaml", encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['state'] = {'enabled': True, 'file': os.path.join(work_dir, "state.db")}
+    config_path = os.path.join(work_dir, "config.yaml")
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    
+    def new_bot():
+        bot = WeChatBot(config_path)
+        assert bot.data_manager.load_excel_data()
+        return bot
+    
+    bot = new_bot()
+    bot.security_manager.record_message_sent("@@group_a", "@user_a")
+    bot.search_engine.intelligent_search("庆余年")
+    sections, versions = bot._collect_state()
+    assert bot.state_store.save(sections, versions)
+    saved_at = time.time()
+    original_age = sections['security']['users']["@user_a"][0][0]
+    
+    # 结果缓存未变化时不再导出
+    assert 'result_cache' not in bot._collect_state()[0]
+    
+    # 模拟停机 20 秒
+    conn = sqlite3.connect(config['state']['file'])
+    with conn:
+        conn.execute("UPDATE state SET saved_at = saved_at - 20")
+    conn.close()
+    
+    restored = new_bot()
+    restored._restore_state()
+    downtime = time.time() - saved_at + 20
+    users = restored.security_manager.export_state()['users']
+    print(f"   恢复的用户记录: {users}，结果缓存 {len(restored.search_engine.result_cache)} 条")
+    assert "@user_a" in users
+    age = users["@user_a"][0][0]
+    # 计数按5秒一桶记录，允许一桶的误差
+    assert abs(age - original_age - downtime) <= 6, "频率记录未按停机时长平移"
+    assert len(restored.search_engine.result_cache) == 1
+    
+    # 数据文件变化（签名不同）时丢弃结果缓存，频率记录照常恢复
+    changed = new_bot()
+    changed.data_manager.catalog_signature = "changed"
+    changed._restore_state()
+    assert len(changed.search_engine.result_cache) == 0
+    assert "@user_a" in changed.security_manager.export_state()['users']
+    
+    return True
+
+class _PipelineStubBot:
+    """流水线测试用的最小机器人：记录搜索和回复，可指定被安全检查拒绝的会话"""
+    
+    class _SecurityManager:
+        def release(self, reservation):
+            pass
+    
+    class _Formatter:
+        def format_search_results(self, results, query):
+            return [f"结果: {query}"]
+    
+    def __init__(self, search_delay: float = 0.0):
+        self.security_manager = self._SecurityManager()
+        self.message_formatter = self._Formatter()
+        self.search_delay = search_delay
+        self.rejected = set()
+        self.searches = []
+        self.replies = []
+    
+    def _filter_message(self, msg, is_group):
+        return {'from_user': msg['FromUserName'], 'actual_user': msg['FromUserName'], 'content': msg['Text'],
+                'contact': None, 'is_group': is_group}
+    
+    def _check_security(self, request):
+        request['reservation'] = None
+        if request['from_user'] in self.rejected:
+            self.rejected.discard(request['from_user'])
+            return False
+        return True
+    
+    def _match_special_command(self, content, from_user, actual_user=None, contact=None):
+        return None
+    
+    def _search(self, query, is_group):
+        import time
+        self.searches.append(query)
+        time.sleep(self.search_delay)
+        return [query]
+    
+    def _send_messages_with_delay(self, messages, from_user, actual_user, reservation=None):
+        self.replies.append((from_user, messages))
+        return True
+
+def test_coalescing_and_shedding():
+    """测试重复查询合并和接收队列满时的丢弃策略"""
+    print("\n🔍 测试请求合并与丢弃...")
+    
+    import asyncio
+    import time
+    
+    def wait_replies(bot, count):
+        deadline = time.monotonic() + 5
+        while len(bot.replies) < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+        # 多等一会儿，确认没有多余的回复
+        time.sleep(0.3)
+    
+    # 同一会话窗口内归一化后相同的查询只搜索一次、只回复一次；其他会话不受影响
+    bot = _PipelineStubBot(search_delay=0.1)
+    pipeline = MessagePipeline(bot, search_workers=2, coalesce_window=10)
+    pipeline.start()
+    for conversation, text in [("@@group_a", "庆余年"), ("@@group_a", " 庆余年 "), ("@@group_a", "慶餘年"),
+                               ("@@group_b", "庆余年")]:
+        pipeline.submit({'FromUserName': conversation, 'Text': text}, True)
+    wait_replies(bot, 2)
+    print(f"   搜索 {bot.searches}，回复 {len(bot.replies)} 次，合并 {pipeline.get_stats()['coalesced_requests']}")
+    assert len(bot.searches) == 2 and len(bot.replies) == 2
+    assert pipeline.get_stats()['coalesced_requests'] == 2
+    
+    # 被安全检查拒绝的查询不留下合并记录，重试时正常搜索
+    bot.rejected.add("@@group_c")
+    pipeline.submit({'FromUserName': "@@group_c", 'Text': "琅琊榜"}, True)
+    time.sleep(0.2)
+    pipeline.submit({'FromUserName': "@@group_c", 'Text': "琅琊榜"}, True)
+    wait_replies(bot, 3)
+    pipeline.stop()
+    assert bot.searches.count("琅琊榜") == 1 and bot.replies[-1][0] == "@@group_c", "被拒绝的查询重试时不应被合并"
+    
+    # 接收队列满时的丢弃策略（直接调用入队，不启动事件循环）
+    class Trace:
+        def __init__(self, name):
+            self.name = name
+            self.outcome = None
+        
+        def finish(self, outcome):
+            self.outcome = outcome
+    
+    for policy, kept, shed in [('drop_oldest', ['m2', 'm3'], 'm1'), ('drop_newest', ['m1', 'm2'], 'm3')]:
+        pipeline = MessagePipeline(_PipelineStubBot(), queue_size=2, shed_policy=policy)
+        pipeline._queues = {'ingress': asyncio.Queue(2)}
+        traces = {name: Trace(name) for name in ('m1', 'm2', 'm3')}
+        for name, trace in traces.items():
+            pipeline._enqueue({'FromUserName': "@@group_a", 'Text': name}, True, trace)
+        queued = []
+        while not pipeline._queues['ingress'].empty():
+            queued.append(pipeline._queues['ingress'].get_nowait()[0]['Text'])
+        print(f"   {policy}: 保留 {queued}")
+        assert queued == kept and pipeline.shed_count == 1
+        assert traces[shed].outcome == 'shed' and all(traces[name].outcome is None for name in kept)
+    
+    return True
+
+def test_send_scheduler():
+    """测试发送调度器：多个发送线程下同一会话的消息按顺序发送"""
+    print("\n🔍 测试发送调度器...")
+    
+    import random
+    import threading
+    import time
+    sent = []
+    lock = threading.Lock()
+    
+    def send(message, conversation, actual_user, context):
+        time.sleep(random.random() * 0.005)
+        with lock:
+            sent.append((conversation, message, threading.current_thread().name))
+    
+    scheduler = SendScheduler(send, worker_count=3)
+    scheduler.start()
+    conversations = [f"@@group_{i}" for i in range(12)]
+    start = time.monotonic()
+    for batch in range(3):
+        for conversation in conversations:
+            # 后排队的一批给出更早的时刻，仍应排在该会话已排队的消息之后
+            due_times = [start + 0.05 - batch * 0.02 + i * 0.001 for i in range(3)]
+            messages = [f"{batch}-{i}" for i in range(3)]
+            assert scheduler.schedule_at(conversation, "user", messages, due_times)
+    
+    deadline = time.monotonic() + 5
+    while len(sent) < 108 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    
+    workers = {worker for _, _, worker in sent}
+    print(f"   已发送 {len(sent)} 条，使用发送线程 {sorted(workers)}")
+    assert len(sent) == 108 and len(workers) > 1
+    expected = [f"{batch}-{i}" for batch in range(3) for i in range(3)]
+    for conversation in conversations:
+        assert [message for c, message, _ in sent if c == conversation] == expected, f"{conversation} 消息乱序"
+    
+    return True
+
+def test_pacing():
+    """测试发送时间线：每群限制只作用于群聊，过期会话按分钟统一清理"""
+    print("\n🔍 测试发送时间线...")
+    
+    from utils.pacing import PacingScheduler
+    security_manager = SecurityManager()
+    per_group = security_manager.config_service.snapshot.per_group_per_minute
+    
+    def in_first_minute(slots):
+        return sum(1 for t in slots if t < slots[0] + 60)
+    
+    # 私聊不受每群限制（仍受全局每分钟限制），群聊一分钟内不超过 per_group_per_minute
+    private = PacingScheduler(security_manager).assign("@user_a", per_group + 2, now=1000.0)
+    group = PacingScheduler(security_manager).assign("@@group_a", per_group + 2, now=1000.0)
+    print(f"   私聊首分钟 {in_first_minute(private)} 条，群聊首分钟 {in_first_minute(group)} 条")
+    assert in_first_minute(private) == per_group + 2
+    assert in_first_minute(group) == per_group
+    
+    # 分配时只清理本会话，其他会话的过期时刻在下一次整体清理时移除
+    pacer = PacingScheduler(security_manager)
+    pacer.assign("@@group_b", 1, now=1000.0)  # 整体清理
+    pacer.assign("@@group_a", 1, now=1001.0)
+    pacer.assign("@@group_b", 1, now=1060.0)  # 整体清理，group_a 尚未过期
+    pacer.assign("@@group_b", 1, now=1062.0)
+    assert "@@group_a" in pacer._conversation_slots, "不应在每次分配时清理所有会话"
+    pacer.assign("@@group_b", 1, now=1121.0)  # 整体清理
+    assert "@@group_a" not in pacer._conversation_slots
+    
+    return True
+
+def test_quiet_hours_queue():
+    """测试静默时段队列"""
+    print("\n🔍 测试静默时段队列...")
+    
+    import tempfile
+    queue_file = os.path.join(tempfile.mkdtemp(), "quiet_queue.json")
+    sent = []
+    quiet = [True]
+    deliver = lambda conversation, user, messages: sent.append((conversation, user, messages)) or True
+    
+    queue = QuietHoursQueue(deliver, lambda: quiet[0], queue_file=queue_file)
+    queue.set_session("@bot_session_1")
+    queue.defer("group_a", "user_1", ["旧查询结果"])
+    queue.defer("group_a", "user_1", ["新查询结果"])
+    queue.defer("group_b", "user_2", ["另一条结果"])
+    
+    # 静默时段不发送；同一用户的旧回复被替换；入队不写文件，停止时保存
+    assert queue.flush() == 0 and not sent
+    assert queue.get_stats()['deferred_replies'] == 2
+    assert not os.path.exists(queue_file), "入队时不应同步写文件"
+    queue.stop()
+    
+    # 重新登录后会话变化（UserName失效），旧回复被丢弃
+    stale = QuietHoursQueue(deliver, lambda: quiet[0], queue_file=queue_file)
+    assert stale.get_stats()['deferred_replies'] == 2
+    stale.set_session("@bot_session_2")
+    assert stale.get_stats()['deferred_replies'] == 0
+    
+    # 同一会话（热重载登录）重启后从文件恢复，静默结束后按入队顺序发送
+    queue = QuietHoursQueue(deliver, lambda: quiet[0], queue_file=queue_file)
+    queue.set_session("@bot_session_1")
+    quiet[0] = False
+    assert queue.flush() == 2
+    print(f"   发送: {sent}")
+    assert sent[0] == ("group_a", "user_1", ["新查询结果"])
+    assert queue.get_stats()['deferred_replies'] == 0
+    
+    return True
+
+def test_query_log():
+    """测试查询日志汇总和缓存预热"""
+    print("\n🔍 测试查询日志...")
+    
+    import tempfile
+    work_dir = tempfile.mkdtemp()
+    query_log = QueryLog(os.path.join(work_dir, "queries.tsv"))
+    query_log.start()
+    for query, count, is_group in [("庆余年", 3, True), ("庆余年", 3, False), ("不存在的剧", 0, True), ("赵丽颖", 5, True)]:
+        query_log.record(query, count, 0.012, is_group)
+    query_log.stop()
+    
+    records = load_query_log([query_log.log_file])
+    report = aggregate(records, min_count=2)
+    print(f"   热门查询: {report['top'][:2]}")
+    assert report['total'] == 4 and report['by_type'] == {'g': 3, 'p': 1}
+    assert report['top'][0]['query'] == "庆余年" and report['top'][0]['count'] == 2
+    assert [row['query'] for row in report['zero_results']] == ["不存在的剧"]
+    assert report['hot_set'] == ["庆余年"]
+    
+    # 热门查询集预热后，第一次查询直接命中缓存
+    hot_file = os.path.join(work_dir, "hot_queries.json")
+    save_hot_set(hot_file, report['hot_set'])
+    data_manager = DataManager()
+    data_manager.load_excel_data()
+    search_engine = SearchEngine(data_manager)
+    warmed = search_engine.warm_up(load_hot_set(hot_file))
+    assert len(warmed) == 1
+    search_engine.intelligent_search("庆余年")
+    assert search_engine.result_cache.hits == 1, "预热后的查询未命中缓存"
+    
+    return True
+
+def test_admin_server_auth():
+    """测试管理接口的访问令牌校验"""
+    print("\n🔍 测试管理接口鉴权...")
+    
+    import socket
+    import urllib.error
+    import urllib.request
+    
+    class StubBot:
+        def get_memory_report(self):
+            return {'rss_bytes': 0}
+    
+    # 未配置token时拒绝启动
+    assert not AdminServer(StubBot(), port=0, token='').start(), "未配置token时不应启动"
+    
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = AdminServer(StubBot(), port=port, token='s3cret-token')
+    assert server.start()
+    
+    def status_of(path, token=None):
+        request = urllib.request.Request(f"http://127.0.0.1:{port}{path}")
+        if token is not None:
+            request.add_header('Authorization', f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    
+    try:
+        results = {
+            'no_token': status_of('/memory'),
+            'wrong_token': status_of('/memory', 'wrong'),
+            'wrong_query_token': status_of('/memory?token=wrong'),
+            'bearer': status_of('/memory', 's3cret-token'),
+            'healthz': status_of('/healthz'),
+        }
+    finally:
+        server.stop()
+    print(f"   {results}")
+    assert results == {'no_token': 401, 'wrong_token': 401, 'wrong_query_token': 401,
+                       'bearer': 200, 'healthz': 200}
+    
+    return True
+
 def test_integration():
     """集成测试"""
     print("\n🔍 集成测试...")
@@ -189,8 +741,20 @@ def main():
     tests = [
         ("数据加载", test_data_loading),
         ("搜索功能", test_search_functionality),
+        ("文本归一化", test_text_normalization),
         ("消息格式化", test_message_formatting),
+        ("消息打包", test_message_packing),
         ("安全管理器", test_security_manager),
+        ("频率限制", test_rate_limiter),
+        ("额度预留", test_reservations),
+        ("配置重新加载", test_config_reload),
+        ("运行状态恢复", test_state_round_trip),
+        ("请求合并与丢弃", test_coalescing_and_shedding),
+        ("发送时间线", test_pacing),
+        ("发送调度器", test_send_scheduler),
+        ("静默时段队列", test_quiet_hours_queue),
+        ("查询日志", test_query_log),
+        ("管理接口鉴权", test_admin_server_auth),
         ("集成测试", test_integration),
     ]
     
@@ -0,0 +1,133 @@
+"""
+追踪报告 - 读取请求追踪文件，列出最慢的请求及其各阶段耗时
+
+用法：
+  python trace_report.py                          # 默认读取 logs/traces.jsonl
+  python trace_report.py logs/traces.jsonl.1 logs/traces.jsonl --top 20
+  python trace_report.py --outcome sent --since 30  # 只看最近30分钟内已发送的请求
+  python trace_report.py --id 3f2a9c01b7de          # 查看单个请求（与日志行中的 [id] 对应）
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.metrics import STAGES
+
+STAGE_LABELS = dict(STAGES)
+
+
+def load_traces(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """读取追踪文件，跳过不完整的行（例如写入中途被轮转）"""
+    traces = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"⚠️ 文件不存在: {path}")
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    continue
+    return traces
+
+
+def percentile(values: List[float], p: float) -> float:
+    """百分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def stage_totals(trace: Dict[str, Any]) -> Dict[str, float]:
+    """单个请求各阶段的耗时合计（毫秒），同一阶段多次出现（如逐条发送）时累加"""
+    totals = defaultdict(float)
+    for name, _, duration in trace.get('spans', []):
+        totals[name] += duration
+    return totals
+
+
+def format_trace(trace: Dict[str, Any]) -> str:
+    """单个请求的时间线"""
+    started = time.strftime('%m-%d %H:%M:%S', time.localtime(trace.get('ts', 0)))
+    lines = [f"{trace['id']}  {started}  {trace.get('total_ms', 0):9.1f} ms  "
+             f"[{trace.get('outcome', '?')}]  {trace.get('query', '')!r}  ({trace.get('conv', '')})"]
+    for name, offset, duration in sorted(trace.get('spans', []), key=lambda span: span[1]):
+        lines.append(f"    +{offset:9.1f} ms  {duration:9.1f} ms  {STAGE_LABELS.get(name, name)}")
+    return '\n'.join(lines)
+
+
+def print_summary(traces: List[Dict[str, Any]]):
+    """按结果计数，并按阶段汇总耗时"""
+    outcomes = Counter(trace.get('outcome', '?') for trace in traces)
+    totals = [trace.get('total_ms', 0) for trace in traces]
+    print(f"📊 共 {len(traces)} 个请求：" + "，".join(f"{outcome} {count}" for outcome, count in outcomes.most_common()))
+    print(f"   总耗时 p50/p95/p99：{percentile(totals, 50):.1f}/{percentile(totals, 95):.1f}/"
+          f"{percentile(totals, 99):.1f} ms")
+
+    per_stage = defaultdict(list)
+    for trace in traces:
+        for name, duration in stage_totals(trace).items():
+            per_stage[name].append(duration)
+
+    if per_stage:
+        print("\n⏱ 各阶段耗时（请求数  p50/p95/max 毫秒  占总耗时）：")
+        grand_total = sum(totals) or 1
+        order = [name for name, _ in STAGES] + sorted(set(per_stage) - set(STAGE_LABELS))
+        for name in order:
+            values = per_stage.get(name)
+            if not values:
+                continue
+            print(f"  {STAGE_LABELS.get(name, name):<10} {len(values):6d}  "
+                  f"{percentile(values, 50):8.1f}/{percentile(values, 95):8.1f}/{max(values):8.1f}  "
+                  f"{sum(values) / grand_total:6.1%}")
+
+
+def filter_traces(traces: List[Dict[str, Any]], outcome: Optional[str], since: Optional[float]) -> List[Dict[str, Any]]:
+    """按结果和时间筛选"""
+    if outcome:
+        traces = [trace for trace in traces if trace.get('outcome') == outcome]
+    if since:
+        cutoff = time.time() - since * 60
+        traces = [trace for trace in traces if trace.get('ts', 0) >= cutoff]
+    return traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列出最慢的请求及其各阶段耗时")
+    parser.add_argument('files', nargs='*', default=['logs/traces.jsonl'], help="追踪文件")
+    parser.add_argument('--top', type=int, default=10, help="显示最慢的请求数")
+    parser.add_argument('--outcome', help="只看指定结果的请求（sent/command/rejected/coalesced/shed/deferred/cancelled/error 等）")
+    parser.add_argument('--since', type=float, help="只看最近N分钟的请求")
+    parser.add_argument('--id', help="只显示指定追踪ID的请求")
+    args = parser.parse_args()
+
+    traces = load_traces(args.files)
+    if args.id:
+        matched = [trace for trace in traces if trace.get('id', '').startswith(args.id)]
+        for trace in matched:
+            print(format_trace(trace))
+        if not matched:
+            print(f"❌ 未找到追踪 {args.id}")
+        return
+
+    traces = filter_traces(traces, args.outcome, args.since)
+    if not traces:
+        print("没有符合条件的追踪记录")
+        return
+
+    print_summary(traces)
+    print(f"\n🐢 最慢的 {min(args.top, len(traces))} 个请求：")
+    for trace in sorted(traces, key=lambda trace: trace.get('total_ms', 0), reverse=True)[:args.top]:
+        print(format_trace(trace))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+管理接口 - 在机器人进程内提供本地HTTP接口（deploy_server.py 生成的 nginx 配置会代理到这里）
+
+  /metrics  Prometheus 文本格式的指标：队列深度、缓存命中率、频率限制拒绝次数、各阶段耗时、数据版本
+  /status   JSON 格式的运行状态
+  /search   JSON 格式的搜索结果，参数 q
+  /memory   JSON 格式的内存统计（按数据结构）
+  /healthz  存活检查
+
+服务器在独立线程的事件循环中运行，搜索放到线程池执行，抓取指标不会阻塞消息处理。
+必须配置 token（nginx 会把公网请求代理到这里，监听 127.0.0.1 并不能挡住外部访问），未配置时不启动；
+除 /healthz 外的请求需携带 Authorization: Bearer <token> 或 ?token=<token>。
+"""
+import asyncio
+import hmac
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from utils.metrics import metrics
+
+# 请求头的最大长度，超出时直接断开
+MAX_HEADER_BYTES = 16384
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class AdminServer:
+    def __init__(self, bot, host: str = '127.0.0.1', port: int = 8080, token: str = ''):
+        """初始化管理接口"""
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.token = token or ''
+        self.logger = logging.getLogger(__name__)
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def start(self) -> bool:
+        """在独立线程中启动HTTP服务，返回是否监听成功"""
+        if self._thread and self._thread.is_alive():
+            return True
+        if not self.token:
+            self.logger.error("管理接口未配置 admin_server.token，拒绝启动（/search 会返回网盘链接且不受频率限制）")
+            return False
+
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="admin-search")
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="admin-server", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+
+        if self._server is None:
+            self.logger.error(f"管理接口启动失败: {self.host}:{self.port}")
+            return False
+
+        self.logger.info(f"管理接口已启动: http://{self.host}:{self.port}")
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        """关闭HTTP服务和事件循环"""
+        if not self.loop or not self._thread:
+            return
+
+        if self.loop.is_running() and self._stop_event:
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+        self._thread.join(timeout)
+        self._thread = None
+        self._server = None
+
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+        self.logger.info("管理接口已停止")
+
+    def _run_loop(self):
+        """事件循环线程入口"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            self.logger.error(f"管理接口运行出错: {e}")
+        finally:
+            self._started.set()
+            self.loop.close()
+
+    async def _main(self):
+        """监听端口，直到收到停止信号"""
+        self._stop_event = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self._started.set()
+
+        async with self._server:
+            await self._stop_event.wait()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的一次请求（不支持keep-alive）"""
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            if len(head) > MAX_HEADER_BYTES:
+                return
+
+            status, content_type, body = await self._dispatch(head.decode('latin-1'))
+            header = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                      f"Content-Type: {content_type}\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      "Cache-Control: no-store\r\n"
+                      "Connection: close\r\n\r\n")
+            writer.write(header.encode('latin-1') + body)
+            await writer.drain()
+        except Exception as e:
+            self.logger.error(f"管理接口处理请求出错: {e}")
+        finally:
+            writer.close()
+
+    async def _dispatch(self, head: str) -> Tuple[int, str, bytes]:
+        """解析请求行和请求头，路由到对应的接口"""
+        lines = head.split('\r\n')
+        parts = lines[0].split()
+        if len(parts) != 3:
+            return self._json(400, {'error': 'bad request'})
+
+        method, target, _ = parts
+        if method != 'GET':
+            return self._json(405, {'error': 'method not allowed'})
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+
+        if url.path == '/healthz':
+            return 200, 'text/plain; charset=utf-8', b'ok\n'
+
+        if not self._authorized(headers, params):
+            return self._json(401, {'error': 'unauthorized'})
+
+        try:
+            if url.path == '/metrics':
+                return 200, PROMETHEUS_CONTENT_TYPE, self.render_metrics().encode('utf-8')
+            if url.path == '/status':
+                return self._json(200, self.get_status())
+            if url.path == '/search':
+                return await self._search(params.get('q', [''])[0])
+            if url.path == '/memory':
+                report = await self.loop.run_in_executor(self.executor, self.bot.get_memory_report)
+                return self._json(200, report)
+        except Exception as e:
+            self.logger.error(f"管理接口 {url.path} 出错: {e}")
+            return self._json(500, {'error': str(e)})
+
+        return self._json(404, {'error': 'not found'})
+
+    def _authorized(self, headers: Dict[str, str], params: Dict[str, List[str]]) -> bool:
+        """校验访问令牌，未配置token时一律拒绝"""
+        if not self.token:
+            return False
+
+        supplied = params.get('token', [''])[0]
+        authorization = headers.get('authorization', '')
+        if authorization.lower().startswith('bearer '):
+            supplied = authorization[7:].strip()
+        return hmac.compare_digest(supplied.encode('utf-8'), self.token.encode('utf-8'))
+
+    async def _search(self, query: str) -> Tuple[int, str, bytes]:
+        """在线程池中执行搜索，不占用事件循环"""
+        query = query.strip()
+        if not query:
+            return self._json(400, {'error': 'missing q'})
+        if self.bot.data_manager.data is None:
+            return self._json(503, {'error': 'catalog not loaded'})
+
+        results = await self.loop.run_in_executor(self.executor, self.bot.search_engine.intelligent_search, query)
+        max_results = self.bot.config_service.snapshot.max_results
+        return self._json(200, {
+            'query': query,
+            'count': len(results),
+            'results': results[:max_results]
+        })
+
+    def get_status(self) -> Dict[str, Any]:
+        """运行状态：数据、运行统计和安全状态"""
+        security_status = self.bot.security_manager.get_security_status()
+        security_status.pop('memory_usage', None)
+        return {
+            'running': self.bot.is_running,
+            'logged_in': self.bot.is_logged_in,
+            'config_version': self.bot.config_service.snapshot.version,
+            'catalog': self._catalog_stats(),
+            'runtime': self.bot.get_runtime_stats(),
+            'security': security_status
+        }
+
+    def _catalog_stats(self) -> Dict[str, Any]:
+        """数据版本和行数"""
+        data_manager = self.bot.data_manager
+        stats = data_manager.get_stats()
+        stats['generation'] = data_manager.generation
+        stats['signature'] = data_manager.catalog_signature
+        return stats
+
+    def render_metrics(self) -> str:
+        """生成 Prometheus 文本格式的指标"""
+        runtime = self.bot.get_runtime_stats()
+        security_status = self.bot.security_manager.get_security_status()
+        catalog = self._catalog_stats()
+        lines = []
+
+        def add(name: str, metric_type: str, help_text: str, samples):
+            lines.append(f"# HELP wechat_bot_{name} {help_text}")
+            lines.append(f"# TYPE wechat_bot_{name} {metric_type}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                suffix = f"{{{label_text}}}" if label_text else ''
+                lines.append(f"wechat_bot_{name}{suffix} {float(value):g}")
+
+        add('up', 'gauge', "Bot is running and logged in.",
+            [({}, self.bot.is_running and self.bot.is_logged_in)])
+
+        # 队列深度
+        queues = [({'queue': 'send_pending'}, runtime.get('pending_messages', 0)),
+                  ({'queue': 'send_workers'}, runtime.get('queued_messages', 0)),
+                  ({'queue': 'quiet_hours'}, runtime.get('deferred_replies', 0))]
+        queues += [({'queue': f"pipeline_{key[:-len('_queue')]}"}, value)
+                   for key, value in runtime.items() if key.endswith('_queue')]
+        add('queue_depth', 'gauge', "Messages waiting in each queue.", queues)
+        add('pacing_backlog_seconds', 'gauge', "Time until the last scheduled send slot.",
+            [({}, runtime.get('pacing_backlog', 0.0))])
+
+        # 发送与丢弃
+        add('messages_sent_total', 'counter', "Messages sent by the send scheduler.",
+            [({}, runtime.get('sent_messages', 0))])
+        add('messages_dropped_total', 'counter', "Messages dropped because the send queue was full.",
+            [({}, runtime.get('dropped_messages', 0))])
+        add('requests_shed_total', 'counter', "Requests shed because the pipeline ingress queue was full.",
+            [({}, runtime.get('shed_requests', 0))])
+        add('requests_coalesced_total', 'counter', "Duplicate requests coalesced into one search.",
+            [({}, runtime.get('coalesced_requests', 0))])
+
+        # 缓存
+        add('result_cache_hits_total', 'counter', "Search result cache hits.",
+            [({}, runtime.get('result_cache_hits', 0))])
+        add('result_cache_misses_total', 'counter', "Search result cache misses.",
+            [({}, runtime.get('result_cache_misses', 0))])
+        add('cache_hit_ratio', 'gauge', "Cache hit ratio since start.",
+            [({'cache': 'result'}, runtime.get('result_cache_hit_rate', 0.0)),
+             ({'cache': 'card'}, runtime.get('card_cache_hit_rate', 0.0))])
+        add('cache_entries', 'gauge', "Entries held by each cache.",
+            [({'cache': 'result'}, runtime.get('result_cache_entries', 0)),
+             ({'cache': 'card'}, runtime.get('card_cache_entries', 0))])
+
+        # 频率限制
+        add('rate_limit_rejections_total', 'counter', "Requests rejected by the rate limiter.",
+            [({'kind': kind}, count) for kind, count in security_status.get('rejected_counts', {}).items()])
+        add('reserved_messages', 'gauge', "Send quota reserved but not yet used.",
+            [({}, security_status.get('reserved_messages', 0))])
+
+        # 各阶段耗时
+        stages = metrics.snapshot()
+        lines.append("# HELP wechat_bot_stage_latency_seconds Latency of each processing stage.")
+        lines.append("# TYPE wechat_bot_stage_latency_seconds summary")
+        for stage, summary in stages.items():
+            for percentile, quantile in ((50, '0.5'), (95, '0.95'), (99, '0.99')):
+                value = summary[f'p{percentile}_ms'] / 1000
+                lines.append(f'wechat_bot_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {value:g}')
+            total = summary['avg_ms'] * summary['count'] / 1000
+            lines.append(f'wechat_bot_stage_latency_seconds_sum{{stage="{stage}"}} {total:g}')
+            lines.append(f'wechat_bot_stage_latency_seconds_count{{stage="{stage}"}} {summary["count"]}')
+
+        # 数据
+        add('catalog_generation', 'gauge', "Catalog generation, increases on every reload.",
+            [({}, catalog['generation'])])
+        add('catalog_rows', 'gauge', "Rows in the loaded catalog.",
+            [({}, catalog.get('total_dramas', 0))])
+        add('catalog_unsafe_rows', 'gauge', "Catalog rows hidden by the sensitive word screen.",
+            [({}, catalog.get('unsafe_rows', 0))])
+        add('config_version', 'gauge', "Config snapshot version, increases on every reload.",
+            [({}, self.bot.config_service.snapshot.version)])
+
+        return '\n'.join(lines) + '\n'
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> Tuple[int, str, bytes]:
+        """JSON响应"""
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        return status, 'application/json; charset=utf-8', body
@@ -0,0 +1,223 @@
+"""
+配置服务 - 所有组件共享同一份只读配置快照，支持热重载
+
+配置文件只解析一次，热路径用到的值预先算好放在快照的属性上，不必每次逐层 config.get(...)。
+重新加载时生成新快照并整体替换引用，读取方拿到的始终是一份完整、一致的配置。
+线程数、分片数、队列长度等在启动时使用的配置修改后需重启才生效。
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
+
+import yaml
+
+from utils.content_filter import SensitiveWordMatcher
+
+DEFAULT_SINGLE_TEMPLATE = "🎬《{drama_name}》\n主演：{actors}\n集数：{episodes}集\n夸克：{quark_link}\n百度：{baidu_link}"
+DEFAULT_TOO_MANY_RESULTS = "找到 {count} 个相关结果，为避免刷屏，仅显示前 {shown} 个："
+
+# 单条消息长度上限的默认值
+DEFAULT_MAX_MESSAGE_LENGTH = 2000
+
+
+def _freeze(value: Any) -> Any:
+    """把嵌套的dict/list转换为只读的映射和元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """一次加载得到的配置，创建后不可修改"""
+    raw: Mapping[str, Any]
+    version: int
+
+    # 搜索
+    similarity_threshold: int
+    max_results: int
+    max_items_per_message: int
+
+    # 消息格式
+    single_template: str
+    separator: str
+    too_many_results: str
+    message_budget: int  # 单条消息的字符预算，已按安全长度上限截断
+    max_message_length: int
+
+    # 频率限制
+    rate_limit_enabled: bool
+    max_per_minute: int
+    max_per_hour: int
+    per_user_per_minute: int
+    per_group_per_minute: int
+    reserve_per_reply: int
+    reservation_ttl: float
+
+    # 延迟发送
+    delay_enabled: bool
+    base_delay: float
+    random_delay: float
+    group_extra_delay: float
+    group_threshold: int
+    min_interval: float
+
+    # 静默时段
+    quiet_hours_enabled: bool
+    quiet_start: int
+    quiet_end: int
+
+    # 敏感词
+    word_matcher: SensitiveWordMatcher
+
+    # 管理员（私聊联系人的备注名 RemarkName 或微信号 Alias，昵称可被任意修改，不用于识别）
+    admin_users: frozenset
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], version: int) -> "ConfigSnapshot":
+        """从解析后的配置字典生成快照"""
+        data = data or {}
+        search = data.get('search') or {}
+        message_format = data.get('message_format') or {}
+        security = data.get('security') or {}
+        rate_limit = security.get('rate_limit') or {}
+        delay_send = security.get('delay_send') or {}
+        group_check = security.get('group_member_check') or {}
+        quiet_hours = security.get('quiet_hours') or {}
+
+        max_message_length = security.get('max_message_length', DEFAULT_MAX_MESSAGE_LENGTH)
+        max_message_chars = message_format.get('max_message_chars', 1500)
+
+        return cls(
+            raw=_freeze(data),
+            version=version,
+            similarity_threshold=search.get('similarity_threshold', 60),
+            max_results=search.get('max_results', 10),
+            max_items_per_message=search.get('max_items_per_message', 0),
+            single_template=message_format.get('single_template', DEFAULT_SINGLE_TEMPLATE),
+            separator=message_format.get('separator', '\n\n'),
+            too_many_results=message_format.get('too_many_results', DEFAULT_TOO_MANY_RESULTS),
+            message_budget=max(1, min(max_message_chars, max_message_length)),
+            max_message_length=max_message_length,
+            rate_limit_enabled=rate_limit.get('enabled', True),
+            max_per_minute=rate_limit.get('max_per_minute', 10),
+            max_per_hour=rate_limit.get('max_per_hour', 50),
+            per_user_per_minute=rate_limit.get('per_user_per_minute', 3),
+            per_group_per_minute=rate_limit.get('per_group_per_minute', 5),
+            reserve_per_reply=max(1, rate_limit.get('reserve_per_reply', 1)),
+            reservation_ttl=rate_limit.get('reservation_ttl', 600),
+            delay_enabled=delay_send.get('enabled', True),
+            base_delay=delay_send.get('base_delay', 2),
+            random_delay=delay_send.get('random_delay', 3),
+            group_extra_delay=delay_send.get('group_extra_delay', 5),
+            group_threshold=group_check.get('threshold', 20),
+            min_interval=delay_send.get('min_interval', 1.0),
+            quiet_hours_enabled=quiet_hours.get('enabled', True),
+            quiet_start=quiet_hours.get('start', 23),
+            quiet_end=quiet_hours.get('end', 7),
+            word_matcher=SensitiveWordMatcher(security.get('sensitive_words')),
+            admin_users=frozenset(str(user) for user in security.get('admin_users') or [] if user),
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取顶层配置项（只读）"""
+        return self.raw.get(key, default)
+
+
+class ConfigService:
+    def __init__(self, config_path: str = "config.yaml"):
+        """初始化配置服务并加载配置"""
+        self.config_path = config_path
+        self.logger = logging.getLogger(__name__)
+
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._mtime = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.snapshot = ConfigSnapshot.from_dict(self._read(), 1)
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        """读取并解析配置文件，失败时返回None"""
+        try:
+            self._mtime = os.stat(self.config_path).st_mtime_ns
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                return yaml.safe_load(f) or {}
+        except Exception as e:
+            self.logger.error(f"配置文件加载失败: {e}")
+            return None
+
+    def reload(self) -> bool:
+        """重新加载配置，成功后整体替换快照；失败时保留原配置"""
+        with self._reload_lock:
+            data = self._read()
+            if data is None:
+                return False
+
+            try:
+                snapshot = ConfigSnapshot.from_dict(data, self.snapshot.version + 1)
+            except Exception as e:
+                # 语法正确但结构或取值不对（例如顶层不是映射）
+                self.logger.error(f"配置文件内容无效: {e}")
+                return False
+            self.snapshot = snapshot
+            listeners = list(self._listeners)
+
+        self.logger.info(f"配置已重新加载（版本 {snapshot.version}）")
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                self.logger.error(f"配置更新回调出错: {e}")
+        return True
+
+    def subscribe(self, listener: Callable[[ConfigSnapshot], None]):
+        """登记配置更新回调"""
+        self._listeners.append(listener)
+
+    def start_watching(self, interval: float = 5):
+        """启动文件监视线程，配置文件修改后自动重新加载"""
+        if interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval,), name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watching(self):
+        """停止文件监视线程"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+
+    def _watch(self, interval: float):
+        """定期检查配置文件的修改时间"""
+        while not self._stopped.wait(interval):
+            try:
+                mtime = os.stat(self.config_path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                self.reload()
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_config_service(config_path: str = "config.yaml") -> ConfigService:
+    """同一配置文件的所有组件共享一个配置服务"""
+    key = os.path.abspath(config_path)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = ConfigService(config_path)
+            _services[key] = service
+        return service
@@ -0,0 +1,30 @@
+"""
+内容安全过滤 - 敏感词预编译为一个正则，一次扫描匹配全部敏感词
+"""
+import re
+from typing import Iterable, Optional
+
+from utils.text_normalizer import fold_text
+
+# 默认敏感词（可通过 security.sensitive_words 配置）
+DEFAULT_SENSITIVE_WORDS = ['广告', '推广', '加群', '微商', '代理']
+
+
+class SensitiveWordMatcher:
+    def __init__(self, words: Optional[Iterable[str]] = None):
+        """编译敏感词，长词优先，词本身按简体小写处理"""
+        if words is None:
+            words = DEFAULT_SENSITIVE_WORDS
+        self.words = sorted({fold_text(word) for word in words if word}, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(map(re.escape, self.words))) if self.words else None
+
+    def find(self, text: str) -> Optional[str]:
+        """返回文本中出现的第一个敏感词，没有时返回None（调用方负责把文本转为小写）"""
+        if not self.pattern or not text:
+            return None
+        match = self.pattern.search(text)
+        return match.group(0) if match else None
+
+    def is_unsafe_row(self, *fields: str) -> bool:
+        """数据行的字段（剧名、演员等）中是否含敏感词，繁体、全角写法同样识别"""
+        return any(self.find(fold_text(field)) for field in fields if field)
@@ -7,25 +7,28 @@ import logging
 from typing import List, Dict, Any, Optional
 from fuzzywuzzy import fuzz, process
 import os
-import yaml
+from utils.text_normalizer import fold_text, normalize_text
+from utils.config_service import get_config_service
+from utils.metrics import metrics
 
 class DataManager:
     def __init__(self, config_path: str = "config.yaml"):
         """初始化数据管理器"""
-        self.config = self._load_config(config_path)
+        self.config_service = get_config_service(config_path)
         self.data = None
         self.drama_index = {}  # 剧名索引
         self.actor_index = {}  # 演员索引
+        self.title_candidates = []  # 模糊搜索候选剧名（规范形式）
+        self.actor_candidates = []  # 模糊搜索候选演员（规范形式）
+        self.generation = 0  # 数据版本，每次成功加载后加1
+        self.catalog_signature = None  # 数据文件签名（修改时间和大小），用于判断持久化的缓存是否仍然有效
+        self.unsafe_rows = set()  # 剧名或演员含敏感词的行，不进入索引
         self.logger = logging.getLogger(__name__)
         
-    def _load_config(self, config_path: str) -> Dict:
-        """加载配置文件"""
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
-        except Exception as e:
-            print(f"配置文件加载失败: {e}")
-            return {}
+    @property
+    def config(self):
+        """当前配置（只读）"""
+        return self.config_service.snapshot.raw
     
     def load_excel_data(self) -> bool:
         """加载Excel数据"""
@@ -49,13 +52,18 @@ class DataManager:
             
             # 数据清洗
             self.data = self.data.dropna(subset=['剧名'])  # 删除剧名为空的行
+            self.data = self.data.reset_index(drop=True)  # 保证行号与位置一致
             self.data['剧名'] = self.data['剧名'].astype(str).str.strip()
             self.data['演员名称'] = self.data['演员名称'].astype(str).str.strip()
             
             # 建立索引
             self._build_indexes()
             
-            self.logger.info(f"成功加载 {len(self.data)} 条数据")
+            stat = os.stat(excel_file)
+            self.catalog_signature = f"{stat.st_mtime_ns}:{stat.st_size}"
+            self.generation += 1
+            
+            self.logger.info(f"成功加载 {len(self.data)} 条数据，{len(self.unsafe_rows)} 条含敏感词已屏蔽")
             return True
             
         except Exception as e:
@@ -63,50 +71,62 @@ class DataManager:
             return False
     
     def _build_indexes(self):
-        """建立搜索索引"""
+        """建立搜索索引（索引键统一使用规范形式）"""
         self.drama_index = {}
         self.actor_index = {}
+        self.unsafe_rows = set()
+        titles = set()
+        actor_names = set()
+        
+        # 每个数据版本只做一次内容筛查，含敏感词的行不会被搜到，不必等到发送时才被拦截
+        word_matcher = self.config_service.snapshot.word_matcher
         
         for idx, row in self.data.iterrows():
             drama_name = str(row['剧名']).strip()
             actors = str(row['演员名称']).strip()
             
+            if word_matcher.is_unsafe_row(drama_name, actors):
+                self.unsafe_rows.add(idx)
+                continue
+            
             # 剧名索引
             if drama_name and drama_name != 'nan':
+                canonical_name = normalize_text(drama_name)
+                
                 # 使用jieba分词
-                drama_words = list(jieba.cut(drama_name))
-                for word in drama_words:
+                for word in jieba.cut(canonical_name):
                     if len(word) > 1:  # 忽略单字
-                        if word not in self.drama_index:
-                            self.drama_index[word] = []
-                        self.drama_index[word].append(idx)
+                        self.drama_index.setdefault(word, []).append(idx)
                 
                 # 完整剧名
-                if drama_name not in self.drama_index:
-                    self.drama_index[drama_name] = []
-                self.drama_index[drama_name].append(idx)
+                if canonical_name:
+                    self.drama_index.setdefault(canonical_name, []).append(idx)
+                    titles.add(canonical_name)
             
             # 演员索引
             if actors and actors != 'nan':
-                # 分割演员名称（支持逗号、顿号、空格分割）
-                actor_list = []
-                for sep in ['、', ',', '，', ' ', '　']:
-                    actors = actors.replace(sep, '|')
-                actor_list = [actor.strip() for actor in actors.split('|') if actor.strip()]
-                
-                for actor in actor_list:
-                    if actor:
-                        if actor not in self.actor_index:
-                            self.actor_index[actor] = []
-                        self.actor_index[actor].append(idx)
-                        
-                        # 演员名字的分词
-                        actor_words = list(jieba.cut(actor))
-                        for word in actor_words:
-                            if len(word) > 1:
-                                if word not in self.actor_index:
-                                    self.actor_index[word] = []
-                                self.actor_index[word].append(idx)
+                for actor in self._split_actors(actors):
+                    canonical_actor = normalize_text(actor)
+                    if not canonical_actor:
+                        continue
+                    
+                    self.actor_index.setdefault(canonical_actor, []).append(idx)
+                    actor_names.add(canonical_actor)
+                    
+                    # 演员名字的分词
+                    for word in jieba.cut(canonical_actor):
+                        if len(word) > 1 and word != canonical_actor:
+                            self.actor_index.setdefault(word, []).append(idx)
+        
+        # 模糊搜索候选表，避免每次搜索时重新收集
+        self.title_candidates = sorted(titles)
+        self.actor_candidates = sorted(actor_names)
+    
+    def _split_actors(self, actors: str) -> List[str]:
+        """分割演员名称（支持逗号、顿号、空格分割）"""
+        for sep in ['、', ',', '，', ' ', '　']:
+            actors = actors.replace(sep, '|')
+        return [actor.strip() for actor in actors.split('|') if actor.strip()]
     
     def search(self, query: str) -> List[Dict[str, Any]]:
         """搜索功能"""
@@ -118,23 +138,27 @@ class DataManager:
             return []
         
         # 获取配置
-        similarity_threshold = self.config.get('search', {}).get('similarity_threshold', 60)
-        max_results = self.config.get('search', {}).get('max_results', 10)
+        snapshot = self.config_service.snapshot
+        similarity_threshold = snapshot.similarity_threshold
+        max_results = snapshot.max_results
         
         result_indices = set()
         
         # 1. 精确匹配
-        exact_matches = self._exact_search(query)
+        with metrics.timer('search_exact'):
+            exact_matches = self._exact_search(query)
         result_indices.update(exact_matches)
         
         # 2. 模糊匹配
         if len(result_indices) < max_results:
-            fuzzy_matches = self._fuzzy_search(query, similarity_threshold)
+            with metrics.timer('search_fuzzy'):
+                fuzzy_matches = self._fuzzy_search(query, similarity_threshold)
             result_indices.update(fuzzy_matches)
         
         # 3. 分词搜索
         if len(result_indices) < max_results:
-            word_matches = self._word_search(query)
+            with metrics.timer('search_word'):
+                word_matches = self._word_search(query)
             result_indices.update(word_matches)
         
         # 转换为结果列表
@@ -148,7 +172,9 @@ class DataManager:
                     'episodes': str(row.get('集数', '')),
                     'actors': str(row.get('演员名称', '')),
                     'quark_link': str(row.get('夸克网盘链接', '')),
-                    'baidu_link': str(row.get('百度网盘链接', ''))
+                    'baidu_link': str(row.get('百度网盘链接', '')),
+                    'row_id': int(idx),  # 行号，与数据版本一起唯一确定一行
+                    'generation': self.generation
                 })
         
         return results
@@ -156,54 +182,47 @@ class DataManager:
     def _exact_search(self, query: str) -> List[int]:
         """精确搜索"""
         indices = []
+        key = normalize_text(query)
         
         # 在剧名索引中搜索
-        if query in self.drama_index:
-            indices.extend(self.drama_index[query])
+        if key in self.drama_index:
+            indices.extend(self.drama_index[key])
         
         # 在演员索引中搜索
-        if query in self.actor_index:
-            indices.extend(self.actor_index[query])
+        if key in self.actor_index:
+            indices.extend(self.actor_index[key])
         
         return list(set(indices))
     
     def _fuzzy_search(self, query: str, threshold: int) -> List[int]:
         """模糊搜索"""
         indices = []
+        key = normalize_text(query)
+        if not key:
+            return []
         
         # 在剧名中模糊搜索
-        drama_names = list(self.data['剧名'].unique())
-        drama_matches = process.extract(query, drama_names, limit=5, scorer=fuzz.partial_ratio)
+        drama_matches = process.extract(key, self.title_candidates, limit=5, scorer=fuzz.partial_ratio)
         
         for match, score in drama_matches:
             if score >= threshold:
-                matching_rows = self.data[self.data['剧名'] == match].index.tolist()
-                indices.extend(matching_rows)
+                indices.extend(self.drama_index.get(match, []))
         
         # 在演员名称中模糊搜索
-        all_actors = []
-        for actors_str in self.data['演员名称'].dropna():
-            for sep in ['、', ',', '，', ' ', '　']:
-                actors_str = str(actors_str).replace(sep, '|')
-            actor_list = [actor.strip() for actor in str(actors_str).split('|') if actor.strip()]
-            all_actors.extend(actor_list)
-        
-        unique_actors = list(set(all_actors))
-        actor_matches = process.extract(query, unique_actors, limit=5, scorer=fuzz.partial_ratio)
+        actor_matches = process.extract(key, self.actor_candidates, limit=5, scorer=fuzz.partial_ratio)
         
         for match, score in actor_matches:
             if score >= threshold:
-                if match in self.actor_index:
-                    indices.extend(self.actor_index[match])
+                indices.extend(self.actor_index.get(match, []))
         
         return list(set(indices))
     
     def _word_search(self, query: str) -> List[int]:
         """分词搜索"""
         indices = []
-        words = list(jieba.cut(query))
         
-        for word in words:
+        for word in jieba.cut(fold_text(query)):
+            word = normalize_text(word)
             if len(word) > 1:
                 # 在剧名索引中搜索
                 if word in self.drama_index:
@@ -223,5 +242,6 @@ class DataManager:
         return {
             'total_dramas': len(self.data),
             'drama_keywords': len(self.drama_index),
-            'actor_keywords': len(self.actor_index)
+            'actor_keywords': len(self.actor_index),
+            'unsafe_rows': len(self.unsafe_rows)
         }
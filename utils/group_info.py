@@ -0,0 +1,114 @@
+"""
+群信息刷新 - 在后台线程中批量从itchat获取群成员数量
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List
+
+import itchat
+
+
+def is_group_id(user_name: str) -> bool:
+    """itchat中群聊的UserName以@@开头"""
+    return bool(user_name) and user_name.startswith('@@')
+
+
+def get_member_count(chatroom: Dict[str, Any]) -> int:
+    """从itchat的群信息中取成员数"""
+    member_count = chatroom.get('MemberCount') or 0
+    if not member_count:
+        member_count = len(chatroom.get('MemberList') or [])
+    return member_count
+
+
+class GroupInfoRefresher:
+    def __init__(self, security_manager, interval: float = 30, batch_size: int = 50):
+        """初始化群信息刷新器"""
+        self.security_manager = security_manager
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.logger = logging.getLogger(__name__)
+
+        # 等待刷新的群ID（按请求先后排列，去重）
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台刷新线程"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="group-info-refresher", daemon=True)
+        self._thread.start()
+        self.logger.info("群信息刷新线程已启动")
+
+    def stop(self):
+        """停止后台刷新线程"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+
+    def request_refresh(self, group_id: str):
+        """登记需要刷新的群（不阻塞调用方）"""
+        if not is_group_id(group_id):
+            return
+
+        with self._lock:
+            self._pending[group_id] = None
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def _run(self):
+        """启动时加载全部群，之后按批刷新登记的群"""
+        self._load_all_chatrooms()
+
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+            while not self._stopped.is_set():
+                batch = self._take_batch()
+                if not batch:
+                    break
+                self._refresh_batch(batch)
+
+    def _take_batch(self) -> List[str]:
+        """取出一批待刷新的群ID"""
+        with self._lock:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                group_id = next(iter(self._pending))
+                del self._pending[group_id]
+                batch.append(group_id)
+            return batch
+
+    def _load_all_chatrooms(self):
+        """从通讯录加载全部群的成员数"""
+        try:
+            chatrooms = itchat.get_chatrooms(update=True) or []
+            self._store(chatrooms)
+            self.logger.info(f"已加载 {len(chatrooms)} 个群的成员数量")
+        except Exception as e:
+            self.logger.error(f"加载群列表失败: {e}")
+
+    def _refresh_batch(self, group_ids: List[str]):
+        """批量刷新群成员数"""
+        try:
+            result = itchat.update_chatroom(group_ids, detailedMember=False)
+            chatrooms = result if isinstance(result, list) else [result]
+            self._store(chatroom for chatroom in chatrooms if chatroom and 'UserName' in chatroom)
+        except Exception as e:
+            self.logger.error(f"刷新群信息失败: {e}")
+
+    def _store(self, chatrooms: Iterable[Dict[str, Any]]):
+        """写入安全管理器的群信息缓存"""
+        for chatroom in chatrooms:
+            member_count = get_member_count(chatroom)
+            if member_count:
+                self.security_manager.update_group_member_count(chatroom['UserName'], member_count)
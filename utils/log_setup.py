@@ -0,0 +1,98 @@
+"""
+日志配置 - 日志记录放入内存队列，由后台线程写文件和终端
+
+处理消息的线程只把日志记录放进队列，格式化和磁盘写入都在 QueueListener 的线程中进行；
+日志文件按 logging.max_size 轮转，保留 logging.backup_count 个旧文件。
+"""
+import atexit
+import logging
+import os
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional, Union
+
+from utils.tracing import current_trace_id
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_size(size: Union[str, int, None], default: int = 10 * 1024 ** 2) -> int:
+    """把 "10MB"、"500KB"、1048576 等转换为字节数，无法识别时返回默认值"""
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*', str(size or ''), re.IGNORECASE)
+    if not match:
+        return default
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """只把记录放入队列，消息的 % 格式化留给后台线程
+
+    队列只在本进程内使用，记录不需要像默认的 prepare() 那样预先格式化成可序列化的形式。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _TraceIdFilter(logging.Filter):
+    """在记录日志的线程中取当前请求的追踪ID，写入 record.trace_id"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
+
+def setup_logging(log_config: Dict[str, Any]) -> QueueListener:
+    """配置根日志器（每个进程只配置一次，之后的调用沿用第一次的配置）"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_file = log_config.get('file', 'logs/wechat_bot.log')
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=parse_size(log_config.get('max_size', '10MB')),
+        backupCount=log_config.get('backup_count', 5),
+        encoding='utf-8'
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, str(log_config.get('level', 'INFO')).upper(), logging.INFO))
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(_TraceIdFilter())
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    for handler in list(logging.getLogger().handlers):
+        if isinstance(handler, _DeferredQueueHandler):
+            logging.getLogger().removeHandler(handler)
@@ -0,0 +1,185 @@
+"""
+内存统计 - 按数据结构估算常驻内存：数据表、剧名/演员索引、模糊候选表、缓存、频率限制记录
+
+Python 对象沿容器和实例属性递归累加 sys.getsizeof()（同一次统计中共享的对象只计入第一个组件），
+DataFrame 使用 pandas 的 memory_usage(deep=True)。数据表和索引只在数据重新加载后才会变化，
+按数据版本缓存统计结果；缓存和频率记录每次重新统计。
+开启 trace_allocations 后用 tracemalloc 记录分配位置，报告中列出占用最多的代码行和距上次报告增长最多的代码行，
+用于排查长时间运行中的内存泄漏（tracemalloc 会增加内存占用并拖慢分配，默认关闭）。
+"""
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+# 报告中的组件顺序
+COMPONENTS = [
+    ('catalog', "数据表"),
+    ('drama_index', "剧名索引"),
+    ('actor_index', "演员索引"),
+    ('fuzzy_candidates', "模糊候选表"),
+    ('result_cache', "结果缓存"),
+    ('card_cache', "卡片缓存"),
+    ('security_history', "频率限制记录"),
+    ('send_queues', "发送队列"),
+]
+
+# 只计对象本身、不进入内部的类型
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), range)
+
+# 不计入的类型：代码、模块、线程、日志器等由整个进程共享
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                  types.CodeType, types.FrameType, threading.Thread, logging.Logger)
+
+_PANDAS_TYPES = (pd.DataFrame, pd.Series, pd.Index)
+
+# tracemalloc 统计中忽略的分配位置（按代码行汇总后再过滤，逐条过滤分配记录太慢）
+_IGNORED_FILES = {tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>",
+                  "<frozen importlib._bootstrap_external>", "<unknown>"}
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """对象及其引用的所有对象占用的字节数，seen 中的对象（按 id）不重复计入"""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, _SKIPPED_TYPES):
+            continue
+        if isinstance(obj, _PANDAS_TYPES):
+            usage = obj.memory_usage(deep=True)
+            total += int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+            continue
+
+        total += sys.getsizeof(obj)
+        if isinstance(obj, _ATOMIC_TYPES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            attributes = getattr(obj, '__dict__', None)
+            if isinstance(attributes, dict):
+                stack.append(attributes)
+            for cls in type(obj).__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                for name in ((slots,) if isinstance(slots, str) else slots):
+                    if name not in ('__dict__', '__weakref__') and hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return total
+
+
+def format_bytes(size: int) -> str:
+    """字节数显示为 KB 或 MB"""
+    if abs(size) < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def rss_bytes() -> int:
+    """当前常驻内存(字节)，不支持 /proc 时返回峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryReporter:
+    def __init__(self, trace_allocations: bool = False, trace_frames: int = 1, top_sites: int = 5):
+        """初始化内存统计"""
+        self.trace_allocations = trace_allocations
+        self.trace_frames = max(1, trace_frames)
+        self.top_sites = top_sites
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._static_version = None
+        self._static_sizes: List[Tuple[str, int]] = []
+        self._last_sites: Optional[Dict[str, Tuple[int, int]]] = None
+
+    def start(self):
+        """按配置开始记录分配位置，应在加载数据之前调用"""
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self.logger.info("已开启 tracemalloc 内存分配跟踪")
+
+    def report(self, static: Iterable[Tuple[str, Any]], dynamic: Iterable[Tuple[str, Any]],
+               static_version: Any = None, exclude: Iterable[Any] = ()) -> Dict[str, Any]:
+        """统计各组件内存
+
+        static 中的组件只在 static_version 变化时重新统计；exclude 中的对象（如共享的配置）不计入任何组件。
+        """
+        with self._lock:
+            start_time = time.perf_counter()
+            excluded = {id(obj) for obj in exclude}
+
+            if static_version is None or static_version != self._static_version:
+                seen = set(excluded)
+                self._static_sizes = [(name, deep_sizeof(obj, seen)) for name, obj in static]
+                self._static_version = static_version
+
+            seen = set(excluded)
+            sizes = self._static_sizes + [(name, deep_sizeof(obj, seen)) for name, obj in dynamic]
+
+            rss = rss_bytes()
+            accounted = sum(size for _, size in sizes)
+            return {
+                'rss_bytes': rss,
+                'components': [{'name': name, 'bytes': size} for name, size in sizes],
+                'accounted_bytes': accounted,
+                'unaccounted_bytes': max(0, rss - accounted),
+                'tracemalloc': self._allocation_report(),
+                'elapsed_ms': round((time.perf_counter() - start_time) * 1000, 1)
+            }
+
+    def _allocation_report(self) -> Optional[Dict[str, Any]]:
+        """tracemalloc 统计：占用最多的代码行和距上次报告增长最多的代码行，未开启时返回None"""
+        if not tracemalloc.is_tracing():
+            return None
+
+        current, peak = tracemalloc.get_traced_memory()
+        sites = {}  # 分配位置 -> (字节数, 分配数)，按字节数从大到小
+        for stat in tracemalloc.take_snapshot().statistics('lineno'):
+            frame = stat.traceback[0]
+            if frame.filename not in _IGNORED_FILES:
+                sites[self._site(frame)] = (stat.size, stat.count)
+
+        top = [{'site': site, 'bytes': size, 'count': count}
+               for site, (size, count) in list(sites.items())[:self.top_sites]]
+
+        # 只保存按代码行汇总的结果，不保留整个快照
+        growth = []
+        if self._last_sites is not None:
+            diffs = []
+            for site, (size, count) in sites.items():
+                last_size, last_count = self._last_sites.get(site, (0, 0))
+                if size > last_size:
+                    diffs.append((size - last_size, count - last_count, site))
+            diffs.sort(reverse=True)
+            growth = [{'site': site, 'bytes_diff': size_diff, 'count_diff': count_diff}
+                      for size_diff, count_diff, site in diffs[:self.top_sites]]
+        self._last_sites = sites
+
+        return {'current_bytes': current, 'peak_bytes': peak, 'top_sites': top, 'growth': growth}
+
+    @staticmethod
+    def _site(frame: tracemalloc.Frame) -> str:
+        """分配位置：目录/文件名:行号"""
+        directory, filename = os.path.split(frame.filename)
+        return f"{os.path.basename(directory)}/{filename}:{frame.lineno}"
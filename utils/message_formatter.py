@@ -2,50 +2,114 @@
 消息格式化器 - 处理搜索结果的格式化和分批发送
 """
 import logging
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Tuple
-import yaml
+from utils.config_service import get_config_service
+from utils.metrics import metrics, STAGES
+from utils.memory_accounting import COMPONENTS, format_bytes
 
 class MessageFormatter:
     def __init__(self, config_path: str = "config.yaml"):
         """初始化消息格式化器"""
-        self.config = self._load_config(config_path)
+        self.config_service = get_config_service(config_path)
         self.logger = logging.getLogger(__name__)
         
-    def _load_config(self, config_path: str) -> Dict:
-        """加载配置文件"""
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
-        except Exception as e:
-            self.logger.error(f"配置文件加载失败: {e}")
-            return {}
+        # 单条结果卡片缓存（LRU）：(模板版本, 数据版本) 下 行号 -> 卡片文本
+        self.template_version = 0
+        self.single_template = None
+        self.card_cache_size = max(1, self.config.get('message_format', {}).get('card_cache_size', 10000))
+        self._card_scope = None
+        self._card_cache = OrderedDict()
+        self._card_lock = threading.Lock()
+        self.card_hits = 0
+        self.card_misses = 0
+        self._load_templates()
+        
+    @property
+    def config(self):
+        """当前配置（只读）"""
+        return self.config_service.snapshot.raw
+    
+    def _load_templates(self):
+        """读取单条结果模板，模板变化时版本号加1，旧卡片随之失效"""
+        template = self.config_service.snapshot.single_template
+        if template != self.single_template:
+            self.single_template = template
+            self.template_version += 1
     
     def format_search_results(self, results: List[Dict[str, Any]], query: str = "") -> List[str]:
         """格式化搜索结果为消息列表"""
-        if not results:
-            return [f"抱歉，没有找到与「{query}」相关的内容。"]
+        with metrics.timer('format'):
+            if not results:
+                return [f"抱歉，没有找到与「{query}」相关的内容。"]
+            
+            # 配置热重载后模板可能已变化
+            self._load_templates()
+            
+            # 获取配置（max_items_per_message 为可选的每条消息卡片数上限，0 表示不限）
+            max_items_per_message = self.config_service.snapshot.max_items_per_message
+            
+            # 格式化单条结果（优先使用缓存的卡片）
+            formatted_items = []
+            for result in results:
+                formatted_item = self._get_card(result)
+                if formatted_item:
+                    formatted_items.append(formatted_item)
+            
+            # 按长度打包成尽量少的消息
+            messages = self._split_into_messages(formatted_items, max_items_per_message, len(results))
+            
+            return messages
+    
+    def _get_card(self, result: Dict[str, Any]) -> str:
+        """取单条结果的卡片：同一模板版本和数据版本下，每行只格式化一次（超过 card_cache_size 时淘汰最久未用的卡片）"""
+        row_id = result.get('row_id')
+        if row_id is None:
+            return self._format_single_result(result)
         
-        # 获取配置
-        max_items_per_message = self.config.get('search', {}).get('max_items_per_message', 3)
+        scope = (self.template_version, result.get('generation', 0))
+        with self._card_lock:
+            if scope != self._card_scope:
+                # 模板或数据变化，旧卡片全部作废
+                self._card_cache = OrderedDict()
+                self._card_scope = scope
+            
+            card = self._card_cache.get(row_id)
+            if card is not None:
+                self._card_cache.move_to_end(row_id)
+                self.card_hits += 1
+                return card
+            self.card_misses += 1
         
-        # 格式化单条结果
-        formatted_items = []
+        # 在锁外格式化
+        card = self._format_single_result(result)
+        with self._card_lock:
+            if scope == self._card_scope:
+                self._card_cache[row_id] = card
+                while len(self._card_cache) > self.card_cache_size:
+                    self._card_cache.popitem(last=False)
+        return card
+    
+    def warm_cards(self, results: List[Dict[str, Any]]) -> int:
+        """预先格式化结果卡片，返回缓存中的卡片数"""
+        self._load_templates()
         for result in results:
-            formatted_item = self._format_single_result(result)
-            if formatted_item:
-                formatted_items.append(formatted_item)
-        
-        # 分批处理
-        messages = self._split_into_messages(formatted_items, max_items_per_message, len(results))
-        
-        return messages
+            self._get_card(result)
+        return len(self._card_cache)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """卡片缓存统计"""
+        lookups = self.card_hits + self.card_misses
+        return {
+            'card_cache_entries': len(self._card_cache),
+            'card_cache_hit_rate': self.card_hits / lookups if lookups else 0.0
+        }
     
     def _format_single_result(self, result: Dict[str, Any]) -> str:
         """格式化单条搜索结果"""
         try:
-            # 获取模板
-            template = self.config.get('message_format', {}).get('single_template', 
-                "🎬《{drama_name}》\n主演：{actors}\n集数：{episodes}集\n夸克：{quark_link}\n百度：{baidu_link}")
+            template = self.single_template
             
             # 数据清理和处理
             drama_name = str(result.get('drama_name', '')).strip()
@@ -92,36 +156,69 @@ class MessageFormatter:
             return ""
     
     def _split_into_messages(self, formatted_items: List[str], max_items_per_message: int, total_count: int) -> List[str]:
-        """将格式化的结果分割成多条消息"""
+        """将格式化的结果按实际长度打包成多条消息
+
+        按顺序把卡片装入消息，直到再放一张会超出字符预算；保持顺序时这样得到的消息数最少。
+        结果过多的提示放在第一条消息开头，不单独发送。
+        """
         if not formatted_items:
             return []
         
-        messages = []
-        separator = self.config.get('message_format', {}).get('separator', '\n\n')
+        snapshot = self.config_service.snapshot
+        budget = snapshot.message_budget
+        separator = snapshot.separator
         
         # 如果结果太多，添加提示信息
+        prefix = ""
         if total_count > len(formatted_items):
-            too_many_template = self.config.get('message_format', {}).get('too_many_results', 
-                "找到 {count} 个相关结果，为避免刷屏，仅显示前 {shown} 个：")
-            prefix_message = too_many_template.format(count=total_count, shown=len(formatted_items))
-            messages.append(prefix_message)
-        
-        # 分批处理
-        for i in range(0, len(formatted_items), max_items_per_message):
-            batch = formatted_items[i:i + max_items_per_message]
+            too_many_template = snapshot.too_many_results
+            prefix = too_many_template.format(count=total_count, shown=len(formatted_items)) + separator
+        
+        # 批次标题按最大可能的批次号预留长度
+        header_length = len(self._batch_header(len(formatted_items)))
+        max_card_length = budget - header_length - len(prefix)
+        items = [self._truncate(item, max_card_length) for item in formatted_items]
+        
+        batches = []
+        current = []
+        current_length = len(prefix) + header_length
+        for item in items:
+            item_length = len(item) + (len(separator) if current else 0)
+            full = current and (current_length + item_length > budget or
+                                (max_items_per_message and len(current) >= max_items_per_message))
+            if full:
+                batches.append(current)
+                current = []
+                current_length = header_length
+                item_length = len(item)
+            current.append(item)
+            current_length += item_length
+        batches.append(current)
+        
+        messages = []
+        for batch_num, batch in enumerate(batches, 1):
             message = separator.join(batch)
             
             # 添加批次信息（如果有多批）
-            if len(formatted_items) > max_items_per_message:
-                batch_num = (i // max_items_per_message) + 1
-                total_batches = (len(formatted_items) + max_items_per_message - 1) // max_items_per_message
-                if total_batches > 1:
-                    message = f"📺 第{batch_num}批结果：\n\n{message}"
+            if len(batches) > 1:
+                message = self._batch_header(batch_num) + message
+            if batch_num == 1:
+                message = prefix + message
             
             messages.append(message)
         
         return messages
     
+    def _batch_header(self, batch_num: int) -> str:
+        """批次标题"""
+        return f"📺 第{batch_num}批结果：\n\n"
+    
+    def _truncate(self, item: str, max_length: int) -> str:
+        """单张卡片超出预算时截断"""
+        if len(item) <= max_length:
+            return item
+        return item[:max(0, max_length - 1)] + "…"
+    
     def format_error_message(self, error_type: str, details: str = "") -> str:
         """格式化错误消息"""
         error_messages = {
@@ -171,7 +268,8 @@ class MessageFormatter:
         """
         return help_text.strip()
     
-    def format_stats_message(self, stats: Dict[str, int]) -> str:
+    def format_stats_message(self, stats: Dict[str, int], runtime_stats: Dict[str, Any] = None,
+                             memory_report: Dict[str, Any] = None) -> str:
         """格式化统计信息消息"""
         total_dramas = stats.get('total_dramas', 0)
         drama_keywords = stats.get('drama_keywords', 0)
@@ -183,11 +281,80 @@ class MessageFormatter:
 🎬 总剧集数：{total_dramas} 部
 🔍 剧名关键词：{drama_keywords} 个
 👥 演员关键词：{actor_keywords} 个
+🚫 屏蔽条目：{stats.get('unsafe_rows', 0)} 部
 
 数据最后更新：刚刚
-        """
-        return stats_text.strip()
+        """.strip()
+        
+        if runtime_stats:
+            stats_text += f"""
+
+📮 发送队列：
+• 待发送：{runtime_stats.get('pending_messages', 0)} 条
+• 发送中：{runtime_stats.get('queued_messages', 0)} 条
+• 平均延迟：{runtime_stats.get('lag_avg', 0.0):.2f} 秒
+• 最大延迟：{runtime_stats.get('lag_max', 0.0):.2f} 秒
+• 发送排期积压：{runtime_stats.get('pacing_backlog', 0.0):.0f} 秒"""
+            
+            if 'ingress_queue' in runtime_stats:
+                waiting = sum(runtime_stats.get(f"{stage}_queue", 0) for stage in ('ingress', 'search', 'format'))
+                stats_text += f"\n• 待处理请求：{waiting} 个"
+                stats_text += f"\n• 合并重复请求：{runtime_stats.get('coalesced_requests', 0)} 个"
+                stats_text += f"\n• 丢弃请求：{runtime_stats.get('shed_requests', 0)} 个"
+            
+            if 'result_cache_hit_rate' in runtime_stats:
+                stats_text += f"\n• 结果缓存命中率：{runtime_stats['result_cache_hit_rate']:.0%}"
+            
+            if 'card_cache_hit_rate' in runtime_stats:
+                stats_text += f"\n• 卡片缓存命中率：{runtime_stats['card_cache_hit_rate']:.0%}"
+            
+            if 'deferred_replies' in runtime_stats:
+                stats_text += f"\n• 静默时段待发送：{runtime_stats['deferred_replies']} 条"
+            
+            stage_latency = runtime_stats.get('stage_latency')
+            if stage_latency:
+                stats_text += "\n\n⏱ 处理耗时（p50/p95/p99 毫秒）："
+                labels = dict(STAGES)
+                for stage, summary in stage_latency.items():
+                    stats_text += (f"\n• {labels.get(stage, stage)}：{summary['p50_ms']:.1f}/"
+                                   f"{summary['p95_ms']:.1f}/{summary['p99_ms']:.1f}")
+        
+        if memory_report:
+            stats_text += self._format_memory_section(memory_report)
+        
+        return stats_text
     
+    def _format_memory_section(self, report: Dict[str, Any]) -> str:
+        """统计消息中的内存部分"""
+        labels = dict(COMPONENTS)
+        text = f"\n\n🧠 内存（常驻 {format_bytes(report['rss_bytes'])}）："
+        for component in report['components']:
+            text += f"\n• {labels.get(component['name'], component['name'])}：{format_bytes(component['bytes'])}"
+        text += f"\n• 其他（解释器、依赖库等）：{format_bytes(report['unaccounted_bytes'])}"
+        
+        allocations = report.get('tracemalloc')
+        if allocations:
+            text += (f"\n• 跟踪到的分配：{format_bytes(allocations['current_bytes'])}"
+                     f"（峰值 {format_bytes(allocations['peak_bytes'])}）")
+            for site in allocations['growth'][:3]:
+                text += f"\n• 增长 +{format_bytes(site['bytes_diff'])}：{site['site']}"
+        return text
+
+    def format_profile_report(self, report: Dict[str, Any]) -> str:
+        """格式化性能采样结果"""
+        text = (f"⏱️ 性能采样结束\n\n"
+                f"• 时长：{report['duration']:.1f} 秒\n"
+                f"• 采样次数：{report['samples']}\n"
+                f"• 处理请求：{report['requests']}\n"
+                f"• 文件：{report['file'] or '写入失败'}")
+
+        if report['hot_functions']:
+            text += "\n\n🔥 热点函数（占非空闲采样）："
+            for function, share in report['hot_functions']:
+                text += f"\n• {share:.0%} {function}"
+
+        return text
+
     def format_welcome_message(self) -> str:
         """格式化欢迎消息"""
         welcome_text = """
@@ -0,0 +1,311 @@
+"""
+消息处理流水线 - 基于asyncio的分阶段处理核心
+
+接收 -> 过滤与安全检查 -> 搜索（线程池） -> 格式化 -> 分批发送，
+各阶段之间通过有界队列连接。
+
+接收队列满时按配置的策略丢弃请求；同一会话在时间窗口内的相同查询会被合并，
+只执行一次搜索、只回复一次。
+
+每个请求的追踪对象随请求在队列间传递，各阶段处理该请求时把它设为当前追踪，
+交给线程池的调用复制当前上下文，阶段耗时和日志因此归属同一个请求。
+"""
+import asyncio
+import contextvars
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
+from utils.text_normalizer import normalize_text
+from utils.tracing import reset_trace, set_trace
+
+# 接收队列满时的丢弃策略
+SHED_POLICIES = ('drop_oldest', 'drop_newest')
+
+
+class MessagePipeline:
+    def __init__(self, bot, queue_size: int = 100, search_workers: int = 4,
+                 shed_policy: str = 'drop_oldest', coalesce_window: float = 10.0):
+        """初始化消息流水线"""
+        self.bot = bot
+        self.queue_size = queue_size
+        self.search_workers = max(1, search_workers)
+        self.logger = logging.getLogger(__name__)
+
+        if shed_policy not in SHED_POLICIES:
+            self.logger.warning(f"未知的丢弃策略 {shed_policy}，使用 drop_oldest")
+            shed_policy = 'drop_oldest'
+        self.shed_policy = shed_policy
+        self.shed_count = 0
+        self.singleflight = SingleFlight(coalesce_window)
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.command_executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._tasks = []
+        self._queues: Dict[str, asyncio.Queue] = {}
+
+    def start(self):
+        """在独立线程中启动事件循环"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self.executor = ThreadPoolExecutor(max_workers=self.search_workers, thread_name_prefix="search")
+        # 特殊命令单独一个线程，数据重载等耗时命令不占用搜索线程
+        self.command_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="command")
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="message-pipeline", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+
+        self.logger.info(f"消息流水线已启动，搜索线程数: {self.search_workers}")
+
+    def stop(self, timeout: float = 5.0):
+        """取消所有阶段任务并关闭事件循环"""
+        if not self.loop or not self._thread:
+            return
+
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._cancel_tasks)
+        self._thread.join(timeout)
+        self._thread = None
+
+        for executor in (self.executor, self.command_executor):
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.command_executor = None
+
+        self.logger.info("消息流水线已停止")
+
+    def submit(self, msg: Dict[str, Any], is_group: bool, trace=None) -> bool:
+        """从itchat回调线程提交消息（线程安全，不阻塞），trace 为该请求的追踪对象"""
+        if not self.loop or not self.loop.is_running():
+            return False
+
+        self.loop.call_soon_threadsafe(self._enqueue, msg, is_group, trace)
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取各阶段队列深度和丢弃、合并计数"""
+        stats = {f"{name}_queue": q.qsize() for name, q in self._queues.items()}
+        stats['shed_requests'] = self.shed_count
+        stats['coalesced_requests'] = self.singleflight.coalesced_count
+        return stats
+
+    def _run_loop(self):
+        """事件循环线程入口"""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            self.logger.error(f"消息流水线运行出错: {e}")
+        finally:
+            self.loop.close()
+
+    async def _main(self):
+        """创建阶段队列和任务，直到被取消"""
+        self._queues = {
+            'ingress': asyncio.Queue(self.queue_size),
+            'search': asyncio.Queue(self.queue_size),
+            'format': asyncio.Queue(self.queue_size),
+            'send': asyncio.Queue(self.queue_size),
+        }
+
+        self._tasks = [asyncio.create_task(self._admit_stage())]
+        self._tasks += [asyncio.create_task(self._search_stage()) for _ in range(self.search_workers)]
+        self._tasks.append(asyncio.create_task(self._format_stage()))
+        self._tasks.append(asyncio.create_task(self._send_stage()))
+        self._started.set()
+
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+
+    def _cancel_tasks(self):
+        """取消全部阶段任务，并释放仍在队列中的请求（在事件循环线程中执行）
+
+        正在处理中的请求由各阶段在收到取消时自行释放。
+        """
+        for task in self._tasks:
+            task.cancel()
+
+        for name, q in self._queues.items():
+            while not q.empty():
+                item = q.get_nowait()
+                if name == 'ingress':
+                    # 尚未准入，没有预留额度
+                    self._finish_trace(item[2], 'cancelled')
+                else:
+                    self._cancel_request(item)
+
+    def _cancel_request(self, request: Dict[str, Any]):
+        """停止时放弃一个已准入的请求：释放预留额度和合并key，结束追踪"""
+        self.bot.security_manager.release(request['reservation'])
+        if request.get('flight_key'):
+            self.singleflight.forget(request['flight_key'])
+            request['flight_key'] = None
+        self._finish_trace(request['trace'], 'cancelled')
+
+    def _enqueue(self, msg: Dict[str, Any], is_group: bool, trace=None):
+        """把消息放入接收队列，队列满时按策略丢弃（在事件循环线程中执行）"""
+        ingress = self._queues['ingress']
+        if ingress.full():
+            self.shed_count += 1
+            if self.shed_policy == 'drop_newest':
+                self.logger.warning("接收队列已满，丢弃新消息")
+                self._finish_trace(trace, 'shed')
+                return
+            _, _, dropped_trace = ingress.get_nowait()
+            self._finish_trace(dropped_trace, 'shed')
+            self.logger.warning("接收队列已满，丢弃最早的消息")
+
+        ingress.put_nowait((msg, is_group, trace))
+
+    def _finish_trace(self, trace, outcome: str):
+        """结束一个请求的追踪"""
+        if trace is not None:
+            trace.finish(outcome)
+
+    def _run_in_executor(self, func, *args):
+        """在线程池中执行，并带上当前上下文（当前追踪）"""
+        context = contextvars.copy_context()
+        return self.loop.run_in_executor(self.executor, context.run, func, *args)
+
+    def _run_command(self, command, trace=None):
+        """在命令线程中执行特殊命令，不等待结果，完成后结束追踪"""
+        context = contextvars.copy_context()
+        future = self.loop.run_in_executor(self.command_executor, context.run, command)
+
+        def done(future):
+            if future.cancelled():
+                self._finish_trace(trace, 'cancelled')
+            elif future.exception() is not None:
+                self.logger.error(f"执行命令出错: {future.exception()}")
+                self._finish_trace(trace, 'error')
+            else:
+                self._finish_trace(trace, 'command')
+
+        future.add_done_callback(done)
+
+    async def _admit_stage(self):
+        """过滤、合并重复请求、安全检查和识别特殊命令"""
+        while True:
+            msg, is_group, trace = await self._queues['ingress'].get()
+            token = set_trace(trace)
+            flight_key = None
+            try:
+                if trace is not None:
+                    metrics.observe('ingress_wait', time.perf_counter() - trace.start)
+
+                request = self.bot._filter_message(msg, is_group)
+                if not request:
+                    continue
+
+                # 在安全检查之前合并重复查询，被合并的请求不占用频率额度
+                flight_key = (request['from_user'], normalize_text(request['content']))
+                if not self.singleflight.acquire(flight_key):
+                    self.logger.info("重复查询已合并")
+                    self._finish_trace(trace, 'coalesced')
+                    flight_key = None
+                    continue
+
+                if not self.bot._check_security(request):
+                    self.singleflight.forget(flight_key)
+                    flight_key = None
+                    continue
+
+                # 命令识别只是字符串比较，直接在事件循环中进行；命令本身（重载、统计等）交给命令线程，
+                # 不占用搜索线程，也不阻塞后续消息的准入
+                command = self.bot._match_special_command(
+                    request['content'], request['from_user'], request['actual_user'], request['contact']
+                )
+                if command is not None:
+                    self.bot.security_manager.release(request['reservation'])
+                    self._run_command(command, trace)
+                else:
+                    request['flight_key'] = flight_key
+                    request['trace'] = trace
+                    flight_key = None
+                    try:
+                        await self._queues['search'].put(request)
+                    except asyncio.CancelledError:
+                        self._cancel_request(request)
+                        raise
+            except Exception as e:
+                self.logger.error(f"消息处理出错: {e}")
+                self._finish_trace(trace, 'error')
+            finally:
+                if flight_key:
+                    self.singleflight.release(flight_key)
+                reset_trace(token)
+
+    async def _search_stage(self):
+        """在线程池中执行搜索"""
+        while True:
+            request = await self._queues['search'].get()
+            token = set_trace(request['trace'])
+            try:
+                query = request['content'].replace('@', '').strip()
+                request['query'] = query
+                request['results'] = await self._run_in_executor(self.bot._search, query, request['is_group'])
+                await self._queues['format'].put(request)
+            except asyncio.CancelledError:
+                self._cancel_request(request)
+                raise
+            except Exception as e:
+                self.logger.error(f"搜索处理出错: {e}")
+                self.bot.security_manager.release(request['reservation'])
+                self._finish_trace(request['trace'], 'error')
+                error_msg = self.bot.message_formatter.format_error_message('search_failed', str(e))
+                await self._run_in_executor(self.bot._send_message, error_msg, request['from_user'])
+            finally:
+                if request['flight_key']:
+                    self.singleflight.release(request['flight_key'])
+                    request['flight_key'] = None
+                reset_trace(token)
+
+    async def _format_stage(self):
+        """格式化搜索结果"""
+        while True:
+            request = await self._queues['format'].get()
+            token = set_trace(request['trace'])
+            try:
+                request['messages'] = self.bot.message_formatter.format_search_results(
+                    request['results'], request['query']
+                )
+                await self._queues['send'].put(request)
+            except asyncio.CancelledError:
+                self._cancel_request(request)
+                raise
+            except Exception as e:
+                self.logger.error(f"格式化结果出错: {e}")
+                self.bot.security_manager.release(request['reservation'])
+                self._finish_trace(request['trace'], 'error')
+            finally:
+                reset_trace(token)
+
+    async def _send_stage(self):
+        """交给发送调度器按节奏发送"""
+        while True:
+            request = await self._queues['send'].get()
+            token = set_trace(request['trace'])
+            try:
+                self.bot._send_messages_with_delay(
+                    request['messages'], request['from_user'], request['actual_user'], request['reservation']
+                )
+            except Exception as e:
+                self.logger.error(f"提交发送出错: {e}")
+                self.bot.security_manager.release(request['reservation'])
+                self._finish_trace(request['trace'], 'error')
+            finally:
+                reset_trace(token)
@@ -0,0 +1,188 @@
+"""
+性能指标 - 各处理阶段的耗时直方图
+
+直方图使用固定的对数分桶（约每档 ×1.25，覆盖 10 微秒到 100 秒），记录一次耗时只需一次二分查找和计数，
+内存固定，不保存原始样本。分位数按所在桶的上界估算，相对误差不超过一档。
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from utils.tracing import record_span
+
+# 分桶上界(秒)
+BUCKET_BOUNDS = []
+_bound = 1e-5
+while _bound < 100:
+    BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.25
+BUCKET_BOUNDS.append(float('inf'))
+
+# 统计命令和指标文件中的阶段顺序
+STAGES = [
+    ('ingress_wait', "接收排队"),
+    ('filter', "消息过滤"),
+    ('security_check', "安全检查"),
+    ('preprocess', "查询预处理"),
+    ('search_exact', "精确匹配"),
+    ('search_fuzzy', "模糊匹配"),
+    ('search_word', "分词匹配"),
+    ('ranking', "去重排序"),
+    ('search_total', "搜索合计"),
+    ('format', "格式化"),
+    ('send_queue_wait', "发送排队"),
+    ('itchat_send', "微信发送"),
+]
+
+
+class LatencyHistogram:
+    __slots__ = ('counts', 'count', 'total', 'max', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """记录一次耗时"""
+        index = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """估算分位数(秒)"""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            maximum = self.max
+        if not count:
+            return 0.0
+
+        rank = count * p / 100
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(BUCKET_BOUNDS[index], maximum)
+        return maximum
+
+    def summary(self) -> Dict[str, float]:
+        """计数、平均值和 p50/p95/p99（毫秒）"""
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'max_ms': self.max * 1000
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """初始化指标集合"""
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        self._dump_file = None
+        self._dump_interval = 60
+        self._dump_max_size = 10 * 1024 * 1024
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        """取（必要时创建）直方图"""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float):
+        """记录一次耗时（同时记入当前请求的追踪）"""
+        self.histogram(name).observe(seconds)
+        record_span(name, seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """计时代码块"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """所有有记录的阶段的耗时摘要，按 STAGES 的顺序排列"""
+        order = {name: index for index, (name, _) in enumerate(STAGES)}
+        with self._lock:
+            names = sorted(self._histograms, key=lambda name: (order.get(name, len(order)), name))
+        return {name: self._histograms[name].summary() for name in names if self._histograms[name].count}
+
+    def reset(self):
+        """清空所有直方图"""
+        with self._lock:
+            self._histograms = {}
+
+    def start_dump(self, dump_file: str, interval: float = 60, max_size: int = 10 * 1024 * 1024):
+        """启动定期写入指标文件（JSON Lines，每行一次快照）的线程，文件超过 max_size 时轮转为 .1"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._dump_file = dump_file
+        self._dump_interval = max(1, interval)
+        self._dump_max_size = max_size
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._dump_loop, name="metrics-dump", daemon=True)
+        self._thread.start()
+
+    def stop_dump(self):
+        """停止写入线程并写入最后一次快照"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+            self.dump()
+
+    def dump(self):
+        """追加一次快照到指标文件"""
+        if not self._dump_file:
+            return
+
+        stages = self.snapshot()
+        if not stages:
+            return
+
+        try:
+            directory = os.path.dirname(self._dump_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            line = json.dumps({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'stages': stages},
+                              ensure_ascii=False, separators=(',', ':'))
+            if os.path.exists(self._dump_file) and os.path.getsize(self._dump_file) > self._dump_max_size:
+                os.replace(self._dump_file, self._dump_file + '.1')
+            with open(self._dump_file, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except Exception as e:
+            self.logger.error(f"写入指标文件失败: {e}")
+
+    def _dump_loop(self):
+        """定期写入指标文件"""
+        while not self._stopped.wait(self._dump_interval):
+            self.dump()
+
+
+# 进程内共享的指标集合
+metrics = MetricsRegistry()
@@ -0,0 +1,191 @@
+"""
+发送节奏调度 - 在一条全局发送时间线上为所有会话分配发送时刻
+
+每条消息分配满足以下约束的最早时刻：
+- 全局每分钟/每小时发送数不超过 security.rate_limit 的限制
+- 任意两条发送之间至少间隔 min_interval 秒
+- 同一群（@@开头的会话）每分钟发送数不超过 per_group_per_minute，私聊不受此限制
+- 同一会话相邻两条消息之间的间隔由 SecurityManager.calculate_send_delay 给出（含随机抖动和群人数调整）
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.security_manager import MINUTE, HOUR
+
+# 单条消息寻找可用时刻的最大尝试次数
+MAX_PROBES = 1000
+# 时刻滑出窗口后再留出的余量，避免 s + window - window 的浮点误差导致原地踏步
+EPSILON = 1e-6
+
+
+def _window_allows(slots: List[float], t: float, window: float, limit: int) -> bool:
+    """在有序时刻列表中插入t后，任意长度为window的窗口内的数量是否仍不超过limit"""
+    lo = bisect.bisect_right(slots, t - window)
+    hi = bisect.bisect_left(slots, t + window)
+    if hi - lo < limit:
+        return True
+
+    nearby = slots[lo:hi]
+    bisect.insort(nearby, t)
+    # 只需检查从某个时刻开始、且包含t的窗口
+    for i, start in enumerate(nearby):
+        if start > t:
+            break
+        end = bisect.bisect_left(nearby, start + window, i)
+        if end - i > limit:
+            return False
+    return True
+
+
+def _next_candidate(slots: List[float], t: float, window: float) -> float:
+    """t不可用时，下一个可能可用的时刻：最早一个覆盖t的时刻滑出窗口之时"""
+    lo = bisect.bisect_right(slots, t - window)
+    if lo < len(slots):
+        return max(t, slots[lo] + window + EPSILON)
+    return t + 1.0
+
+
+class PacingScheduler:
+    def __init__(self, security_manager):
+        """初始化发送节奏调度器"""
+        self.security_manager = security_manager
+        self._lock = threading.Lock()
+
+        self._global_slots = []  # 一小时内已分配的发送时刻（有序）
+        self._conversation_slots: Dict[str, List[float]] = {}  # 每个会话一分钟内已分配的时刻（有序）
+        self._last_sweep = None  # 上次清理全部会话的时间
+
+    def _get_limits(self) -> Dict:
+        """读取节奏约束"""
+        snapshot = self.security_manager.config_service.snapshot
+        enabled = snapshot.rate_limit_enabled
+        return {
+            'per_minute': snapshot.max_per_minute if enabled else None,
+            'per_hour': snapshot.max_per_hour if enabled else None,
+            'per_conversation': snapshot.per_group_per_minute,
+            'min_interval': snapshot.min_interval,
+        }
+
+    def assign(self, conversation: str, count: int, now: Optional[float] = None) -> List[float]:
+        """为会话的 count 条消息分配发送时刻（time.monotonic() 时间）"""
+        now = time.monotonic() if now is None else now
+        limits = self._get_limits()
+
+        # 群聊才有每群每分钟的限制；私聊只保持同一会话内的间隔
+        per_conversation = limits['per_conversation'] if conversation.startswith('@@') else None
+
+        with self._lock:
+            # 只清理本会话的时刻，其他会话每分钟统一清理一次，开销与会话总数无关
+            self._expire_global(now)
+            if self._last_sweep is None or now - self._last_sweep >= MINUTE:
+                self._expire(now)
+            conversation_slots = self._conversation_slots.setdefault(conversation, [])
+            self._expire_conversation(conversation_slots, now)
+            assigned = []
+
+            for _ in range(count):
+                # 同一会话：在上一条之后，间隔含随机抖动
+                earliest = now
+                if conversation_slots:
+                    gap = self.security_manager.calculate_send_delay(conversation, 1)
+                    earliest = max(now, conversation_slots[-1] + gap)
+
+                t = self._find_slot(earliest, conversation_slots, limits, per_conversation)
+                bisect.insort(self._global_slots, t)
+                conversation_slots.append(t)
+                assigned.append(t)
+
+            return assigned
+
+    def _find_slot(self, t: float, conversation_slots: List[float], limits: Dict,
+                   per_conversation: Optional[int]) -> float:
+        """从t开始寻找满足所有约束的最早时刻"""
+        for _ in range(MAX_PROBES):
+            candidate = t
+
+            # 与前后已分配时刻保持最小间隔
+            min_interval = limits['min_interval']
+            if min_interval > 0:
+                index = bisect.bisect_left(self._global_slots, candidate)
+                if index > 0 and candidate - self._global_slots[index - 1] < min_interval:
+                    candidate = self._global_slots[index - 1] + min_interval
+                elif index < len(self._global_slots) and self._global_slots[index] - candidate < min_interval:
+                    candidate = self._global_slots[index] + min_interval
+
+            for slots, window, limit in (
+                (self._global_slots, MINUTE, limits['per_minute']),
+                (self._global_slots, HOUR, limits['per_hour']),
+                (conversation_slots, MINUTE, per_conversation),
+            ):
+                if limit is not None and not _window_allows(slots, candidate, window, limit):
+                    candidate = _next_candidate(slots, candidate, window)
+
+            if candidate == t:
+                return t
+            t = candidate
+
+        return t
+
+    def _expire(self, now: float):
+        """清理全局和所有会话中已滑出窗口的时刻，调用方需持有锁"""
+        self._expire_global(now)
+        for conversation in list(self._conversation_slots):
+            slots = self._conversation_slots[conversation]
+            self._expire_conversation(slots, now)
+            if not slots:
+                del self._conversation_slots[conversation]
+        self._last_sweep = now
+
+    def _expire_global(self, now: float):
+        """清理全局时间线中一小时前的时刻，调用方需持有锁"""
+        cutoff = bisect.bisect_right(self._global_slots, now - HOUR)
+        if cutoff:
+            del self._global_slots[:cutoff]
+
+    @staticmethod
+    def _expire_conversation(slots: List[float], now: float):
+        """清理会话中一分钟前的时刻"""
+        cutoff = bisect.bisect_right(slots, now - MINUTE)
+        if cutoff:
+            del slots[:cutoff]
+
+    def export_state(self, now: Optional[float] = None) -> Dict:
+        """导出时间线（相对当前的秒数），用于重启后恢复各会话的发送位置"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._expire(now)
+            return {
+                'global': [round(t - now, 3) for t in self._global_slots],
+                'conversations': {conversation: [round(t - now, 3) for t in slots]
+                                  for conversation, slots in self._conversation_slots.items()}
+            }
+
+    def restore_state(self, state: Dict, elapsed: float = 0.0, now: Optional[float] = None):
+        """恢复 export_state 导出的时间线，elapsed 为导出至今经过的秒数
+
+        导出时尚未到期的时刻对应的消息随进程退出而丢失，不恢复，以免占用额度。
+        """
+        now = time.monotonic() if now is None else now
+        base = now - elapsed
+        with self._lock:
+            self._global_slots = sorted(base + offset for offset in state.get('global', []) if offset <= 0)
+            self._conversation_slots = {}
+            for conversation, offsets in state.get('conversations', {}).items():
+                slots = sorted(base + offset for offset in offsets if offset <= 0)
+                if slots:
+                    self._conversation_slots[conversation] = slots
+            self._expire(now)
+
+    def get_stats(self, now: Optional[float] = None) -> Dict:
+        """获取时间线统计：已排期数量和积压时长"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            future_slots = len(self._global_slots) - bisect.bisect_right(self._global_slots, now)
+            backlog = self._global_slots[-1] - now if self._global_slots else 0.0
+            return {
+                'scheduled_slots': future_slots,
+                'pacing_backlog': max(0.0, backlog),
+                'paced_conversations': len(self._conversation_slots)
+            }
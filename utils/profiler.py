@@ -0,0 +1,166 @@
+"""
+采样分析器 - 按需对所有线程定时采样调用栈，输出折叠栈（collapsed stack）文件
+
+采样线程每隔 interval 秒读取一次 sys._current_frames()，每个线程的调用栈折叠成
+「线程名;函数 (文件:行);...」一行计数，可直接用 flamegraph.pl 或 speedscope 生成火焰图。
+到达时长或请求数后自动停止并写入文件；未启动时只有 on_request() 中的一次布尔判断。
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 在这些函数里的采样视为线程空闲，不计入热点摘要（仍写入折叠栈文件）
+IDLE_FUNCTIONS = {'wait', 'select', 'poll', 'sleep', '_worker_loop', 'get', 'accept', 'readline', '_wait_for_tstate_lock'}
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir: str = 'logs', interval: float = 0.01, max_duration: float = 300):
+        """初始化采样分析器"""
+        self.output_dir = output_dir
+        self.interval = max(0.001, interval)
+        self.max_duration = max_duration
+        self.logger = logging.getLogger(__name__)
+
+        self.active = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stacks = Counter()
+        self._labels = {}  # 代码对象 -> 栈帧标签
+        self._samples = 0
+        self._requests = 0
+        self._request_limit = None
+        self._started_at = 0.0
+        self._deadline = 0.0
+        self._on_finish = None
+
+    def start(self, duration: Optional[float] = None, requests: Optional[int] = None,
+              on_finish: Optional[Callable[[Dict], None]] = None) -> bool:
+        """开始采样，到 duration 秒或处理完 requests 个请求后停止；已在采样时返回False
+
+        两个条件都给出时先到者为准，采样时长始终不超过 max_duration。
+        on_finish(report) 在采样线程中调用，report 见 _finish()。
+        """
+        with self._lock:
+            if self.active:
+                return False
+
+            self._stacks = Counter()
+            self._samples = 0
+            self._requests = 0
+            self._request_limit = requests if requests and requests > 0 else None
+            if duration is None or duration <= 0:
+                duration = self.max_duration
+            self._deadline = time.monotonic() + min(duration, self.max_duration)
+            self._started_at = time.time()
+            self._on_finish = on_finish
+            self._stopped.clear()
+            self.active = True
+
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+        limit = f"{self._request_limit} 个请求或 " if self._request_limit else ""
+        self.logger.info(f"开始性能采样：{limit}{min(duration, self.max_duration):.0f} 秒")
+        return True
+
+    def stop(self):
+        """提前结束采样（仍会写入文件）"""
+        self._stopped.set()
+
+    def on_request(self):
+        """处理完一个请求后调用，达到请求数时结束采样"""
+        if not self.active:
+            return
+        with self._lock:
+            self._requests += 1
+            if self._request_limit and self._requests >= self._request_limit:
+                self._stopped.set()
+
+    def _run(self):
+        """采样线程"""
+        own_ident = threading.get_ident()
+        try:
+            while not self._stopped.wait(self.interval):
+                if time.monotonic() >= self._deadline:
+                    break
+                self._sample(own_ident)
+        except Exception as e:
+            self.logger.error(f"性能采样出错: {e}")
+        finally:
+            self._finish()
+
+    def _sample(self, own_ident: int):
+        """对除采样线程外的所有线程各记录一次调用栈"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        labels = self._labels
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    labels[code] = label
+                stack.append(label)
+                frame = frame.f_back
+
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self._stacks[';'.join(stack)] += 1
+        self._samples += 1
+
+    def _finish(self):
+        """写入折叠栈文件并通知调用方"""
+        with self._lock:
+            # 清除 active 后可能立即开始新的采样并覆盖这些字段，需在锁内取出
+            stacks = self._stacks
+            started_at = self._started_at
+            report = {
+                'file': None,
+                'samples': self._samples,
+                'requests': self._requests,
+                'duration': time.time() - started_at,
+                'hot_functions': self.hot_functions(stacks),
+            }
+            on_finish = self._on_finish
+            self._on_finish = None
+            self._labels = {}
+            self.active = False
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            filename = time.strftime('profile-%Y%m%d-%H%M%S.folded', time.localtime(started_at))
+            path = os.path.join(self.output_dir, filename)
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            report['file'] = path
+            self.logger.info(f"性能采样结束：{report['samples']} 次采样，{report['requests']} 个请求，已写入 {path}")
+        except Exception as e:
+            self.logger.error(f"写入采样文件失败: {e}")
+
+        if on_finish:
+            try:
+                on_finish(report)
+            except Exception as e:
+                self.logger.error(f"采样结束回调出错: {e}")
+
+    @staticmethod
+    def hot_functions(stacks: Counter, limit: int = 5) -> List[Tuple[str, float]]:
+        """按栈顶函数统计的热点（排除空闲等待），返回 [(函数, 占非空闲采样的比例)]"""
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaf = stack.rsplit(';', 1)[-1]
+            if leaf.split(' ', 1)[0] not in IDLE_FUNCTIONS:
+                leaves[leaf] += count
+
+        total = sum(leaves.values())
+        return [(leaf, count / total) for leaf, count in leaves.most_common(limit)] if total else []
@@ -0,0 +1,166 @@
+"""
+查询日志 - 记录每次搜索的归一化查询、结果数、耗时和会话类型，离线汇总出热门查询集
+
+搜索线程只把一个元组放入内存队列，由后台线程每隔 flush_interval 秒批量追加到日志文件，
+超过大小上限时轮转为 .1。每行以制表符分隔（查询已归一化，不含制表符和换行）：
+  时间戳  会话类型(g群聊/p私聊)  结果数  耗时毫秒  查询
+query_report.py 汇总出热门查询、无结果查询和热门查询集；机器人启动时用热门查询集预热结果缓存和卡片缓存。
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class QueryLog:
+    def __init__(self, log_file: str = 'logs/queries.tsv', flush_interval: float = 5,
+                 max_size: int = 50 * 1024 * 1024, enabled: bool = True):
+        """初始化查询日志"""
+        self.log_file = log_file
+        self.flush_interval = max(0.1, flush_interval)
+        self.max_size = max_size
+        self.enabled = enabled
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = queue.SimpleQueue()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.written_count = 0
+
+    def record(self, query: str, result_count: int, latency: float, is_group: bool):
+        """记录一次搜索（latency 单位为秒）"""
+        if self._thread and query:
+            self._queue.put((time.time(), 'g' if is_group else 'p', result_count, latency, query))
+
+    def start(self):
+        """启动写入线程"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._write_loop, name="query-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """写完队列中的记录后停止写入线程"""
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join(5)
+            self._thread = None
+
+    def _write_loop(self):
+        """定期批量写入"""
+        directory = os.path.dirname(self.log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """把队列中的记录写入文件"""
+        lines = []
+        while True:
+            try:
+                timestamp, conv_type, result_count, latency, query = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            lines.append(f"{timestamp:.0f}\t{conv_type}\t{result_count}\t{latency * 1000:.1f}\t{query}\n")
+        if not lines:
+            return
+
+        try:
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > self.max_size:
+                os.replace(self.log_file, self.log_file + '.1')
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            self.written_count += len(lines)
+        except Exception as e:
+            self.logger.error(f"写入查询日志失败: {e}")
+
+
+def load_query_log(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """读取查询日志，跳过格式不正确的行"""
+    records = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t', 4)
+                if len(fields) != 5 or not fields[4]:
+                    continue
+                try:
+                    records.append({
+                        'ts': float(fields[0]),
+                        'type': fields[1],
+                        'results': int(fields[2]),
+                        'latency_ms': float(fields[3]),
+                        'query': fields[4]
+                    })
+                except ValueError:
+                    continue
+    return records
+
+
+def aggregate(records: List[Dict[str, Any]], top: int = 20, hot_size: int = 200,
+              min_count: int = 2) -> Dict[str, Any]:
+    """汇总查询日志
+
+    热门查询集为有结果、出现至少 min_count 次的查询中最常见的 hot_size 个。
+    """
+    counts = Counter()
+    zero_counts = Counter()
+    latencies = defaultdict(list)
+    last_results = {}
+    types = Counter()
+    for record in records:
+        query = record['query']
+        counts[query] += 1
+        types[record['type']] += 1
+        latencies[query].append(record['latency_ms'])
+        last_results[query] = record['results']
+        if record['results'] == 0:
+            zero_counts[query] += 1
+
+    def describe(query: str, count: int) -> Dict[str, Any]:
+        values = latencies[query]
+        return {'query': query, 'count': count, 'results': last_results[query],
+                'avg_latency_ms': round(sum(values) / len(values), 1)}
+
+    hot_set = [query for query, count in counts.most_common()
+               if count >= min_count and last_results[query] > 0][:hot_size]
+
+    return {
+        'total': len(records),
+        'distinct': len(counts),
+        'zero_result_total': sum(zero_counts.values()),
+        'by_type': dict(types),
+        'top': [describe(query, count) for query, count in counts.most_common(top)],
+        'zero_results': [describe(query, count) for query, count in zero_counts.most_common(top)],
+        'hot_set': hot_set
+    }
+
+
+def save_hot_set(path: str, queries: List[str]):
+    """保存热门查询集"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': time.time(), 'queries': queries}, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+
+
+def load_hot_set(path: str) -> Optional[List[str]]:
+    """读取热门查询集，文件不存在或损坏时返回None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [str(query) for query in json.load(f).get('queries', []) if query]
+    except (OSError, ValueError, AttributeError):
+        return None
@@ -0,0 +1,217 @@
+"""
+静默时段延迟发送队列 - 静默时段内生成的回复先存入本地文件，静默时段结束后逐批发送
+
+- 同一会话中同一用户的新回复会替换旧回复（只保留最后一次查询的结果）
+- 队列保存为紧凑的JSON文件，机器人重启后不会丢失；入队只标记待保存，由定时线程在锁外写文件
+- 会话ID（UserName）只在一次登录内有效：文件中记录登录会话，重新登录后丢弃旧会话的回复
+- 由 schedule 定时任务逐批取出，交给发送时间线按节奏发送
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import schedule
+
+
+class QuietHoursQueue:
+    def __init__(self, deliver_func: Callable[[str, str, List[str]], bool],
+                 is_quiet_func: Callable[[], bool],
+                 queue_file: str = "data/quiet_queue.json",
+                 max_entries: int = 500,
+                 max_age: float = 12 * 3600,
+                 flush_interval: int = 60,
+                 flush_batch_size: int = 5):
+        """初始化静默时段队列
+
+        deliver_func(conversation, actual_user, messages) 返回 False 表示暂时无法发送（如额度不足），
+        该回复留在队首，下次再试。
+        """
+        self.deliver_func = deliver_func
+        self.is_quiet_func = is_quiet_func
+        self.queue_file = queue_file
+        self.max_entries = max(1, max_entries)
+        self.max_age = max_age
+        self.flush_interval = max(1, int(flush_interval))
+        self.flush_batch_size = max(1, flush_batch_size)
+        self.logger = logging.getLogger(__name__)
+
+        # (会话, 用户) -> (创建时间, 消息列表)，按入队先后排列
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.session = None  # 当前登录会话（机器人自己的UserName）
+        self._restored_session = None  # 文件中记录的登录会话
+        self._scheduler = schedule.Scheduler()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.superseded_count = 0
+        self.expired_count = 0
+        self.flushed_count = 0
+
+        self._load()
+
+    def start(self):
+        """启动定时发送线程"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._scheduler.clear()
+        self._scheduler.every(self.flush_interval).seconds.do(self.flush)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="quiet-hours-queue", daemon=True)
+        self._thread.start()
+        self.logger.info(f"静默时段队列已启动，待发送 {len(self._entries)} 条回复")
+
+    def stop(self):
+        """停止定时发送线程并保存尚未写入的改动"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+        self._scheduler.clear()
+        self.save()
+
+    def set_session(self, session: str):
+        """登录后设置当前会话；文件中的回复属于另一次登录（或会话未知）时全部丢弃，避免发往失效的UserName"""
+        with self._lock:
+            self.session = session
+            if self._entries and (not session or session != self._restored_session):
+                dropped = len(self._entries)
+                self._entries.clear()
+                self.expired_count += dropped
+                self._dirty = True
+                self.logger.info(f"重新登录后会话已变化，丢弃 {dropped} 条上次登录时的静默时段回复")
+            self._restored_session = session
+
+    def _run(self):
+        """执行到期的定时任务，并保存队列的改动"""
+        while not self._stopped.wait(1):
+            try:
+                self._scheduler.run_pending()
+                self.save()
+            except Exception as e:
+                self.logger.error(f"静默时段队列任务出错: {e}")
+
+    def defer(self, conversation: str, actual_user: str, messages: List[str]):
+        """存入一条回复，替换同一会话中同一用户尚未发送的回复"""
+        if not messages:
+            return
+
+        key = (conversation, actual_user)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.superseded_count += 1
+            self._entries[key] = (time.time(), list(messages))
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.expired_count += 1
+
+            # 由定时线程写文件，入队可能发生在流水线的事件循环线程中，不能在这里做磁盘IO
+            self._dirty = True
+
+        self.logger.info("静默时段，回复已存入队列: %s...", conversation[:10])
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """非静默时段取出一批回复发送，返回发送的回复数"""
+        if self.is_quiet_func():
+            return 0
+
+        now = time.time() if now is None else now
+        delivered = 0
+
+        with self._lock:
+            if self._expire(now):
+                self._dirty = True
+            batch = list(self._entries.items())[:self.flush_batch_size]
+
+        for key, (created_at, messages) in batch:
+            conversation, actual_user = key
+            try:
+                if not self.deliver_func(conversation, actual_user, messages):
+                    break
+            except Exception as e:
+                self.logger.error(f"发送静默时段回复失败: {e}")
+                break
+
+            with self._lock:
+                # 发送期间可能已被同一用户的新回复替换，只移除已发送的这一条
+                if self._entries.get(key, (None,))[0] == created_at:
+                    del self._entries[key]
+                    self._dirty = True
+            delivered += 1
+
+        if delivered:
+            self.flushed_count += delivered
+            self.logger.info(f"已发送 {delivered} 条静默时段回复，剩余 {len(self._entries)} 条")
+
+        return delivered
+
+    def _expire(self, now: float) -> int:
+        """丢弃过旧的回复，返回丢弃数，调用方需持有锁"""
+        expired = 0
+        while self._entries:
+            created_at, _ = next(iter(self._entries.values()))
+            if now - created_at <= self.max_age:
+                break
+            self._entries.popitem(last=False)
+            expired += 1
+        self.expired_count += expired
+        return expired
+
+    def _load(self):
+        """从文件加载队列"""
+        if not os.path.exists(self.queue_file):
+            return
+
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 旧格式（只有回复列表）没有会话信息，登录后会被丢弃
+            rows = data.get('entries', []) if isinstance(data, dict) else data
+            self._restored_session = data.get('session') if isinstance(data, dict) else None
+            for conversation, actual_user, created_at, messages in rows:
+                self._entries[(conversation, actual_user)] = (created_at, messages)
+            self.logger.info(f"已加载 {len(self._entries)} 条静默时段回复")
+        except Exception as e:
+            self.logger.error(f"加载静默时段队列失败: {e}")
+
+    def save(self):
+        """有改动时写入文件（锁内只复制队列，写文件在锁外；先写临时文件再替换）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {
+                'session': self._restored_session,
+                'entries': [[conversation, actual_user, created_at, messages]
+                            for (conversation, actual_user), (created_at, messages) in self._entries.items()]
+            }
+
+        try:
+            directory = os.path.dirname(self.queue_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            temp_file = f"{self.queue_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_file, self.queue_file)
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            self.logger.error(f"保存静默时段队列失败: {e}")
+
+    def get_stats(self) -> dict:
+        """获取队列统计"""
+        with self._lock:
+            return {
+                'deferred_replies': len(self._entries),
+                'superseded_replies': self.superseded_count,
+                'flushed_replies': self.flushed_count
+            }
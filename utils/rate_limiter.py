@@ -0,0 +1,200 @@
+"""
+频率限制 - 分桶滑动窗口计数器，准入判断为O(1)
+"""
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class SlidingWindowCounter:
+    """分桶滑动窗口计数器
+
+    把窗口切分为固定数量的桶，每个桶记录一个时间片内的事件数。
+    计数和记录只需推进桶指针，与历史事件数量无关。时间使用 time.monotonic()。
+    """
+
+    __slots__ = ('window', 'bucket_count', 'bucket_width', 'buckets', 'total', 'current_slot')
+
+    def __init__(self, window: float, bucket_count: int = 60):
+        self.window = float(window)
+        self.bucket_count = bucket_count
+        self.bucket_width = self.window / bucket_count
+        self.buckets = [0] * bucket_count
+        self.total = 0
+        self.current_slot = 0
+
+    def _advance(self, now: float):
+        """推进到当前时间片，清空已滑出窗口的桶"""
+        slot = int(now / self.bucket_width)
+        elapsed = slot - self.current_slot
+        if elapsed <= 0:
+            return
+
+        if elapsed >= self.bucket_count:
+            self.buckets = [0] * self.bucket_count
+            self.total = 0
+        else:
+            for i in range(self.current_slot + 1, slot + 1):
+                index = i % self.bucket_count
+                self.total -= self.buckets[index]
+                self.buckets[index] = 0
+
+        self.current_slot = slot
+
+    def count(self, now: Optional[float] = None) -> int:
+        """窗口内的事件数"""
+        self._advance(time.monotonic() if now is None else now)
+        return self.total
+
+    def add(self, amount: int = 1, now: Optional[float] = None):
+        """记录事件"""
+        self._advance(time.monotonic() if now is None else now)
+        self.buckets[self.current_slot % self.bucket_count] += amount
+        self.total += amount
+
+    def allows(self, limit: int, amount: int = 1, now: Optional[float] = None) -> bool:
+        """再记录 amount 个事件后是否仍不超过限制"""
+        return self.count(now) + amount <= limit
+
+    def is_idle(self, now: Optional[float] = None) -> bool:
+        """窗口内没有任何事件"""
+        return self.count(now) == 0
+
+    def copy(self) -> 'SlidingWindowCounter':
+        """复制计数器（桶列表独立），副本可以在锁外导出"""
+        clone = SlidingWindowCounter.__new__(SlidingWindowCounter)
+        clone.window = self.window
+        clone.bucket_count = self.bucket_count
+        clone.bucket_width = self.bucket_width
+        clone.buckets = list(self.buckets)
+        clone.total = self.total
+        clone.current_slot = self.current_slot
+        return clone
+
+    def snapshot(self, now: Optional[float] = None) -> List[Tuple[float, int]]:
+        """导出窗口内的事件：[(距今秒数, 数量)]，从旧到新，与时钟无关，可跨进程恢复"""
+        now = time.monotonic() if now is None else now
+        self._advance(now)
+        entries = []
+        for slot in range(self.current_slot - self.bucket_count + 1, self.current_slot + 1):
+            amount = self.buckets[slot % self.bucket_count]
+            if amount:
+                entries.append((round(now - slot * self.bucket_width, 3), amount))
+        return entries
+
+    def restore(self, entries: List[Tuple[float, int]], now: Optional[float] = None):
+        """按 snapshot 的结果重新记录事件，已滑出窗口的丢弃"""
+        now = time.monotonic() if now is None else now
+        for age, amount in sorted(entries, key=lambda entry: -entry[0]):
+            if 0 <= age < self.window:
+                self.add(amount, now - age)
+
+
+class KeyedCounters:
+    """按用户/群管理的计数器集合
+
+    计数器按最近一次记录的先后顺序排列（LRU）：
+    - 记录时顺带清理窗口内已无事件的计数器，空闲的key不会一直占用内存
+    - key数量超过上限时淘汰最久未活动的key
+    只读查询不会创建计数器。
+    """
+
+    def __init__(self, window: float, bucket_count: int = 12, max_keys: int = 10000):
+        self.window = window
+        self.bucket_count = bucket_count
+        self.max_keys = max(1, max_keys)
+        self._counters = OrderedDict()
+        self.evicted_count = 0
+
+        # 单个key占用内存的估算值（64为key字符串的估算大小）
+        sample = SlidingWindowCounter(window, bucket_count)
+        self._bytes_per_key = sys.getsizeof(sample) + sys.getsizeof(sample.buckets) + 64
+
+    def allows(self, key: str, limit: int, amount: int = 1, now: Optional[float] = None) -> bool:
+        """该key再记录 amount 个事件后是否仍不超过限制"""
+        counter = self._counters.get(key)
+        if counter is None:
+            return amount <= limit
+        return counter.allows(limit, amount, now)
+
+    def count(self, key: str, now: Optional[float] = None) -> int:
+        """该key窗口内的事件数"""
+        counter = self._counters.get(key)
+        return counter.count(now) if counter is not None else 0
+
+    def add(self, key: str, amount: int = 1, now: Optional[float] = None):
+        """记录事件"""
+        now = time.monotonic() if now is None else now
+
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = SlidingWindowCounter(self.window, self.bucket_count)
+            self._counters[key] = counter
+        else:
+            self._counters.move_to_end(key)
+        counter.add(amount, now)
+
+        self.sweep(now)
+        while len(self._counters) > self.max_keys:
+            self._counters.popitem(last=False)
+            self.evicted_count += 1
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """清理空闲的key，返回清理数量
+
+        最前面的计数器最久没有新记录；一旦遇到仍有事件的计数器，后面的也一定仍有事件。
+        """
+        now = time.monotonic() if now is None else now
+        removed = 0
+        while self._counters:
+            key, counter = next(iter(self._counters.items()))
+            if not counter.is_idle(now):
+                break
+            self._counters.popitem(last=False)
+            removed += 1
+        return removed
+
+    def clear(self):
+        """清空所有计数器"""
+        self._counters.clear()
+
+    def copy(self) -> 'KeyedCounters':
+        """复制全部计数器，持锁时只做复制，导出可以在锁外进行"""
+        clone = KeyedCounters.__new__(KeyedCounters)
+        clone.__dict__.update(self.__dict__)
+        clone._counters = OrderedDict((key, counter.copy()) for key, counter in self._counters.items())
+        return clone
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, List[Tuple[float, int]]]:
+        """导出仍有事件的计数器，保持LRU顺序"""
+        now = time.monotonic() if now is None else now
+        result = {}
+        for key, counter in self._counters.items():
+            entries = counter.snapshot(now)
+            if entries:
+                result[key] = entries
+        return result
+
+    def restore(self, state: Dict[str, List[Tuple[float, int]]], now: Optional[float] = None):
+        """恢复 snapshot 导出的计数器（替换现有内容）"""
+        now = time.monotonic() if now is None else now
+        self._counters.clear()
+        for key, entries in state.items():
+            counter = SlidingWindowCounter(self.window, self.bucket_count)
+            counter.restore(entries, now)
+            if not counter.is_idle(now):
+                self._counters[key] = counter
+
+        while len(self._counters) > self.max_keys:
+            self._counters.popitem(last=False)
+
+    def memory_usage(self) -> int:
+        """估算占用内存(字节)，不遍历计数器，可在不加锁时调用"""
+        return sys.getsizeof(self._counters) + self._bytes_per_key * len(self._counters)
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._counters
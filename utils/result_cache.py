@@ -0,0 +1,84 @@
+"""
+搜索结果缓存 - 按查询缓存排序后的结果，数据重新加载（数据版本变化）后自动失效
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1000):
+        """初始化结果缓存（LRU）"""
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.version = 0  # 内容每次变化（写入、清空、切换数据版本）时加一，用于判断是否需要重新持久化
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, generation: int) -> Optional[List[Dict[str, Any]]]:
+        """取缓存结果，数据版本不一致时视为未命中"""
+        with self._lock:
+            if generation != self._generation:
+                self._reset(generation)
+
+            results = self._entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return results
+
+    def peek(self, key: str, generation: int) -> Optional[List[Dict[str, Any]]]:
+        """取缓存结果，不计入命中统计，也不调整LRU顺序"""
+        with self._lock:
+            if generation != self._generation:
+                return None
+            return self._entries.get(key)
+
+    def put(self, key: str, generation: int, results: List[Dict[str, Any]]):
+        """写入缓存"""
+        with self._lock:
+            if generation != self._generation:
+                self._reset(generation)
+
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            self.version += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _reset(self, generation: int):
+        """切换数据版本并清空缓存，调用方需持有锁"""
+        self._entries.clear()
+        self._generation = generation
+        self.version += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+
+    def items(self) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        """按最近使用顺序（旧到新）导出缓存内容"""
+        with self._lock:
+            return list(self._entries.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """获取命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'result_cache_entries': len(self._entries),
+                'result_cache_hits': self.hits,
+                'result_cache_misses': self.misses,
+                'result_cache_hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -2,11 +2,15 @@
 智能搜索引擎 - 提供高级搜索功能
 """
 import re
+import time
 import jieba
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from fuzzywuzzy import fuzz
 from utils.data_manager import DataManager
+from utils.text_normalizer import fold_text, normalize_text
+from utils.result_cache import ResultCache
+from utils.metrics import metrics
 
 class SearchEngine:
     def __init__(self, data_manager: DataManager):
@@ -14,14 +18,58 @@ class SearchEngine:
         self.data_manager = data_manager
         self.logger = logging.getLogger(__name__)
         
+        # 结果缓存（数据重新加载后自动失效）
+        cache_size = data_manager.config.get('search', {}).get('result_cache_size', 1000)
+        self.result_cache = ResultCache(cache_size)
+        
         # 预编译正则表达式
         self.year_pattern = re.compile(r'\d{4}年?')
         self.episode_pattern = re.compile(r'(\d+)集')
         
     def intelligent_search(self, query: str) -> List[Dict[str, Any]]:
         """智能搜索 - 综合多种搜索策略"""
-        query = self._preprocess_query(query)
-        
+        with metrics.timer('search_total'):
+            cache_key = self.get_cache_key(query)
+            if not cache_key:
+                return []
+            
+            generation = self.data_manager.generation
+            cached = self.result_cache.get(cache_key, generation)
+            if cached is not None:
+                return cached
+            
+            results = self._search(self._preprocess_query(query))
+            self.result_cache.put(cache_key, generation, results)
+            return results
+    
+    def warm_up(self, queries: List[str], deadline: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """预热结果缓存，已缓存的查询直接取缓存；返回各查询的结果，到 deadline（time.monotonic）时停止
+
+        不经过 intelligent_search，预热不计入缓存命中统计和搜索合计耗时。
+        """
+        generation = self.data_manager.generation
+        warmed = []
+        for query in queries:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            cache_key = self.get_cache_key(query)
+            if not cache_key:
+                continue
+            results = self.result_cache.peek(cache_key, generation)
+            if results is None:
+                results = self._search(self._preprocess_query(query))
+                self.result_cache.put(cache_key, generation, results)
+            warmed.append(results)
+        return warmed
+    
+    def get_cache_key(self, query: str) -> str:
+        """结果缓存的键：预处理中分词之前的形式，结果只取决于它"""
+        if not query:
+            return ""
+        return re.sub(r'\s+', ' ', fold_text(query).strip())
+    
+    def _search(self, query: str) -> List[Dict[str, Any]]:
+        """执行多策略搜索（不经过缓存）"""
         if not query:
             return []
         
@@ -52,21 +100,22 @@ class SearchEngine:
     
     def _preprocess_query(self, query: str) -> str:
         """预处理查询字符串"""
-        if not query:
-            return ""
-        
-        # 去除多余空格
-        query = re.sub(r'\s+', ' ', query.strip())
-        
-        # 去除常见的无意义词汇
-        stop_words = ['的', '了', '是', '在', '有', '和', '与', '或', '电视剧', '电影', '剧集']
-        words = jieba.cut(query)
-        filtered_words = [word for word in words if word not in stop_words and len(word) > 1]
-        
-        if filtered_words:
-            return ' '.join(filtered_words)
-        else:
-            return query
+        with metrics.timer('preprocess'):
+            if not query:
+                return ""
+            
+            # 统一为简体、半角、小写，并去除多余空格
+            query = self.get_cache_key(query)
+            
+            # 去除常见的无意义词汇
+            stop_words = ['的', '了', '是', '在', '有', '和', '与', '或', '电视剧', '电影', '剧集']
+            words = jieba.cut(query)
+            filtered_words = [word for word in words if word not in stop_words and len(word) > 1]
+            
+            if filtered_words:
+                return ' '.join(filtered_words)
+            else:
+                return query
     
     def _extract_search_info(self, query: str) -> List[str]:
         """从查询中提取关键信息"""
@@ -117,51 +166,56 @@ class SearchEngine:
     
     def _deduplicate_and_rank(self, results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
         """去重并按相关性排序"""
-        if not results:
-            return []
-        
-        # 去重 - 基于剧名
-        seen_dramas = set()
-        unique_results = []
-        
-        for result in results:
-            drama_name = result.get('drama_name', '')
-            if drama_name and drama_name not in seen_dramas:
-                seen_dramas.add(drama_name)
-                unique_results.append(result)
-        
-        # 计算相关性分数并排序
-        scored_results = []
-        for result in unique_results:
-            score = self._calculate_relevance_score(result, query)
-            scored_results.append((score, result))
-        
-        # 按分数降序排序
-        scored_results.sort(key=lambda x: x[0], reverse=True)
-        
-        return [result for score, result in scored_results]
+        with metrics.timer('ranking'):
+            if not results:
+                return []
+            
+            # 去重 - 基于剧名
+            seen_dramas = set()
+            unique_results = []
+            
+            for result in results:
+                drama_name = result.get('drama_name', '')
+                if drama_name and drama_name not in seen_dramas:
+                    seen_dramas.add(drama_name)
+                    unique_results.append(result)
+            
+            # 计算相关性分数并排序
+            scored_results = []
+            for result in unique_results:
+                score = self._calculate_relevance_score(result, query)
+                scored_results.append((score, result))
+            
+            # 按分数降序排序
+            scored_results.sort(key=lambda x: x[0], reverse=True)
+            
+            return [result for score, result in scored_results]
     
     def _calculate_relevance_score(self, result: Dict[str, Any], query: str) -> float:
         """计算相关性分数"""
         score = 0.0
         
-        drama_name = result.get('drama_name', '')
-        actors = result.get('actors', '')
+        # 统一使用规范形式比较，繁体、全角查询也能得到正确的分数
+        query = normalize_text(query)
+        drama_name = normalize_text(result.get('drama_name', ''))
+        actors = normalize_text(result.get('actors', ''))
+        if not query:
+            return score
         
         # 剧名匹配分数 (权重: 0.6)
         if drama_name:
-            drama_score = fuzz.partial_ratio(query.lower(), drama_name.lower()) / 100.0
+            drama_score = fuzz.partial_ratio(query, drama_name) / 100.0
             score += drama_score * 0.6
         
         # 演员匹配分数 (权重: 0.4)
         if actors:
-            actor_score = fuzz.partial_ratio(query.lower(), actors.lower()) / 100.0
+            actor_score = fuzz.partial_ratio(query, actors) / 100.0
             score += actor_score * 0.4
         
         # 完全匹配加分
-        if query.lower() in drama_name.lower():
+        if query in drama_name:
             score += 0.3
-        if query.lower() in actors.lower():
+        if query in actors:
             score += 0.2
         
         # 关键词匹配加分
@@ -212,15 +266,18 @@ class SearchEngine:
             return []
         
         suggestions = []
+        partial_query = normalize_text(partial_query)
+        if not partial_query:
+            return []
         
-        # 从剧名索引中获取建议
+        # 从剧名索引中获取建议（索引键均为规范形式）
         for drama_name in self.data_manager.drama_index.keys():
-            if partial_query.lower() in drama_name.lower():
+            if partial_query in drama_name:
                 suggestions.append(drama_name)
         
         # 从演员索引中获取建议
         for actor_name in self.data_manager.actor_index.keys():
-            if partial_query.lower() in actor_name.lower():
+            if partial_query in actor_name:
                 suggestions.append(actor_name)
         
         # 去重并限制数量
@@ -4,146 +4,304 @@
 import time
 import random
 import logging
-from typing import Dict, List, Optional, Tuple
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
-import yaml
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
 import threading
+import sys
+from utils.rate_limiter import SlidingWindowCounter, KeyedCounters
+from utils.config_service import get_config_service
+
+# 频率限制窗口(秒)
+MINUTE = 60
+HOUR = 3600
+
+# 群信息缓存默认有效期(秒)
+GROUP_INFO_TTL = 300
+
+# 频率限制拒绝原因：类型 -> 提示
+REJECT_REASONS = {
+    'global': "全局发送频率过高，请稍后再试",
+    'user': "您的请求过于频繁，请稍后再试",
+    'group': "群内查询过于频繁，请稍后再试",
+}
+_REJECT_KINDS = {reason: kind for kind, reason in REJECT_REASONS.items()}
+
+class Reservation:
+    """发送额度预留：准入时预留，发送时提交，未用完的额度释放"""
+    __slots__ = ('group_id', 'user_id', 'remaining', 'created_at')
+    
+    def __init__(self, group_id: str, user_id: str, amount: int, created_at: Optional[float] = None):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.remaining = amount
+        self.created_at = time.monotonic() if created_at is None else created_at
+
+class _Shard:
+    """一组用户/群的频率状态，由各自的锁保护"""
+    __slots__ = ('lock', 'group_counters', 'user_counters', 'pending_groups', 'pending_users')
+    
+    def __init__(self, max_keys: int):
+        self.lock = threading.Lock()
+        self.group_counters = KeyedCounters(MINUTE, max_keys=max_keys)  # 群的每分钟计数
+        self.user_counters = KeyedCounters(MINUTE, max_keys=max_keys)  # 用户的每分钟计数
+        self.pending_groups = {}  # 群已预留的额度
+        self.pending_users = {}  # 用户已预留的额度
 
 class SecurityManager:
     def __init__(self, config_path: str = "config.yaml"):
         """初始化安全管理器"""
-        self.config = self._load_config(config_path)
+        self.config_service = get_config_service(config_path)
         self.logger = logging.getLogger(__name__)
         
-        # 消息发送记录
-        self.message_history = defaultdict(deque)  # 每个群的消息历史
-        self.user_request_history = defaultdict(deque)  # 每个用户的请求历史
-        self.global_message_count = deque()  # 全局消息计数
+        # 用户/群的频率状态按key分片，每个分片一把锁（锁分段）
+        rate_limit_config = self._get_rate_limit_config()
+        shard_count = max(1, rate_limit_config.get('lock_shards', 16))
+        max_tracked_keys = rate_limit_config.get('max_tracked_keys', 10000)
+        keys_per_shard = max(1, -(-max_tracked_keys // shard_count))
+        self.shards = [_Shard(keys_per_shard) for _ in range(shard_count)]
+        
+        # 全局计数和预留记录，由独立的全局锁保护
+        self.global_lock = threading.Lock()
+        self.global_minute_counter = SlidingWindowCounter(MINUTE)  # 全局每分钟计数
+        self.global_hour_counter = SlidingWindowCounter(HOUR)  # 全局每小时计数
+        self.pending_global = 0  # 已预留但尚未发送的额度
+        self.rejected_counts = {kind: 0 for kind in REJECT_REASONS}  # 按类型统计的拒绝次数
+        self.reservations = OrderedDict()  # 按创建时间排列，超时未提交的预留会被回收
+        
+        # 群信息缓存：群ID -> (成员数, 更新时间)，按更新时间排列
+        self.group_info_lock = threading.Lock()
+        self.group_info_cache = OrderedDict()
+        group_check_config = self.config.get('security', {}).get('group_member_check', {})
+        self.max_cached_groups = group_check_config.get('max_cached_groups', 2000)
+        self.group_info_ttl = group_check_config.get('cache_ttl', GROUP_INFO_TTL)
+        self.default_member_count = group_check_config.get('default_member_count', 30)
+        
+        # 群信息缺失或过期时的回调（由后台刷新器登记刷新），不在发送路径上请求微信接口
+        self.group_refresh_callback = None
+        
+    @property
+    def config(self):
+        """当前配置（只读）"""
+        return self.config_service.snapshot.raw
+    
+    def should_respond(self, group_id: str, user_id: str, message: str) -> Tuple[bool, str]:
+        """判断是否应该响应消息（只检查，不预留额度）"""
+        with self._locked(group_id, user_id):
+            return self._check_rate_limits(group_id, user_id, 1, time.monotonic())
+    
+    def _shard(self, key: str) -> _Shard:
+        """key所在的分片"""
+        return self.shards[hash(key) % len(self.shards)]
+    
+    @contextmanager
+    def _shard_locks(self, *keys: str):
+        """按分片序号顺序获取相关分片锁，避免死锁"""
+        shards = [self.shards[i] for i in sorted({hash(key) % len(self.shards) for key in keys})]
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            yield
+        finally:
+            for shard in reversed(shards):
+                shard.lock.release()
+    
+    @contextmanager
+    def _locked(self, *keys: str):
+        """获取相关分片锁和全局锁（总是先分片锁、后全局锁）"""
+        with self._shard_locks(*keys):
+            with self.global_lock:
+                yield
+    
+    def _check_rate_limits(self, group_id: str, user_id: str, amount: int, current_time: float) -> Tuple[bool, str]:
+        """检查各项频率限制（已预留的额度视为已使用），调用方需持有相关锁"""
+        # 1. 检查全局频率限制
+        if not self._check_global_rate_limit(current_time, amount):
+            return False, REJECT_REASONS['global']
         
-        # 线程锁
-        self.lock = threading.Lock()
+        # 2. 检查用户请求频率
+        if not self._check_user_rate_limit(user_id, current_time, amount):
+            return False, REJECT_REASONS['user']
         
-        # 群信息缓存
-        self.group_info_cache = {}
-        self.cache_update_time = {}
+        # 3. 检查群消息频率
+        if not self._check_group_rate_limit(group_id, current_time, amount):
+            return False, REJECT_REASONS['group']
         
-    def _load_config(self, config_path: str) -> Dict:
-        """加载配置文件"""
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
-        except Exception as e:
-            self.logger.error(f"配置文件加载失败: {e}")
-            return {}
+        return True, ""
     
-    def should_respond(self, group_id: str, user_id: str, message: str) -> Tuple[bool, str]:
-        """判断是否应该响应消息"""
-        with self.lock:
-            current_time = datetime.now()
-            
-            # 1. 检查全局频率限制
-            if not self._check_global_rate_limit(current_time):
-                return False, "全局发送频率过高，请稍后再试"
-            
-            # 2. 检查用户请求频率
-            if not self._check_user_rate_limit(user_id, current_time):
-                return False, "您的请求过于频繁，请稍后再试"
-            
-            # 3. 检查群消息频率
-            if not self._check_group_rate_limit(group_id, current_time):
-                return False, "群内查询过于频繁，请稍后再试"
-            
-            return True, ""
+    def _get_rate_limit_config(self) -> Dict:
+        """获取频率限制配置"""
+        return self.config.get('security', {}).get('rate_limit', {})
     
-    def _check_global_rate_limit(self, current_time: datetime) -> bool:
+    def _check_global_rate_limit(self, current_time: float, amount: int = 1) -> bool:
         """检查全局频率限制"""
-        security_config = self.config.get('security', {})
-        rate_limit_config = security_config.get('rate_limit', {})
+        snapshot = self.config_service.snapshot
         
-        if not rate_limit_config.get('enabled', True):
+        if not snapshot.rate_limit_enabled:
             return True
         
-        max_per_minute = rate_limit_config.get('max_per_minute', 10)
-        max_per_hour = rate_limit_config.get('max_per_hour', 50)
-        
-        # 清理过期记录
-        minute_ago = current_time - timedelta(minutes=1)
-        hour_ago = current_time - timedelta(hours=1)
-        
-        while self.global_message_count and self.global_message_count[0] < hour_ago:
-            self.global_message_count.popleft()
+        max_per_minute = snapshot.max_per_minute
+        max_per_hour = snapshot.max_per_hour
+        amount += self.pending_global
         
         # 检查小时限制
-        if len(self.global_message_count) >= max_per_hour:
+        if not self.global_hour_counter.allows(max_per_hour, amount, current_time):
             return False
         
         # 检查分钟限制
-        recent_messages = [t for t in self.global_message_count if t > minute_ago]
-        if len(recent_messages) >= max_per_minute:
+        if not self.global_minute_counter.allows(max_per_minute, amount, current_time):
             return False
         
         return True
     
-    def _check_user_rate_limit(self, user_id: str, current_time: datetime) -> bool:
+    def _check_user_rate_limit(self, user_id: str, current_time: float, amount: int = 1) -> bool:
         """检查用户请求频率"""
-        # 用户每分钟最多3次请求
-        max_user_per_minute = 3
-        minute_ago = current_time - timedelta(minutes=1)
-        
-        user_history = self.user_request_history[user_id]
+        # 用户每分钟最多请求次数（默认3次）
+        max_user_per_minute = self.config_service.snapshot.per_user_per_minute
+        shard = self._shard(user_id)
+        amount += shard.pending_users.get(user_id, 0)
         
-        # 清理过期记录
-        while user_history and user_history[0] < minute_ago:
-            user_history.popleft()
-        
-        if len(user_history) >= max_user_per_minute:
-            return False
-        
-        return True
+        return shard.user_counters.allows(user_id, max_user_per_minute, amount, current_time)
     
-    def _check_group_rate_limit(self, group_id: str, current_time: datetime) -> bool:
+    def _check_group_rate_limit(self, group_id: str, current_time: float, amount: int = 1) -> bool:
         """检查群消息频率"""
-        # 每个群每分钟最多5次响应
-        max_group_per_minute = 5
-        minute_ago = current_time - timedelta(minutes=1)
-        
-        group_history = self.message_history[group_id]
-        
-        # 清理过期记录
-        while group_history and group_history[0] < minute_ago:
-            group_history.popleft()
+        # 每个群每分钟最多响应次数（默认5次）
+        max_group_per_minute = self.config_service.snapshot.per_group_per_minute
+        shard = self._shard(group_id)
+        amount += shard.pending_groups.get(group_id, 0)
         
-        if len(group_history) >= max_group_per_minute:
-            return False
-        
-        return True
+        return shard.group_counters.allows(group_id, max_group_per_minute, amount, current_time)
     
-    def record_message_sent(self, group_id: str, user_id: str):
-        """记录消息发送"""
-        with self.lock:
-            current_time = datetime.now()
+    def reserve(self, group_id: str, user_id: str, amount: int = 1,
+                now: Optional[float] = None) -> Tuple[Optional[Reservation], str]:
+        """原子地检查频率限制并预留 amount 条消息的发送额度（now 为 time.monotonic() 时间，用于模拟时钟）"""
+        self._expire_reservations(time.monotonic() if now is None else now)
+        
+        with self._locked(group_id, user_id):
+            current_time = time.monotonic() if now is None else now
+            can_respond, reason = self._check_rate_limits(group_id, user_id, amount, current_time)
+            if not can_respond:
+                self.rejected_counts[_REJECT_KINDS[reason]] += 1
+                return None, reason
             
-            # 记录全局消息
-            self.global_message_count.append(current_time)
+            reservation = Reservation(group_id, user_id, amount, current_time)
+            self._add_pending(reservation, amount)
+            self.reservations[reservation] = None
+            return reservation, ""
+    
+    def resize_reservation(self, reservation: Reservation, amount: int, now: Optional[float] = None) -> int:
+        """按实际消息条数调整预留：多余的释放，不足的在额度允许的范围内补充
+
+        返回调整后的预留条数，可能少于 amount（额度不足）或为0（预留已超时回收），调用方只能发送这么多条。
+        """
+        with self._locked(reservation.group_id, reservation.user_id):
+            if reservation not in self.reservations:
+                return 0
             
-            # 记录群消息
-            self.message_history[group_id].append(current_time)
+            delta = amount - reservation.remaining
+            current_time = time.monotonic() if now is None else now
+            while delta > 0 and not self._check_rate_limits(reservation.group_id, reservation.user_id,
+                                                            delta, current_time)[0]:
+                delta -= 1
             
-            # 记录用户请求
-            self.user_request_history[user_id].append(current_time)
+            self._add_pending(reservation, delta)
+            reservation.remaining += delta
+            if reservation.remaining <= 0:
+                del self.reservations[reservation]
+            return reservation.remaining
+    
+    def commit(self, reservation: Optional[Reservation], group_id: str, user_id: str, now: Optional[float] = None):
+        """记录一条已发送的消息，并消耗一份预留额度"""
+        keys = (group_id, user_id)
+        if reservation is not None:
+            keys += (reservation.group_id, reservation.user_id)
+        
+        with self._locked(*keys):
+            if reservation is not None and reservation.remaining > 0 and reservation in self.reservations:
+                self._add_pending(reservation, -1)
+                reservation.remaining -= 1
+                if reservation.remaining == 0:
+                    del self.reservations[reservation]
+            
+            self._record(group_id, user_id, time.monotonic() if now is None else now)
+    
+    def release(self, reservation: Optional[Reservation], amount: Optional[int] = None):
+        """释放未使用的预留额度，amount 为空时全部释放"""
+        if reservation is None:
+            return
+        
+        with self._locked(reservation.group_id, reservation.user_id):
+            if reservation in self.reservations:
+                amount = reservation.remaining if amount is None else min(amount, reservation.remaining)
+                self._add_pending(reservation, -amount)
+                reservation.remaining -= amount
+                if reservation.remaining <= 0:
+                    del self.reservations[reservation]
+    
+    def _add_pending(self, reservation: Reservation, amount: int):
+        """调整预留计数，调用方需持有相关分片锁和全局锁"""
+        self.pending_global += amount
+        self._add_shard_pending(reservation, amount)
+    
+    def _add_shard_pending(self, reservation: Reservation, amount: int):
+        """调整分片中的预留计数，调用方需持有相关分片锁"""
+        for pending, key in ((self._shard(reservation.group_id).pending_groups, reservation.group_id),
+                             (self._shard(reservation.user_id).pending_users, reservation.user_id)):
+            value = pending.get(key, 0) + amount
+            if value > 0:
+                pending[key] = value
+            else:
+                pending.pop(key, None)
+    
+    def _expire_reservations(self, current_time: float):
+        """回收超时未提交的预留"""
+        ttl = self.config_service.snapshot.reservation_ttl
+        expired = []
+        
+        # 先在全局锁内摘除，再逐个获取分片锁修正分片计数，保持加锁顺序一致
+        with self.global_lock:
+            while self.reservations:
+                reservation = next(iter(self.reservations))
+                if current_time - reservation.created_at < ttl:
+                    break
+                del self.reservations[reservation]
+                self.pending_global -= reservation.remaining
+                expired.append((reservation, reservation.remaining))
+                reservation.remaining = 0
+        
+        for reservation, remaining in expired:
+            with self._shard_locks(reservation.group_id, reservation.user_id):
+                self._add_shard_pending(reservation, -remaining)
+            self.logger.warning("预留额度超时未使用，已回收")
+    
+    def record_message_sent(self, group_id: str, user_id: str):
+        """记录消息发送（不关联预留）"""
+        with self._locked(group_id, user_id):
+            self._record(group_id, user_id, time.monotonic())
+    
+    def _record(self, group_id: str, user_id: str, current_time: float):
+        """记录一条发送，调用方需持有相关锁"""
+        # 记录全局消息
+        self.global_minute_counter.add(now=current_time)
+        self.global_hour_counter.add(now=current_time)
+        
+        # 记录群消息
+        self._shard(group_id).group_counters.add(group_id, now=current_time)
+        
+        # 记录用户请求
+        self._shard(user_id).user_counters.add(user_id, now=current_time)
     
     def calculate_send_delay(self, group_id: str, message_count: int = 1) -> float:
         """计算发送延迟时间"""
-        security_config = self.config.get('security', {})
-        delay_config = security_config.get('delay_send', {})
+        snapshot = self.config_service.snapshot
         
-        if not delay_config.get('enabled', True):
+        if not snapshot.delay_enabled:
             return 0
         
-        base_delay = delay_config.get('base_delay', 2)
-        random_delay = delay_config.get('random_delay', 3)
-        group_extra_delay = delay_config.get('group_extra_delay', 5)
+        base_delay = snapshot.base_delay
+        random_delay = snapshot.random_delay
+        group_extra_delay = snapshot.group_extra_delay
         
         # 基础延迟
         total_delay = base_delay
@@ -153,7 +311,7 @@ class SecurityManager:
         
         # 根据群人数调整延迟
         group_member_count = self._get_group_member_count(group_id)
-        group_threshold = security_config.get('group_member_check', {}).get('threshold', 20)
+        group_threshold = snapshot.group_threshold
         
         if group_member_count > group_threshold:
             total_delay += group_extra_delay
@@ -168,68 +326,193 @@ class SecurityManager:
         return total_delay
     
     def _get_group_member_count(self, group_id: str) -> int:
-        """获取群成员数量（带缓存）"""
+        """获取群成员数量（读缓存，缺失或过期时登记后台刷新）"""
+        # 私聊不是群，没有群人数带来的额外延迟
+        if not group_id.startswith('@@'):
+            return 1
+        
         current_time = time.time()
         
-        # 检查缓存是否有效（5分钟有效期）
-        if (group_id in self.group_info_cache and 
-            group_id in self.cache_update_time and 
-            current_time - self.cache_update_time[group_id] < 300):
-            return self.group_info_cache[group_id]
+        with self.group_info_lock:
+            cached = self.group_info_cache.get(group_id)
         
-        # 这里应该调用微信API获取群成员数量
-        # 暂时返回默认值，实际使用时需要集成微信API
-        member_count = 30  # 默认值
+        if cached and current_time - cached[1] < self.group_info_ttl:
+            return cached[0]
         
-        # 更新缓存
-        self.group_info_cache[group_id] = member_count
-        self.cache_update_time[group_id] = current_time
+        if self.group_refresh_callback:
+            self.group_refresh_callback(group_id)
         
-        return member_count
+        # 刷新完成前先用上次的数量，没有记录时用默认值
+        return cached[0] if cached else self.default_member_count
+    
+    def _cache_group_info(self, group_id: str, member_count: int, current_time: float):
+        """写入群信息缓存，清理过期项并限制缓存数量，调用方需持有 group_info_lock"""
+        self.group_info_cache[group_id] = (member_count, current_time)
+        self.group_info_cache.move_to_end(group_id)
+        
+        while self.group_info_cache:
+            oldest_id, (_, update_time) = next(iter(self.group_info_cache.items()))
+            if (len(self.group_info_cache) <= self.max_cached_groups and
+                    current_time - update_time < self.group_info_ttl):
+                break
+            self.group_info_cache.popitem(last=False)
     
     def update_group_member_count(self, group_id: str, member_count: int):
         """更新群成员数量"""
-        with self.lock:
-            self.group_info_cache[group_id] = member_count
-            self.cache_update_time[group_id] = time.time()
+        with self.group_info_lock:
+            self._cache_group_info(group_id, member_count, time.time())
     
-    def is_safe_time_to_send(self) -> bool:
+    def is_safe_time_to_send(self, now: Optional[datetime] = None) -> bool:
         """判断当前是否是安全的发送时间"""
-        current_hour = datetime.now().hour
-        
-        # 避免在深夜时间发送消息（23:00-7:00）
-        if current_hour >= 23 or current_hour < 7:
-            return False
-        
-        return True
+        snapshot = self.config_service.snapshot
+        if not snapshot.quiet_hours_enabled:
+            return True
+
+        current_hour = (now or datetime.now()).hour
+        start = snapshot.quiet_start
+        end = snapshot.quiet_end
+
+        # 避免在深夜时间发送消息（默认23:00-7:00，支持跨零点）
+        if start <= end:
+            return not (start <= current_hour < end)
+        return not (current_hour >= start or current_hour < end)
     
     def get_security_status(self) -> Dict:
-        """获取安全状态信息"""
-        with self.lock:
-            current_time = datetime.now()
-            minute_ago = current_time - timedelta(minutes=1)
-            hour_ago = current_time - timedelta(hours=1)
-            
-            # 统计最近的消息数量
-            recent_global_messages = len([t for t in self.global_message_count if t > minute_ago])
-            hourly_global_messages = len([t for t in self.global_message_count if t > hour_ago])
-            
-            return {
-                'recent_messages_per_minute': recent_global_messages,
-                'recent_messages_per_hour': hourly_global_messages,
-                'active_groups': len(self.message_history),
-                'active_users': len(self.user_request_history),
-                'is_safe_time': self.is_safe_time_to_send(),
-                'cached_groups': len(self.group_info_cache)
-            }
+        """获取安全状态信息
+
+        只在全局锁内读取O(1)的全局计数，分片状态不加锁读取长度和估算值，不会阻塞准入。
+        """
+        with self.global_lock:
+            current_time = time.monotonic()
+            recent_per_minute = self.global_minute_counter.count(current_time)
+            recent_per_hour = self.global_hour_counter.count(current_time)
+            pending_reservations = len(self.reservations)
+            reserved_messages = self.pending_global
+            rejected_counts = dict(self.rejected_counts)
+        
+        # 群信息缓存每项（群ID字符串 + 元组）按120字节估算
+        memory_usage = {
+            'group_counters': sum(shard.group_counters.memory_usage() for shard in self.shards),
+            'user_counters': sum(shard.user_counters.memory_usage() for shard in self.shards),
+            'group_info_cache': sys.getsizeof(self.group_info_cache) + 120 * len(self.group_info_cache),
+        }
+        
+        return {
+            'recent_messages_per_minute': recent_per_minute,
+            'recent_messages_per_hour': recent_per_hour,
+            'active_groups': sum(len(shard.group_counters) for shard in self.shards),
+            'active_users': sum(len(shard.user_counters) for shard in self.shards),
+            'evicted_keys': sum(shard.group_counters.evicted_count + shard.user_counters.evicted_count
+                                for shard in self.shards),
+            'pending_reservations': pending_reservations,
+            'reserved_messages': reserved_messages,
+            'rejected_counts': rejected_counts,
+            'is_safe_time': self.is_safe_time_to_send(),
+            'cached_groups': len(self.group_info_cache),
+            'memory_usage': memory_usage,
+            'memory_usage_total': sum(memory_usage.values())
+        }
+    
+    @contextmanager
+    def _all_locked(self):
+        """获取全部分片锁和全局锁"""
+        for shard in self.shards:
+            shard.lock.acquire()
+        try:
+            with self.global_lock:
+                yield
+        finally:
+            for shard in reversed(self.shards):
+                shard.lock.release()
     
     def reset_rate_limits(self):
         """重置频率限制（用于测试或紧急情况）"""
-        with self.lock:
-            self.message_history.clear()
-            self.user_request_history.clear()
-            self.global_message_count.clear()
-            self.logger.info("频率限制已重置")
+        with self._all_locked():
+            for shard in self.shards:
+                shard.group_counters.clear()
+                shard.user_counters.clear()
+                shard.pending_groups.clear()
+                shard.pending_users.clear()
+            self.global_minute_counter = SlidingWindowCounter(MINUTE)
+            self.global_hour_counter = SlidingWindowCounter(HOUR)
+            self.pending_global = 0
+            self.reservations.clear()
+        self.logger.info("频率限制已重置")
+    
+    def export_state(self) -> Dict:
+        """导出频率窗口和群信息缓存，用于重启后恢复
+
+        计数以距今秒数表示，群信息使用墙上时间，与进程无关。预留额度属于进行中的回复，不导出。
+        每个分片只在自己的锁内复制计数器，转换在锁外进行，不会同时阻塞所有分片的准入判断。
+        """
+        copies = []
+        for shard in self.shards:
+            with shard.lock:
+                copies.append((shard.group_counters.copy(), shard.user_counters.copy()))
+        with self.global_lock:
+            global_minute = self.global_minute_counter.copy()
+            global_hour = self.global_hour_counter.copy()
+        
+        current_time = time.monotonic()
+        state = {
+            'global_minute': global_minute.snapshot(current_time),
+            'global_hour': global_hour.snapshot(current_time),
+            'groups': {},
+            'users': {},
+        }
+        for group_counters, user_counters in copies:
+            state['groups'].update(group_counters.snapshot(current_time))
+            state['users'].update(user_counters.snapshot(current_time))
+        
+        with self.group_info_lock:
+            state['group_info'] = [[group_id, member_count, update_time]
+                                   for group_id, (member_count, update_time) in self.group_info_cache.items()]
+        return state
+    
+    def restore_state(self, state: Dict, elapsed: float = 0.0) -> int:
+        """恢复 export_state 导出的状态，elapsed 为导出至今经过的秒数，返回恢复的计数key数量
+
+        字符串hash每个进程不同，按当前进程的分片重新分配key。
+        """
+        def shift(entries):
+            return [(age + elapsed, amount) for age, amount in entries]
+        
+        def by_shard(counters):
+            shard_states = [{} for _ in self.shards]
+            for key, entries in counters.items():
+                shard_states[hash(key) % len(self.shards)][key] = shift(entries)
+            return shard_states
+        
+        group_states = by_shard(state.get('groups', {}))
+        user_states = by_shard(state.get('users', {}))
+        
+        with self._all_locked():
+            current_time = time.monotonic()
+            self.global_minute_counter = SlidingWindowCounter(MINUTE)
+            self.global_minute_counter.restore(shift(state.get('global_minute', [])), current_time)
+            self.global_hour_counter = SlidingWindowCounter(HOUR)
+            self.global_hour_counter.restore(shift(state.get('global_hour', [])), current_time)
+            for shard, group_state, user_state in zip(self.shards, group_states, user_states):
+                shard.group_counters.restore(group_state, current_time)
+                shard.user_counters.restore(user_state, current_time)
+            restored_keys = sum(len(shard.group_counters) + len(shard.user_counters) for shard in self.shards)
+        
+        with self.group_info_lock:
+            for group_id, member_count, update_time in state.get('group_info', []):
+                self._cache_group_info(group_id, member_count, update_time)
+        
+        return restored_keys
+    
+    def is_admin(self, contact: Optional[Dict[str, Any]]) -> bool:
+        """私聊联系人是否为管理员（security.admin_users 中的备注名或微信号）
+
+        只认机器人账号给好友设置的备注名（RemarkName）和不可重复的微信号（Alias）：
+        昵称任何人都能改成管理员的昵称，UserName 每次登录都会变化。群聊中没有联系人信息，不是管理员。
+        """
+        admin_users = self.config_service.snapshot.admin_users
+        if not admin_users or not contact:
+            return False
+        return any(contact.get(field) in admin_users for field in ('RemarkName', 'Alias') if contact.get(field))
     
     def add_whitelist_user(self, user_id: str):
         """添加白名单用户（暂时实现，可扩展）"""
@@ -238,16 +521,14 @@ class SecurityManager:
     
     def is_message_safe(self, message: str) -> bool:
         """检查消息内容是否安全"""
-        # 检查敏感词
-        sensitive_words = ['广告', '推广', '加群', '微商', '代理']
-        message_lower = message.lower()
+        snapshot = self.config_service.snapshot
         
-        for word in sensitive_words:
-            if word in message_lower:
-                return False
+        # 检查敏感词（数据中的剧名、演员在加载时已筛查，这里主要拦截动态文本）
+        if snapshot.word_matcher.find(message.lower()):
+            return False
         
-        # 检查消息长度
-        if len(message) > 2000:  # 消息过长可能有风险
+        # 检查消息长度（消息过长可能有风险）
+        if len(message) > snapshot.max_message_length:
             return False
         
         return True
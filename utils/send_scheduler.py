@@ -0,0 +1,183 @@
+"""
+发送调度器 - 用一个定时堆和固定数量的发送线程代替每条回复一个睡眠线程
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+from utils.metrics import metrics
+
+
+class SendScheduler:
+    def __init__(self, send_func: Callable[[str, str, str, Any], None],
+                 worker_count: int = 3, max_pending: int = 1000):
+        """初始化发送调度器
+
+        send_func(message, to_user, actual_user, context) 在发送线程中被调用，
+        context 为 schedule_at() 时传入的附加对象（如发送额度预留）。
+        send_func 在排队时的 contextvars 上下文中执行，请求追踪等上下文信息随消息一起传到发送线程。
+        """
+        self.send_func = send_func
+        self.worker_count = max(1, worker_count)
+        self.max_pending = max_pending
+        self.logger = logging.getLogger(__name__)
+
+        # 待发送消息堆：(到期时间, 序号, 会话, 实际用户, 消息, 附加对象, 排队时刻, 排队时的上下文)
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+        # 每个会话最后一条待发送消息的到期时间，保证同一会话的回复不交错
+        self._conversation_tail = {}
+
+        # 同一会话总是分配给同一个发送线程，从而保持会话内顺序
+        self._worker_queues = [queue.Queue() for _ in range(self.worker_count)]
+        self._threads = []
+        self._running = False
+
+        # 统计信息
+        self._recent_lags = deque(maxlen=100)
+        self._sent_count = 0
+        self._dropped_count = 0
+
+    def start(self):
+        """启动调度线程和发送线程"""
+        if self._running:
+            return
+
+        self._running = True
+        dispatcher = threading.Thread(target=self._dispatch_loop, name="send-dispatcher", daemon=True)
+        self._threads = [dispatcher]
+        for i in range(self.worker_count):
+            self._threads.append(threading.Thread(
+                target=self._worker_loop, args=(self._worker_queues[i],),
+                name=f"send-worker-{i}", daemon=True
+            ))
+
+        for thread in self._threads:
+            thread.start()
+
+        self.logger.info(f"发送调度器已启动，发送线程数: {self.worker_count}")
+
+    def stop(self, timeout: float = 5.0):
+        """停止调度器，未到期的消息将被丢弃"""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            discarded = len(self._heap)
+            self._heap.clear()
+            self._conversation_tail.clear()
+            self._condition.notify_all()
+
+        for worker_queue in self._worker_queues:
+            worker_queue.put(None)
+
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+        if discarded:
+            self.logger.warning(f"发送调度器停止，丢弃 {discarded} 条未发送消息")
+
+    def schedule_at(self, conversation: str, actual_user: str, messages: List[str], due_times: List[float],
+                    context: Any = None) -> bool:
+        """按给定的发送时刻（time.monotonic() 时间）安排一组消息"""
+        if not messages:
+            return True
+
+        with self._condition:
+            if not self._running:
+                return False
+            enqueued_at = time.monotonic()
+
+            if len(self._heap) + len(messages) > self.max_pending:
+                self._dropped_count += len(messages)
+                self.logger.warning("发送队列已满，丢弃 %d 条消息", len(messages))
+                return False
+
+            # 保证同一会话的消息按顺序发送，不早于该会话已排队的最后一条
+            tail = self._conversation_tail.get(conversation, 0.0)
+            for message, due_time in zip(messages, due_times):
+                tail = max(tail, due_time)
+                # 每条消息一份上下文副本，同一个上下文不能在两个线程中同时进入
+                heapq.heappush(self._heap, (tail, next(self._sequence), conversation, actual_user, message, context,
+                                            enqueued_at, contextvars.copy_context()))
+
+            self._conversation_tail[conversation] = tail
+            self._condition.notify()
+
+        return True
+
+    def _dispatch_loop(self):
+        """把到期的消息分发给发送线程"""
+        while True:
+            with self._condition:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+
+                if not self._running:
+                    return
+
+                now = time.monotonic()
+                due_items = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_items.append(heapq.heappop(self._heap))
+
+                # 清理已经全部到期的会话
+                for item in due_items:
+                    conversation = item[2]
+                    if self._conversation_tail.get(conversation, 0) <= now:
+                        self._conversation_tail.pop(conversation, None)
+
+            for item in due_items:
+                worker_index = hash(item[2]) % self.worker_count
+                self._worker_queues[worker_index].put(item)
+
+    def _worker_loop(self, worker_queue: queue.Queue):
+        """发送线程：按到达顺序发送消息"""
+        while True:
+            item = worker_queue.get()
+            if item is None or not self._running:
+                return
+
+            caller_context = item[-1]
+            caller_context.run(self._send, *item[:-1])
+
+    def _send(self, due_time: float, sequence: int, conversation: str, actual_user: str, message: str,
+              context: Any, enqueued_at: float):
+        """发送一条消息（在排队时的上下文中执行）
+
+        send_queue_wait 为从排队到开始发送的时长（含节奏调度的等待），lag 统计为超过预定时刻的延迟。
+        """
+        now = time.monotonic()
+        self._recent_lags.append(now - due_time)
+        metrics.observe('send_queue_wait', now - enqueued_at)
+
+        try:
+            self.send_func(message, conversation, actual_user, context)
+            self._sent_count += 1
+        except Exception as e:
+            self.logger.error(f"调度发送消息出错: {e}")
+
+    def get_stats(self) -> Dict:
+        """获取队列深度和延迟统计"""
+        with self._condition:
+            pending = len(self._heap)
+
+        lags = list(self._recent_lags)
+        return {
+            'pending_messages': pending,
+            'queued_messages': sum(q.qsize() for q in self._worker_queues),
+            'lag_avg': sum(lags) / len(lags) if lags else 0.0,
+            'lag_max': max(lags) if lags else 0.0,
+            'sent_messages': self._sent_count,
+            'dropped_messages': self._dropped_count
+        }
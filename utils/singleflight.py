@@ -0,0 +1,55 @@
+"""
+重复请求合并 - 同一会话在时间窗口内的相同查询只执行一次搜索、只回复一次
+"""
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class SingleFlight:
+    def __init__(self, window: float = 10.0):
+        """初始化
+
+        所有方法都应在同一线程（流水线的事件循环线程）中调用，因此不需要加锁。
+        """
+        self.window = window
+        # key -> [最近开始或完成时间, 是否正在执行]，按时间先后排列
+        self._entries = OrderedDict()
+        self.coalesced_count = 0
+
+    def acquire(self, key: Hashable) -> bool:
+        """尝试成为该查询的执行者；返回False表示请求已被合并"""
+        now = time.monotonic()
+        self._sweep(now)
+
+        entry = self._entries.get(key)
+        if entry and (entry[1] or now - entry[0] < self.window):
+            self.coalesced_count += 1
+            return False
+
+        self._entries[key] = [now, True]
+        self._entries.move_to_end(key)
+        return True
+
+    def release(self, key: Hashable):
+        """查询执行完成，窗口从完成时刻开始计算"""
+        entry = self._entries.get(key)
+        if entry:
+            entry[0] = time.monotonic()
+            entry[1] = False
+            self._entries.move_to_end(key)
+
+    def forget(self, key: Hashable):
+        """放弃该查询（例如未通过安全检查），后续相同查询不会被合并"""
+        self._entries.pop(key, None)
+
+    def _sweep(self, now: float):
+        """清理已过期的记录"""
+        while self._entries:
+            key, (timestamp, in_flight) = next(iter(self._entries.items()))
+            if in_flight or now - timestamp < self.window:
+                break
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
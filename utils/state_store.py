@@ -0,0 +1,124 @@
+"""
+运行状态持久化 - 定期把频率窗口、结果缓存等状态快照到本地SQLite文件，重启后恢复
+
+收集函数可以为分区给出版本，版本与上次成功保存时相同的分区由调用方省略，不再重新序列化和写入。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class StateStore:
+    def __init__(self, db_file: str = "data/state.db"):
+        """初始化状态存储"""
+        self.db_file = db_file
+        self.logger = logging.getLogger(__name__)
+
+        self._collect_func = None
+        self._interval = 60
+        self._write_lock = threading.Lock()
+        self._saved_versions: Dict[str, Any] = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库（每次调用新建连接，可在任意线程使用）"""
+        directory = os.path.dirname(self.db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_file, timeout=5)
+        conn.execute("CREATE TABLE IF NOT EXISTS state (section TEXT PRIMARY KEY, value TEXT, saved_at REAL)")
+        return conn
+
+    def is_saved(self, name: str, version: Any) -> bool:
+        """分区的该版本是否已经保存过"""
+        return name in self._saved_versions and self._saved_versions[name] == version
+
+    def save(self, sections: Dict[str, Any], versions: Optional[Dict[str, Any]] = None) -> bool:
+        """在一个事务中写入给出的分区（未给出的分区保留原内容），成功后记录 versions 中的分区版本"""
+        saved_at = time.time()
+        rows = [(name, json.dumps(value, ensure_ascii=False, separators=(',', ':')), saved_at)
+                for name, value in sections.items()]
+
+        try:
+            with self._write_lock:
+                conn = self._connect()
+                try:
+                    with conn:
+                        conn.executemany("INSERT OR REPLACE INTO state VALUES (?, ?, ?)", rows)
+                finally:
+                    conn.close()
+                self._saved_versions.update(versions or {})
+            return True
+        except Exception as e:
+            self.logger.error(f"保存运行状态失败: {e}")
+            return False
+
+    def load(self) -> Tuple[Dict[str, Any], Optional[float]]:
+        """读取全部分区，返回 (分区内容, 最近一次快照的保存时间)；没有快照时返回 ({}, None)
+
+        未变化的分区不会随每次快照重写，保存时间取各分区中最新的（频率窗口等按时间平移的分区每次都会写入）。
+        """
+        if not os.path.exists(self.db_file):
+            return {}, None
+
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute("SELECT section, value, saved_at FROM state").fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            self.logger.error(f"读取运行状态失败: {e}")
+            return {}, None
+
+        sections = {}
+        saved_at = None
+        for name, value, section_saved_at in rows:
+            try:
+                sections[name] = json.loads(value)
+                saved_at = max(saved_at, section_saved_at) if saved_at else section_saved_at
+            except ValueError as e:
+                self.logger.error(f"运行状态分区 {name} 已损坏: {e}")
+        return sections, saved_at
+
+    def start(self, collect_func: Callable[[], Tuple[Dict[str, Any], Dict[str, Any]]], interval: float = 60):
+        """启动定期快照线程，collect_func 返回 (要保存的分区, 分区版本)"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._collect_func = collect_func
+        self._interval = max(1, interval)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="state-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止快照线程并保存最后一次快照"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+        self.snapshot()
+
+    def snapshot(self) -> bool:
+        """立即保存一次快照"""
+        if not self._collect_func:
+            return False
+
+        try:
+            sections, versions = self._collect_func()
+        except Exception as e:
+            self.logger.error(f"收集运行状态失败: {e}")
+            return False
+        return self.save(sections, versions)
+
+    def _run(self):
+        """定期保存快照"""
+        while not self._stopped.wait(self._interval):
+            self.snapshot()
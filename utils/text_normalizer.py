@@ -0,0 +1,45 @@
+"""
+文本归一化 - 繁简转换、全角转半角、大小写和标点处理
+"""
+import unicodedata
+from functools import lru_cache
+
+from utils.t2s_table import TRADITIONAL, SIMPLIFIED
+
+# 繁体/异体字 -> 简体字 转换表
+_T2S_TABLE = str.maketrans(TRADITIONAL, SIMPLIFIED)
+
+# 归一化结果缓存大小
+NORMALIZE_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def fold_text(text: str) -> str:
+    """转为简体、半角、小写形式（保留空格和标点）"""
+    if not text:
+        return ""
+
+    # NFKC 会把全角字母、数字和符号转为半角
+    text = unicodedata.normalize('NFKC', text)
+    return text.translate(_T2S_TABLE).lower()
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(text: str) -> str:
+    """转为规范形式：简体、半角、小写，并去除标点、符号和空白"""
+    folded = fold_text(text)
+    if not folded:
+        return ""
+
+    # 只保留文字和数字（Unicode 类别 L*/N*）
+    return ''.join(char for char in folded if unicodedata.category(char)[0] in 'LN')
+
+
+def get_cache_info() -> dict:
+    """获取归一化缓存统计"""
+    info = normalize_text.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize
+    }
@@ -0,0 +1,174 @@
+"""
+请求追踪 - 为每个请求生成追踪ID，记录各阶段耗时，写入 JSON Lines 追踪文件
+
+当前请求的追踪对象保存在 contextvars 中：同一线程内自动可见，流水线各阶段和线程池调用显式设置或
+复制上下文，发送调度器在排队时复制上下文，因此发送线程中的日志和耗时也归属同一个请求。
+metrics 记录的每个阶段耗时同时作为一个 span 记入当前追踪。
+
+追踪文件每行一个请求：
+  {"id": "...", "ts": 开始时间, "conv": 会话, "query": 查询, "outcome": 结果, "total_ms": 总耗时,
+   "spans": [[阶段, 相对开始的毫秒, 耗时毫秒], ...]}
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# 未结束的追踪
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar('current_trace', default=None)
+
+
+class Trace:
+    __slots__ = ('trace_id', 'started_at', 'start', 'conversation', 'query', 'spans',
+                 'pending_messages', 'finished', 'tracer', '_lock')
+
+    def __init__(self, tracer: "Tracer", conversation: str):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.conversation = conversation
+        self.query = ""
+        self.spans: List[List[Any]] = []
+        self.pending_messages = 0
+        self.finished = False
+        self.tracer = tracer
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float, end: Optional[float] = None):
+        """记录一个已结束的阶段，end 为 perf_counter 时刻，默认为现在"""
+        end = time.perf_counter() if end is None else end
+        with self._lock:
+            self.spans.append([name, round((end - seconds - self.start) * 1000, 3), round(seconds * 1000, 3)])
+
+    def expect_messages(self, count: int):
+        """回复需要发送的消息条数，全部发送后追踪结束"""
+        with self._lock:
+            self.pending_messages += count
+
+    def message_sent(self):
+        """一条消息已发送（或放弃发送）"""
+        with self._lock:
+            self.pending_messages -= 1
+            done = self.pending_messages <= 0
+        if done:
+            self.finish('sent')
+
+    def finish(self, outcome: str):
+        """结束追踪并写入文件（只写一次）"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            record = {
+                'id': self.trace_id,
+                'ts': round(self.started_at, 3),
+                'conv': self.conversation[:16],
+                'query': self.query,
+                'outcome': outcome,
+                'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+                'spans': self.spans
+            }
+        self.tracer.write(record)
+
+
+class Tracer:
+    def __init__(self, trace_file: str = 'logs/traces.jsonl', sample_rate: float = 1.0,
+                 max_size: int = 50 * 1024 * 1024, enabled: bool = True):
+        """初始化追踪器"""
+        self.trace_file = trace_file
+        self.sample_rate = sample_rate
+        self.max_size = max_size
+        self.enabled = enabled
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self.written_count = 0
+
+    def begin(self, conversation: str) -> Optional[Trace]:
+        """开始一个请求的追踪，未启用或未被抽样时返回None"""
+        if not self.enabled or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        return Trace(self, conversation)
+
+    def write(self, record: Dict[str, Any]):
+        """把追踪记录交给写入线程"""
+        if self._thread:
+            self._queue.put(record)
+
+    def start(self):
+        """启动写入线程"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """写完队列中的记录后停止写入线程"""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(5)
+            self._thread = None
+
+    def _write_loop(self):
+        """批量写入追踪文件，超过大小上限时轮转为 .1"""
+        directory = os.path.dirname(self.trace_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stopping = records[-1] is None
+            lines = [json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+                     for record in records if record is not None]
+            if lines:
+                try:
+                    if os.path.exists(self.trace_file) and os.path.getsize(self.trace_file) > self.max_size:
+                        os.replace(self.trace_file, self.trace_file + '.1')
+                    with open(self.trace_file, 'a', encoding='utf-8') as f:
+                        f.write('\n'.join(lines) + '\n')
+                    self.written_count += len(lines)
+                except Exception as e:
+                    self.logger.error(f"写入追踪文件失败: {e}")
+            if stopping:
+                return
+
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文中的追踪"""
+    return _current.get()
+
+
+def set_trace(trace: Optional[Trace]) -> contextvars.Token:
+    """设置当前追踪，返回用于 reset_trace() 的令牌"""
+    return _current.set(trace)
+
+
+def reset_trace(token: contextvars.Token):
+    """恢复设置之前的追踪"""
+    _current.reset(token)
+
+
+def record_span(name: str, seconds: float):
+    """当前有追踪时记录一个刚结束的阶段"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, seconds)
+
+
+def current_trace_id() -> str:
+    """当前追踪ID，没有时为 '-'"""
+    trace = _current.get()
+    return trace.trace_id if trace is not None else '-'
@@ -2,13 +2,14 @@
 微信机器人主程序
 """
 import itchat
+import functools
 import time
 import logging
-import threading
-from typing import Dict, Any
-import yaml
+from typing import Callable, Dict, Any, Optional, Tuple
 import os
+import re
 import sys
+import threading
 
 # 添加项目路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -17,56 +18,147 @@ from utils.data_manager import DataManager
 from utils.search_engine import SearchEngine
 from utils.message_formatter import MessageFormatter
 from utils.security_manager import SecurityManager
+from utils.send_scheduler import SendScheduler
+from utils.message_pipeline import MessagePipeline
+from utils.group_info import GroupInfoRefresher
+from utils.pacing import PacingScheduler
+from utils.quiet_queue import QuietHoursQueue
+from utils.state_store import StateStore
+from utils.config_service import get_config_service
+from utils.metrics import metrics
+from utils.admin_server import AdminServer
+from utils.profiler import SamplingProfiler
+from utils.log_setup import setup_logging, parse_size
+from utils.tracing import Tracer, current_trace, reset_trace, set_trace
+from utils.query_log import QueryLog, load_hot_set
+from utils.memory_accounting import MemoryReporter
 
 class WeChatBot:
     def __init__(self, config_path: str = "config.yaml"):
         """初始化微信机器人"""
         self.config_path = config_path
-        self.config = self._load_config()
+        self.config_service = get_config_service(config_path)
         
         # 初始化日志
         self._setup_logging()
         self.logger = logging.getLogger(__name__)
         
+        # 内存统计（开启分配跟踪时需在加载数据之前开始）
+        memory_config = self.config.get('memory', {})
+        self.memory_reporter = MemoryReporter(
+            trace_allocations=memory_config.get('trace_allocations', False),
+            trace_frames=memory_config.get('trace_frames', 1),
+            top_sites=memory_config.get('top_sites', 5)
+        )
+        self.memory_reporter.start()
+        
         # 初始化组件
         self.data_manager = DataManager(config_path)
         self.search_engine = SearchEngine(self.data_manager)
         self.message_formatter = MessageFormatter(config_path)
         self.security_manager = SecurityManager(config_path)
         
+        # 全局发送节奏调度（为所有会话的消息分配发送时刻）
+        self.pacer = PacingScheduler(self.security_manager)
+        
+        # 发送调度器（固定数量的发送线程）
+        sender_config = self.config.get('sender', {})
+        self.send_scheduler = SendScheduler(
+            self._deliver_message,
+            worker_count=sender_config.get('workers', 3),
+            max_pending=sender_config.get('max_pending', 1000)
+        )
+        
+        # 群成员数量后台刷新
+        group_check_config = self.config.get('security', {}).get('group_member_check', {})
+        self.group_info_refresher = GroupInfoRefresher(
+            self.security_manager,
+            interval=group_check_config.get('refresh_interval', 30),
+            batch_size=group_check_config.get('refresh_batch_size', 50)
+        )
+        self.security_manager.group_refresh_callback = self.group_info_refresher.request_refresh
+        
+        # 静默时段延迟发送队列
+        quiet_config = self.config.get('security', {}).get('quiet_hours', {})
+        self.quiet_queue = QuietHoursQueue(
+            self._deliver_deferred,
+            lambda: not self.security_manager.is_safe_time_to_send(),
+            queue_file=quiet_config.get('queue_file', 'data/quiet_queue.json'),
+            max_entries=quiet_config.get('max_entries', 500),
+            max_age=quiet_config.get('max_age', 43200),
+            flush_interval=quiet_config.get('flush_interval', 60),
+            flush_batch_size=quiet_config.get('flush_batch_size', 5)
+        )
+        
+        # 运行状态持久化（频率窗口、发送时间线、结果缓存）
+        state_config = self.config.get('state', {})
+        self.state_store = None
+        if state_config.get('enabled', True):
+            self.state_store = StateStore(state_config.get('file', 'data/state.db'))
+        
+        # 异步消息流水线（未启用时在itchat回调线程中同步处理）
+        pipeline_config = self.config.get('pipeline', {})
+        self.pipeline = None
+        if pipeline_config.get('enabled', True):
+            self.pipeline = MessagePipeline(
+                self,
+                queue_size=pipeline_config.get('queue_size', 100),
+                search_workers=pipeline_config.get('search_workers', 4),
+                shed_policy=pipeline_config.get('shed_policy', 'drop_oldest'),
+                coalesce_window=pipeline_config.get('coalesce_window', 10)
+            )
+        
+        # 本地管理接口（指标、状态、搜索）
+        admin_config = self.config.get('admin_server', {})
+        self.admin_server = None
+        if admin_config.get('enabled', False):
+            self.admin_server = AdminServer(
+                self,
+                host=admin_config.get('host', '127.0.0.1'),
+                port=admin_config.get('port', 8080),
+                token=admin_config.get('token', '')
+            )
+        
+        # 请求追踪（各阶段耗时写入追踪文件）
+        tracing_config = self.config.get('tracing', {})
+        self.tracer = Tracer(
+            trace_file=tracing_config.get('file', 'logs/traces.jsonl'),
+            sample_rate=tracing_config.get('sample_rate', 1.0),
+            max_size=parse_size(tracing_config.get('max_size', '50MB')),
+            enabled=tracing_config.get('enabled', True)
+        )
+        
+        # 查询日志（离线汇总出热门查询集，启动时预热缓存）
+        query_log_config = self.config.get('query_log', {})
+        self.query_log = QueryLog(
+            log_file=query_log_config.get('file', 'logs/queries.tsv'),
+            flush_interval=query_log_config.get('flush_interval', 5),
+            max_size=parse_size(query_log_config.get('max_size', '50MB')),
+            enabled=query_log_config.get('enabled', True)
+        )
+        
+        # 按需性能采样（管理员命令启动）
+        profiler_config = self.config.get('profiler', {})
+        self.profiler = SamplingProfiler(
+            output_dir=profiler_config.get('output_dir', 'logs'),
+            interval=profiler_config.get('interval', 0.01),
+            max_duration=profiler_config.get('max_duration', 300)
+        )
+        
         # 状态标志
         self.is_running = False
         self.is_logged_in = False
         
         self.logger.info("微信机器人初始化完成")
     
-    def _load_config(self) -> Dict:
-        """加载配置文件"""
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
-        except Exception as e:
-            print(f"配置文件加载失败: {e}")
-            return {}
+    @property
+    def config(self):
+        """当前配置（只读，配置文件修改后自动更新）"""
+        return self.config_service.snapshot.raw
     
     def _setup_logging(self):
-        """设置日志"""
-        log_config = self.config.get('logging', {})
-        log_level = log_config.get('level', 'INFO')
-        log_file = log_config.get('file', 'logs/wechat_bot.log')
-        
-        # 确保日志目录存在
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        
-        # 配置日志格式
-        logging.basicConfig(
-            level=getattr(logging, log_level),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        """设置日志（后台线程写入，按大小轮转）"""
+        setup_logging(self.config.get('logging', {}))
     
     def start(self):
         """启动机器人"""
@@ -78,6 +170,12 @@ class WeChatBot:
                 self.logger.error("数据加载失败，无法启动机器人")
                 return False
             
+            # 恢复上次运行的频率窗口和缓存
+            self._restore_state()
+            
+            # 登录期间在后台用热门查询预热缓存
+            self._start_cache_warmup()
+            
             # 登录微信
             if not self._login_wechat():
                 self.logger.error("微信登录失败")
@@ -86,6 +184,26 @@ class WeChatBot:
             # 注册消息处理器
             self._register_handlers()
             
+            # 启动发送调度器、群信息刷新、静默时段队列和消息流水线
+            self.tracer.start()
+            self.query_log.start()
+            self.send_scheduler.start()
+            self.group_info_refresher.start()
+            self.quiet_queue.set_session(self._login_session())
+            self.quiet_queue.start()
+            self.config_service.start_watching(self.config.get('config_watch_interval', 5))
+            metrics_config = self.config.get('metrics', {})
+            if metrics_config.get('enabled', True):
+                metrics.start_dump(metrics_config.get('dump_file', 'logs/metrics.jsonl'),
+                                   metrics_config.get('dump_interval', 60),
+                                   parse_size(metrics_config.get('max_size', '10MB')))
+            if self.state_store:
+                self.state_store.start(self._collect_state, self.config.get('state', {}).get('snapshot_interval', 60))
+            if self.pipeline:
+                self.pipeline.start()
+            if self.admin_server:
+                self.admin_server.start()
+            
             # 启动机器人
             self.is_running = True
             self.logger.info("微信机器人启动成功")
@@ -103,6 +221,95 @@ class WeChatBot:
             self.logger.error(f"机器人运行出错: {e}")
             return False
     
+    def _collect_state(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """收集需要持久化的运行状态，返回 (分区, 分区版本)
+
+        结果缓存只在数据文件或缓存内容变化后才重新导出。
+        """
+        sections = {
+            'security': self.security_manager.export_state(),
+            'pacing': self.pacer.export_state(),
+        }
+        versions = {}
+        
+        result_cache = self.search_engine.result_cache
+        # 先取版本再导出，导出期间的写入会使下次快照再保存一次
+        cache_version = (self.data_manager.catalog_signature, result_cache.version)
+        if not self.state_store.is_saved('result_cache', cache_version):
+            sections['result_cache'] = {
+                'signature': self.data_manager.catalog_signature,
+                'entries': result_cache.items()
+            }
+            versions['result_cache'] = cache_version
+        return sections, versions
+    
+    def _restore_state(self):
+        """从快照恢复运行状态，在数据加载之后调用"""
+        if not self.state_store:
+            return
+        
+        start_time = time.perf_counter()
+        sections, saved_at = self.state_store.load()
+        if saved_at is None:
+            self.logger.info("没有可恢复的运行状态")
+            return
+        
+        elapsed = max(0.0, time.time() - saved_at)
+        restored_keys = 0
+        restored_results = 0
+        try:
+            if 'security' in sections:
+                restored_keys = self.security_manager.restore_state(sections['security'], elapsed)
+            if 'pacing' in sections:
+                self.pacer.restore_state(sections['pacing'], elapsed)
+            
+            # 数据文件变化后旧结果不再有效
+            cache_state = sections.get('result_cache', {})
+            if cache_state.get('signature') == self.data_manager.catalog_signature:
+                generation = self.data_manager.generation
+                for key, results in cache_state.get('entries', []):
+                    # 数据文件相同则行号不变，归入当前数据版本，卡片缓存可以直接复用
+                    for result in results:
+                        result['generation'] = generation
+                    self.search_engine.result_cache.put(key, generation, results)
+                restored_results = len(self.search_engine.result_cache)
+        except Exception as e:
+            self.logger.error(f"恢复运行状态失败: {e}")
+            return
+        
+        restore_ms = (time.perf_counter() - start_time) * 1000
+        self.logger.info(f"已恢复运行状态，用时 {restore_ms:.1f} ms（距上次保存 {elapsed:.0f} 秒，"
+                         f"频率记录 {restored_keys} 个，结果缓存 {restored_results} 条）")
+    
+    def _start_cache_warmup(self):
+        """在后台线程中用热门查询集预热结果缓存和卡片缓存"""
+        query_log_config = self.config.get('query_log', {})
+        if not query_log_config.get('warmup', True):
+            return
+        queries = load_hot_set(query_log_config.get('hot_set_file', 'data/hot_queries.json'))
+        if not queries:
+            return
+        
+        max_seconds = query_log_config.get('warmup_max_seconds', 60)
+        thread = threading.Thread(target=self._warm_caches, args=(queries, max_seconds),
+                                  name="cache-warmup", daemon=True)
+        thread.start()
+    
+    def _warm_caches(self, queries: list, max_seconds: float):
+        """预热缓存，超过 max_seconds 后停止"""
+        start_time = time.monotonic()
+        try:
+            warmed = self.search_engine.warm_up(queries, start_time + max_seconds)
+            cards = 0
+            for results in warmed:
+                cards = self.message_formatter.warm_cards(results)
+        except Exception as e:
+            self.logger.error(f"预热缓存失败: {e}")
+            return
+        
+        self.logger.info(f"缓存预热完成，用时 {time.monotonic() - start_time:.1f} 秒"
+                         f"（热门查询 {len(warmed)}/{len(queries)} 个，卡片 {cards} 张）")
+    
     def _login_wechat(self) -> bool:
         """登录微信"""
         try:
@@ -177,6 +384,14 @@ class WeChatBot:
         self.logger.info("微信连接已断开")
         print("⚠️ 微信连接已断开")
     
+    def _login_session(self) -> str:
+        """当前登录会话：机器人自己的UserName（每次重新登录都会变化，热重载登录时不变）"""
+        try:
+            return (itchat.search_friends() or {}).get('UserName', '')
+        except Exception as e:
+            self.logger.warning(f"获取登录会话失败: {e}")
+            return ''
+    
     def _register_handlers(self):
         """注册消息处理器"""
         
@@ -184,7 +399,7 @@ class WeChatBot:
         def handle_group_message(msg):
             """处理群消息"""
             try:
-                self._handle_message(msg, is_group=True)
+                self._dispatch_message(msg, is_group=True)
             except Exception as e:
                 self.logger.error(f"处理群消息出错: {e}")
         
@@ -192,46 +407,109 @@ class WeChatBot:
         def handle_private_message(msg):
             """处理私聊消息"""
             try:
-                self._handle_message(msg, is_group=False)
+                self._dispatch_message(msg, is_group=False)
             except Exception as e:
                 self.logger.error(f"处理私聊消息出错: {e}")
         
         self.logger.info("消息处理器注册完成")
     
-    def _handle_message(self, msg: Dict[str, Any], is_group: bool = True):
+    def _dispatch_message(self, msg: Dict[str, Any], is_group: bool):
+        """开始请求追踪，把消息交给流水线，流水线不可用时同步处理"""
+        trace = self.tracer.begin(msg.get('FromUserName', ''))
+        if self.pipeline and self.pipeline.submit(msg, is_group, trace):
+            return
+        self._handle_message(msg, is_group, trace)
+    
+    def _handle_message(self, msg: Dict[str, Any], is_group: bool = True, trace=None):
         """处理消息"""
+        if trace is None:
+            trace = self.tracer.begin(msg.get('FromUserName', ''))
+        token = set_trace(trace)
         try:
+            request = self._check_message(msg, is_group)
+            if not request:
+                return
+            
+            # 处理特殊命令（命令回复不占用预留的额度）
+            if self._handle_special_commands(request['content'], request['from_user'],
+                                             request['actual_user'], request['contact']):
+                self.security_manager.release(request['reservation'])
+                self._finish_trace('command')
+                return
+            
+            # 搜索处理
+            self._process_search_request(
+                request['content'], request['from_user'], request['actual_user'], request['reservation'],
+                request['is_group']
+            )
+            
+        except Exception as e:
+            self.logger.error(f"消息处理出错: {e}")
+            self._finish_trace('error')
+        finally:
+            reset_trace(token)
+    
+    def _finish_trace(self, outcome: str):
+        """结束当前请求的追踪（被过滤的消息不结束，也不写入追踪文件）"""
+        trace = current_trace()
+        if trace is not None:
+            trace.finish(outcome)
+    
+    def _check_message(self, msg: Dict[str, Any], is_group: bool) -> Optional[Dict[str, Any]]:
+        """过滤消息并进行安全检查，通过时返回请求信息"""
+        request = self._filter_message(msg, is_group)
+        if not request or not self._check_security(request):
+            return None
+        return request
+    
+    def _filter_message(self, msg: Dict[str, Any], is_group: bool) -> Optional[Dict[str, Any]]:
+        """基本过滤，需要响应时返回请求信息"""
+        with metrics.timer('filter'):
             # 获取消息信息
             content = msg.get('Content', '').strip()
             from_user = msg.get('FromUserName', '')
             actual_user = msg.get('ActualUserName', from_user)  # 群消息中的实际发送者
+            # 私聊的联系人信息（来自登录后获取的好友列表），群聊中为None
+            contact = None if is_group else msg.get('User')
             
             # 基本过滤
             if not content or not self.message_formatter.should_respond_to_message(content):
-                return
+                return None
             
             # 群消息需要@机器人或包含关键词才响应
             if is_group and not self._should_respond_to_group_message(content):
-                return
+                return None
             
-            # 安全检查
-            can_respond, reason = self.security_manager.should_respond(
-                from_user, actual_user, content
-            )
+            trace = current_trace()
+            if trace is not None:
+                trace.query = content[:50]
             
-            if not can_respond:
-                self.logger.info(f"安全策略阻止响应: {reason}")
-                return
-            
-            # 处理特殊命令
-            if self._handle_special_commands(content, from_user):
-                return
+            return {
+                'content': content,
+                'from_user': from_user,
+                'actual_user': actual_user,
+                'contact': contact,
+                'is_group': is_group
+            }
+    
+    def _check_security(self, request: Dict[str, Any]) -> bool:
+        """安全检查，通过时预留回复所需的发送额度（request['reservation']）"""
+        with metrics.timer('security_check'):
+            reservation, reason = self.security_manager.reserve(
+                request['from_user'], request['actual_user'], self._expected_reply_messages()
+            )
             
-            # 搜索处理
-            self._process_search_request(content, from_user, actual_user)
+            if not reservation:
+                self.logger.info("安全策略阻止响应: %s", reason)
+                self._finish_trace('rejected')
+                return False
             
-        except Exception as e:
-            self.logger.error(f"消息处理出错: {e}")
+            request['reservation'] = reservation
+            return True
+    
+    def _expected_reply_messages(self) -> int:
+        """准入时为一次回复预留的消息条数"""
+        return self.config_service.snapshot.reserve_per_reply
     
     def _should_respond_to_group_message(self, content: str) -> bool:
         """判断是否应该响应群消息"""
@@ -253,83 +531,245 @@ class WeChatBot:
         
         return False
     
-    def _handle_special_commands(self, content: str, from_user: str) -> bool:
-        """处理特殊命令"""
+    def _handle_special_commands(self, content: str, from_user: str, actual_user: str = None,
+                                 contact: Optional[Dict[str, Any]] = None) -> bool:
+        """处理特殊命令（contact 为私聊联系人，群聊中为None）"""
+        handler = self._match_special_command(content, from_user, actual_user, contact)
+        if handler is None:
+            return False
+        handler()
+        return True
+    
+    def _match_special_command(self, content: str, from_user: str, actual_user: str = None,
+                               contact: Optional[Dict[str, Any]] = None) -> Optional[Callable[[], None]]:
+        """识别特殊命令，返回执行该命令的函数，不是命令时返回None
+
+        识别只做字符串比较，可以在事件循环中直接调用；重新加载、统计等耗时操作在返回的函数中执行。
+        """
         content_lower = content.lower().strip()
         
-        if content_lower in ['帮助', 'help', '使用说明']:
-            help_msg = self.message_formatter.format_help_message()
-            self._send_message(help_msg, from_user)
-            return True
+        if self._is_profile_command(content_lower):
+            # 管理员命令，只在私聊中接受，其他人或在群里发送时按普通查询处理
+            if not self.security_manager.is_admin(contact):
+                return None
+            return functools.partial(self._handle_profile_command, content_lower, from_user)
         
+        if content_lower in ['帮助', 'help', '使用说明']:
+            return functools.partial(self._send_help, from_user)
         elif content_lower in ['统计', 'stats', '状态']:
-            stats = self.data_manager.get_stats()
-            stats_msg = self.message_formatter.format_stats_message(stats)
-            self._send_message(stats_msg, from_user)
-            return True
-        
+            return functools.partial(self._send_stats, from_user)
+        elif content_lower in ['重新加载配置', 'reload config']:
+            return functools.partial(self._reload_config, from_user)
         elif content_lower in ['重新加载', 'reload']:
-            if self.data_manager.load_excel_data():
-                self._send_message("✅ 数据重新加载成功", from_user)
+            return functools.partial(self._reload_data, from_user)
+        
+        return None
+    
+    def _send_help(self, from_user: str):
+        """发送使用说明"""
+        self._send_message(self.message_formatter.format_help_message(), from_user)
+    
+    def _send_stats(self, from_user: str):
+        """发送数据、运行和内存统计"""
+        stats = self.data_manager.get_stats()
+        stats_msg = self.message_formatter.format_stats_message(stats, self.get_runtime_stats(),
+                                                                self.get_memory_report())
+        self._send_message(stats_msg, from_user)
+    
+    def _reload_config(self, from_user: str):
+        """重新加载配置文件"""
+        if self.config_service.reload():
+            self._send_message(f"✅ 配置重新加载成功（版本 {self.config_service.snapshot.version}）", from_user)
+        else:
+            self._send_message("❌ 配置重新加载失败，继续使用原配置", from_user)
+    
+    def _reload_data(self, from_user: str):
+        """重新加载数据文件"""
+        if self.data_manager.load_excel_data():
+            self._send_message("✅ 数据重新加载成功", from_user)
+        else:
+            self._send_message("❌ 数据重新加载失败", from_user)
+    
+    def _is_profile_command(self, content_lower: str) -> bool:
+        """是否为性能采样命令：性能采样 [N秒|N次|停止] / profile [Ns|Nreq|stop]"""
+        return content_lower.startswith('性能采样') or content_lower.split(' ', 1)[0] == 'profile'
+    
+    def _handle_profile_command(self, content_lower: str, from_user: str):
+        """启动或停止性能采样，结束后把结果发给发起人"""
+        argument = re.sub(r'^(性能采样|profile)', '', content_lower).strip()
+        if argument in ['停止', 'stop']:
+            if self.profiler.active:
+                self.profiler.stop()
             else:
-                self._send_message("❌ 数据重新加载失败", from_user)
-            return True
+                self._send_message("当前没有进行中的性能采样", from_user)
+            return
         
-        return False
+        duration = self.config.get('profiler', {}).get('default_duration', 30)
+        requests = None
+        match = re.fullmatch(r'(\d+)\s*(秒|s|次|req|requests)?', argument)
+        if match:
+            if match.group(2) in ['次', 'req', 'requests']:
+                requests = int(match.group(1))
+                duration = self.profiler.max_duration
+            else:
+                duration = int(match.group(1))
+        elif argument:
+            self._send_message("用法：性能采样 30秒 / 性能采样 100次 / 性能采样 停止", from_user)
+            return
+        
+        def on_finish(report):
+            self._send_message(self.message_formatter.format_profile_report(report), from_user)
+        
+        if not self.profiler.start(duration=duration, requests=requests, on_finish=on_finish):
+            self._send_message("性能采样正在进行中", from_user)
+            return
+        
+        limit = f"{requests} 个请求" if requests else f"{min(duration, self.profiler.max_duration)} 秒"
+        self._send_message(f"⏱️ 开始性能采样（{limit}），结束后发送结果", from_user)
+    
+    def get_runtime_stats(self) -> Dict[str, Any]:
+        """汇总发送队列、时间线、缓存、流水线和各阶段耗时的运行统计"""
+        runtime_stats = self.send_scheduler.get_stats()
+        runtime_stats.update(self.pacer.get_stats())
+        runtime_stats.update(self.quiet_queue.get_stats())
+        runtime_stats.update(self.search_engine.result_cache.get_stats())
+        runtime_stats.update(self.message_formatter.get_cache_stats())
+        runtime_stats['stage_latency'] = metrics.snapshot()
+        if self.pipeline:
+            runtime_stats.update(self.pipeline.get_stats())
+        return runtime_stats
     
-    def _process_search_request(self, query: str, from_user: str, actual_user: str):
+    def get_memory_report(self) -> Dict[str, Any]:
+        """按数据结构统计内存，数据表和索引按数据版本缓存统计结果"""
+        data_manager = self.data_manager
+        return self.memory_reporter.report(
+            static=[
+                ('catalog', data_manager.data),
+                ('drama_index', data_manager.drama_index),
+                ('actor_index', data_manager.actor_index),
+                ('fuzzy_candidates', (data_manager.title_candidates, data_manager.actor_candidates)),
+            ],
+            dynamic=[
+                ('result_cache', self.search_engine.result_cache),
+                ('card_cache', self.message_formatter),
+                ('security_history', self.security_manager),
+                ('send_queues', (self.send_scheduler, self.pacer, self.quiet_queue)),
+            ],
+            static_version=data_manager.generation,
+            exclude=(self, self.config_service)
+        )
+    
+    def _process_search_request(self, query: str, from_user: str, actual_user: str, reservation=None,
+                                is_group: bool = True):
         """处理搜索请求"""
         try:
             # 清理查询字符串
             query = query.replace('@', '').strip()
             
             # 执行搜索
-            results = self.search_engine.intelligent_search(query)
+            results = self._search(query, is_group)
             
             # 格式化结果
             messages = self.message_formatter.format_search_results(results, query)
             
             # 发送结果
-            self._send_messages_with_delay(messages, from_user, actual_user)
+            self._send_messages_with_delay(messages, from_user, actual_user, reservation)
             
         except Exception as e:
             self.logger.error(f"搜索处理出错: {e}")
+            self.security_manager.release(reservation)
+            self._finish_trace('error')
             error_msg = self.message_formatter.format_error_message('search_failed', str(e))
             self._send_message(error_msg, from_user)
     
-    def _send_messages_with_delay(self, messages: list, from_user: str, actual_user: str):
-        """带延迟发送多条消息"""
+    def _search(self, query: str, is_group: bool):
+        """搜索并记入查询日志"""
+        start_time = time.perf_counter()
+        results = self.search_engine.intelligent_search(query)
+        self.query_log.record(self.search_engine.get_cache_key(query), len(results),
+                              time.perf_counter() - start_time, is_group)
+        return results
+    
+    def _send_messages_with_delay(self, messages: list, from_user: str, actual_user: str, reservation=None) -> bool:
+        """带延迟发送多条消息（交给发送调度器排队）
+
+        返回回复是否已交给发送调度器（没有消息可发时视为已完成）；存入静默时段队列或被丢弃时返回False。
+        """
+        self.profiler.on_request()
+        
         if not messages:
-            return
+            self.security_manager.release(reservation)
+            self._finish_trace('empty')
+            return True
         
-        def send_delayed():
-            try:
-                for i, message in enumerate(messages):
-                    if i > 0:  # 第一条消息立即发送，后续消息有延迟
-                        delay = self.security_manager.calculate_send_delay(from_user, i + 1)
-                        time.sleep(delay)
-                    
-                    self._send_message(message, from_user)
-                    self.security_manager.record_message_sent(from_user, actual_user)
-                
-            except Exception as e:
-                self.logger.error(f"延迟发送消息出错: {e}")
+        # 静默时段：存入队列，释放预留额度，结束后再发送
+        if not self.security_manager.is_safe_time_to_send():
+            self.security_manager.release(reservation)
+            self.quiet_queue.defer(from_user, actual_user, messages)
+            self._finish_trace('deferred')
+            return False
+        
+        # 按实际条数调整预留额度，额度不足时只发送获得额度的条数
+        if reservation:
+            granted = self.security_manager.resize_reservation(reservation, len(messages))
+            if granted <= 0:
+                self.logger.warning("预留额度已超时回收，回复未发送")
+                self._finish_trace('rejected')
+                return False
+            if granted < len(messages):
+                self.logger.info("频率额度不足，只发送前 %d 条消息（共 %d 条）", granted, len(messages))
+                messages = messages[:granted]
+        
+        # 在全局发送时间线上分配发送时刻
+        due_times = self.pacer.assign(from_user, len(messages))
+        
+        # 追踪在最后一条消息发送后结束
+        trace = current_trace()
+        if trace is not None:
+            trace.expect_messages(len(messages))
+        
+        if not self.send_scheduler.schedule_at(from_user, actual_user, messages, due_times, reservation):
+            self.logger.warning("发送队列不可用，回复未发送")
+            self.security_manager.release(reservation)
+            self._finish_trace('dropped')
+            return False
+        return True
+    
+    def _deliver_deferred(self, from_user: str, actual_user: str, messages: list) -> bool:
+        """静默时段队列回调：重新预留额度后交给发送时间线，额度不足或未能排队时返回False（回复留在队列中）"""
+        reservation, reason = self.security_manager.reserve(from_user, actual_user, len(messages))
+        if not reservation:
+            self.logger.info("静默时段回复暂缓发送: %s", reason)
+            return False
+        
+        return self._send_messages_with_delay(messages, from_user, actual_user, reservation)
+    
+    def _deliver_message(self, message: str, from_user: str, actual_user: str, reservation=None):
+        """发送线程回调：发送消息，发送成功时提交一份预留额度，否则释放这一份"""
+        if self._send_message(message, from_user):
+            self.security_manager.commit(reservation, from_user, actual_user)
+        else:
+            self.security_manager.release(reservation, 1)
         
-        # 在新线程中发送，避免阻塞
-        threading.Thread(target=send_delayed, daemon=True).start()
+        trace = current_trace()
+        if trace is not None:
+            trace.message_sent()
     
-    def _send_message(self, message: str, to_user: str):
-        """发送消息"""
+    def _send_message(self, message: str, to_user: str) -> bool:
+        """发送消息，返回是否已发送"""
         try:
             if not self.security_manager.is_message_safe(message):
                 self.logger.warning("消息内容不安全，拒绝发送")
-                return
+                return False
             
-            itchat.send(message, toUserName=to_user)
-            self.logger.info(f"消息已发送到 {to_user[:10]}...")
+            with metrics.timer('itchat_send'):
+                itchat.send(message, toUserName=to_user)
+            self.logger.info("消息已发送到 %s...", to_user[:10])
+            return True
             
         except Exception as e:
             self.logger.error(f"发送消息失败: {e}")
+            return False
     
     def _send_startup_notification(self):
         """发送启动通知"""
@@ -344,6 +784,20 @@ class WeChatBot:
         """停止机器人"""
         try:
             self.is_running = False
+            self.profiler.stop()
+            if self.admin_server:
+                self.admin_server.stop()
+            if self.pipeline:
+                self.pipeline.stop()
+            self.send_scheduler.stop()
+            self.group_info_refresher.stop()
+            self.quiet_queue.stop()
+            self.config_service.stop_watching()
+            metrics.stop_dump()
+            if self.state_store:
+                self.state_store.stop()
+            self.tracer.stop()
+            self.query_log.stop()
             if self.is_logged_in:
                 itchat.logout()
             self.logger.info("微信机器人已停止")